@@ -0,0 +1,167 @@
+# src/analytics.py
+
+"""
+Метрики по всему репозиторию сразу: транзитивный fan-in (сколько пакетов
+зависят от данного), размер замыкания, длина самой длинной цепочки
+зависимостей вниз от пакета.
+
+Считается по сжатому DAG из ClosureEngine. Множества достижимых узлов —
+упакованные битовые маски (int Python): узлы пронумерованы так, что
+каждая компонента занимает непрерывный отрезок битов, и маска компоненты
+равна OR масок её потомков плюс собственный отрезок. Чтобы память не
+росла как N², узлы обрабатываются окнами по width битов: за проход
+каждая маска не длиннее width, а маска потомка освобождается, как
+только её использовали все родители.
+"""
+
+from array import array
+from bisect import bisect_right
+
+import metrics
+from closure import ClosureEngine
+
+SORT_KEYS = ("fan_in", "direct_in", "closure", "depth")
+
+
+class RepositoryAnalytics:
+    """
+    fan_in[c], closure[c], depth[c] — по компонентам сжатого графа
+    (у всех пакетов одного цикла значения общие).
+    """
+
+    def __init__(self, repo, width: int = 4096, engine: ClosureEngine | None = None):
+        self.repo = repo
+        self.width = width
+        self.engine = engine if engine is not None else ClosureEngine(repo)
+
+        engine = self.engine
+        n_comps = len(engine.members)
+        self.parents: list[list[int]] = [[] for _ in range(n_comps)]
+        for c, targets in enumerate(engine.comp_edges):
+            for d in targets:
+                self.parents[d].append(c)
+
+        # начало отрезка битов каждой компоненты
+        self.start = array("Q", [0]) * (n_comps + 1)
+        for c, members in enumerate(engine.members):
+            self.start[c + 1] = self.start[c] + len(members)
+
+        with metrics.phase("analytics"):
+            # в замыкание входит и сам пакет, в fan-in — нет
+            self.closure = self._reach_counts(engine.comp_edges, self.parents, forward=True)
+            reach_in = self._reach_counts(self.parents, engine.comp_edges, forward=False)
+            self.fan_in = array("Q", (r - 1 for r in reach_in))
+            self.depth, self.next_in_chain = self._longest_chains()
+            self.direct_in = self._direct_in()
+
+    def _reach_counts(self, children: list[list[int]], parents: list[list[int]],
+                      forward: bool) -> array:
+        """
+        Для каждой компоненты — число узлов, достижимых из неё по children
+        (включая её саму). Потомки по children всегда обрабатываются
+        раньше: при forward=True у них меньшие номера (порядок Тарьяна).
+        """
+        n_comps = len(children)
+        total = self.start[n_comps]
+        counts = array("Q", [0]) * n_comps
+        start = self.start
+
+        for lo in range(0, total, self.width):
+            hi = min(total, lo + self.width)
+            # компоненты, чей отрезок пересекает окно
+            first = _component_at(start, lo)
+            last = _component_at(start, hi - 1)
+            # до окна дотягиваются только компоненты "выше" него
+            order = range(first, n_comps) if forward else range(last, -1, -1)
+
+            reach: dict[int, int] = {}
+            pending = {}  # сколько родителей ещё не забрали маску
+            for c in order:
+                mask = 0
+                if first <= c <= last:
+                    a, b = max(start[c], lo), min(start[c + 1], hi)
+                    mask = ((1 << (b - a)) - 1) << (a - lo)
+                for d in children[c]:
+                    child_mask = reach.get(d)
+                    if child_mask is None:
+                        continue  # за пределами окна — там пусто
+                    mask |= child_mask
+                    pending[d] -= 1
+                    if not pending[d]:
+                        del reach[d], pending[d]
+                if mask:
+                    counts[c] += mask.bit_count()
+                    if parents[c]:
+                        reach[c] = mask
+                        pending[c] = len(parents[c])
+        return counts
+
+    def _longest_chains(self) -> tuple[array, array]:
+        """
+        depth[c] — число рёбер в самой длинной цепочке вниз от компоненты,
+        next_in_chain[c] — следующая компонента этой цепочки (-1 — лист).
+        """
+        n_comps = len(self.engine.comp_edges)
+        depth = array("Q", [0]) * n_comps
+        nxt = array("q", [-1]) * n_comps
+        for c, targets in enumerate(self.engine.comp_edges):
+            for d in targets:
+                if depth[d] + 1 > depth[c] or nxt[c] == -1:
+                    depth[c] = depth[d] + 1
+                    nxt[c] = d
+        return depth, nxt
+
+    def _direct_in(self) -> array:
+        counts = array("Q", [0]) * len(self.engine.nodes)
+        for v, targets in enumerate(self.engine.adjacency):
+            for d in set(targets):
+                if d != v:
+                    counts[d] += 1
+        return counts
+
+    def chain(self, package: str) -> list[str]:
+        """
+        Самая длинная цепочка зависимостей от package (по одному пакету
+        на компоненту).
+        """
+        engine = self.engine
+        nid = engine.node_of(package)
+        if nid is None:
+            return [package]
+        result = [engine.nodes[nid]]
+        c = self.next_in_chain[engine.component[nid]]
+        while c != -1:
+            result.append(min(engine.nodes[v] for v in engine.members[c]))
+            c = self.next_in_chain[c]
+        return result
+
+    def rows(self) -> list[dict]:
+        """
+        По строке на каждый пакет репозитория (неразрешённые имена
+        зависимостей вроде so:... без провайдера не включаются).
+        """
+        engine = self.engine
+        names = dict.fromkeys(name for name, _, _ in self.repo.iter_packages())
+        result = []
+        for name in names:
+            v = engine.node_id[name]
+            c = engine.component[v]
+            result.append({
+                "package": name,
+                "fan_in": self.fan_in[c],
+                "direct_in": self.direct_in[v],
+                "closure": self.closure[c],
+                "depth": self.depth[c],
+                "cycle": len(engine.members[c]) > 1 or v in engine.adjacency[v],
+            })
+        return result
+
+    def report(self, sort_key: str = "fan_in", top: int | None = None) -> list[dict]:
+        rows = self.rows()
+        rows.sort(key=lambda r: (-r[sort_key], r["package"]))
+        return rows[:top] if top is not None else rows
+
+
+def _component_at(start: array, pos: int) -> int:
+    # номер компоненты, чей отрезок битов содержит pos
+    return bisect_right(start, pos) - 1
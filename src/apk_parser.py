@@ -1,52 +1,272 @@
 import urllib.request
 import tarfile
 import io
+import copy
+import hashlib
+from contextlib import ExitStack, contextmanager
+
+import metrics
+from apk_version import node_label, parse_dependency, select_version, split_label, version_key
+from index_cache import IndexCache, remote_stamp
+from index_delta import IndexDelta
 
 
 class ApkRepository:
-    def __init__(self, repo_url: str):
+    def __init__(self, repo_url: str, cache: IndexCache | None = None):
         self.repo_url = repo_url.rstrip("/")
+        self.cache = cache  # если None — качаем индекс при каждом запуске
         self.packages = {}  # { package: {version: [deps]} }
+        # { виртуальное имя (so:..., cmd:..., /bin/sh): [(package, version, priority)] }
+        self.providers: dict[str, list[tuple[str, str, int]]] = {}
+        self._provider_index: dict[str, tuple[str, str]] | None = None
+        # { (package, version): отпечаток записи (_fingerprint) } — для сравнения
+        # при обновлении; сами записи после разбора не хранятся
+        self.fingerprints: dict[tuple, object] = {}
+        # sha256 архива, из которого разобран индекс (parse_index, refreshed)
+        self.index_checksum: bytes | None = None
+        # { package: (ключи версий, версии) } по возрастанию, строится лениво
+        self._order: dict[str, tuple[list[tuple], list[str]]] = {}
 
     def download_index(self):
         index_url = f"{self.repo_url}/APKINDEX.tar.gz"
+        with metrics.phase("download"):
+            try:
+                if self.cache is not None:
+                    with self.cache.fetch(index_url).open("rb") as f:
+                        return f.read()
+                with urllib.request.urlopen(index_url) as response:
+                    data = response.read()
+                metrics.count("bytes_downloaded", len(data))
+                return data
+            except Exception as e:
+                raise RuntimeError(f"Не удалось скачать APKINDEX.tar.gz: {e}")
+
+    def source_checksum(self) -> bytes:
+        """
+        sha256 архива APKINDEX.tar.gz. С кэшем хешируется локальная копия
+        (после перепроверки), без кэша архив приходится скачать.
+        """
+        digest = hashlib.sha256()
+        with self.open_index() as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(chunk)
+        return digest.digest()
+
+    def source_stamp(self) -> bytes:
+        """
+        Дешёвый отпечаток текущей версии индекса для проверки снимка:
+        ETag / Last-Modified из кэша (или HEAD-запроса без кэша), для
+        file:// — размер и mtime. Архив хешируется, только если сервер
+        не отдаёт ни ETag, ни Last-Modified.
+        """
+        index_url = f"{self.repo_url}/APKINDEX.tar.gz"
+        try:
+            if self.cache is not None:
+                return self.cache.stamp(index_url)
+            stamp = remote_stamp(index_url)
+        except Exception as e:
+            raise RuntimeError(f"Не удалось проверить APKINDEX.tar.gz: {e}")
+        return stamp if stamp is not None else self.source_checksum()
+
+    @contextmanager
+    def open_index(self):
+        """
+        Открывает APKINDEX.tar.gz как поток байт: локальный файл из кэша
+        или тело HTTP-ответа (file:// тоже работает через urllib).
+        """
+        index_url = f"{self.repo_url}/APKINDEX.tar.gz"
+        stack = ExitStack()
         try:
-            with urllib.request.urlopen(index_url) as response:
-                return response.read()
+            if self.cache is not None:
+                f = stack.enter_context(self.cache.open(index_url))
+            else:
+                f = stack.enter_context(
+                    metrics.CountingReader(urllib.request.urlopen(index_url)))
         except Exception as e:
+            stack.close()
             raise RuntimeError(f"Не удалось скачать APKINDEX.tar.gz: {e}")
+        with stack:
+            yield f
+
+    def parse_index(self, stream: bool = True):
+        """
+        Загружает и разбирает индекс.
+
+        stream=True — потоковый режим: архив распаковывается на лету
+        (tarfile "r|gz") и разбирается построчно, пока ещё идёт загрузка,
+        поэтому память не зависит от размера индекса.
+        stream=False — старый режим: весь архив читается в память.
+        Фазы в обоих режимах одни: download (чтение из сети; у свежей
+        копии в кэше его нет), extract (распаковка) и parse — в потоковом
+        режиме они идут вперемешку и делятся по времени чтений
+        (metrics.TimedReader).
+        """
+        if stream:
+            digest = hashlib.sha256()
+            with metrics.phase("parse"):
+                for record in self.fetch_records(digest):
+                    self.add_record(record)
+            self.index_checksum = digest.digest()
+            return
 
-    def parse_index(self):
         data = self.download_index()
+        self.index_checksum = hashlib.sha256(data).digest()
 
         #Распаковка tar.gz в память
-        fileobj = io.BytesIO(data)
-        with tarfile.open(fileobj=fileobj, mode="r:gz") as tar:
-            member = tar.getmember("APKINDEX")
-            raw = tar.extractfile(member).read().decode("utf-8")
-
-        #Разбираем блоки пакетов
-        current_pkg = {}
-        for line in raw.splitlines():
-            if line.startswith("P:"):  # имя
-                current_pkg["name"] = line[2:]
-            elif line.startswith("V:"):  # версия
-                current_pkg["version"] = line[2:]
-            elif line.startswith("D:"):  # зависимости
-                deps = line[2:].split() if line[2:].strip() else []
-                current_pkg["deps"] = deps
-            elif line.strip() == "":
-                #конец записи пакета
-                if "name" in current_pkg and "version" in current_pkg:
-                    name = current_pkg["name"]
-                    version = current_pkg["version"]
-
-                    if name not in self.packages:
-                        self.packages[name] = {}
-
-                    self.packages[name][version] = current_pkg.get("deps", [])
-
-                current_pkg = {}
+        with metrics.phase("extract"):
+            fileobj = io.BytesIO(data)
+            with tarfile.open(fileobj=fileobj, mode="r:gz") as tar:
+                member = tar.getmember("APKINDEX")
+                raw = tar.extractfile(member).read().decode("utf-8")
+
+        with metrics.phase("parse"):
+            for record in parse_records(raw.splitlines()):
+                self.add_record(record)
+
+    def fetch_records(self, digest=None):
+        """
+        Потоково отдаёт записи свежего индекса, ничего не меняя в self.
+        digest (hashlib) получает все байты архива — контрольная сумма
+        считается по тем же данным, что разобраны, без второго скачивания.
+        """
+        with self.open_index() as fileobj:
+            if digest is None:
+                yield from iter_records(fileobj)
+                return
+            reader = _HashingReader(fileobj, digest)
+            yield from iter_records(reader)
+            reader.drain()
+
+    def add_record(self, record: dict):
+        name = record["name"]
+        version = record["version"]
+
+        if name not in self.packages:
+            self.packages[name] = {}
+
+        self.packages[name][version] = record.get("deps", [])
+        self.fingerprints[(name, version)] = _fingerprint(record)
+        self._order.pop(name, None)
+
+        priority = record.get("provider_priority", 0)
+        for provided in record.get("provides", []):
+            self.providers.setdefault(provided, []).append((name, version, priority))
+        self._provider_index = None
+
+    def build_provider_index(self) -> dict[str, tuple[str, str]]:
+        """
+        Один раз строит хеш-таблицу "виртуальное имя -> (пакет, версия)".
+        Из нескольких провайдеров выбирается тот, у кого больше
+        provider_priority (k:), при равенстве — первый по имени;
+        из его версий — самая новая.
+        """
+        index = {}
+        for provided, candidates in self.providers.items():
+            index[provided] = _best_provider(candidates)
+        self._provider_index = index
+        return index
+
+    def resolve(self, dep: str) -> tuple[str, str] | None:
+        """
+        Превращает зависимость в (пакет, версия): сначала ищем пакет
+        с таким именем — для "foo<2" это самая новая версия, подходящая
+        под ограничение, — потом провайдера. Ограничение на версию
+        виртуального имени (so:..., pc:...) не проверяется: p: хранится
+        без версий.
+        """
+        if dep in self.packages:
+            return dep, self._sorted(dep)[1][-1]
+        name, op, version = parse_dependency(dep)
+        if op is not None and name in self.packages:
+            selected = self.select(name, op, version)
+            return (name, selected) if selected is not None else None
+        metrics.count("provider_lookups")
+        index = self._provider_index
+        if index is None:
+            index = self.build_provider_index()
+        return index.get(name)
+
+    def label(self, package: str, version: str | None) -> str:
+        """
+        Узел графа для версии пакета (apk_version.node_label): у самой
+        новой версии это просто имя.
+        """
+        versions = self._sorted(package)[1]
+        if version is None or not versions or version == versions[-1]:
+            return package
+        return node_label(package, version)
+
+    def _target(self, dep: str) -> str | None:
+        # зависимость -> узел графа, None — не разрешается
+        resolved = self.resolve(dep)
+        return self.label(*resolved) if resolved is not None else None
+
+    def versions(self, package: str) -> list[str]:
+        """
+        Версии пакета по возрастанию (сравнение как в apk).
+        """
+        return list(self._sorted(package)[1])
+
+    def _sorted(self, package: str) -> tuple[list[tuple], list[str]]:
+        order = self._order.get(package)
+        if order is None:
+            pairs = sorted((version_key(v), v) for v in self.packages.get(package, {}))
+            order = self._order[package] = ([k for k, _ in pairs], [v for _, v in pairs])
+        return order
+
+    def select(self, package: str, op: str | None, version: str | None) -> str | None:
+        """
+        Самая новая версия пакета, удовлетворяющая ограничению (op, version),
+        или None. Поиск — bisect по заранее отсортированным ключам.
+        """
+        return select_version(*self._sorted(package), op, version)
+
+    def dependencies_of(self, package: str, version: str | None = None,
+                        skip=None) -> list[str]:
+        """
+        Зависимости пакета, приведённые к узлам графа: реальным пакетам,
+        а если ограничение выбрало не самую новую версию — к "foo=1.5-r0",
+        чтобы дальше раскрывались зависимости именно этой версии.
+        package может быть таким узлом. Если версия не указана — берём
+        самую новую. Неразрешимые имена остаются как есть (листья графа).
+        skip — фильтр (filters.SkipIndex / FilterSet): имя из D:, которое
+        он отсекает, не разрешается, а остаётся листом как есть — иначе
+        правила class:so, class:cmd и allow:so:... видели бы только
+        пакеты-провайдеры.
+        """
+        if version is None and package not in self.packages:
+            package, version = split_label(package)
+            if version is None or version not in self.packages.get(package, {}):
+                return []
+        if version is not None:
+            deps = self.get_dependencies(package, version)
+        else:
+            versions = self._sorted(package)[1]
+            if not versions:
+                return []
+            deps = self.packages[package][versions[-1]]
+
+        result: list[str] = []
+        seen: set[str] = set()
+        for dep in deps:
+            name = parse_dependency(dep)[0]
+            if skip is not None and name in skip:
+                target = name
+            else:
+                target = self._target(dep) or dep
+            if target not in seen:
+                seen.add(target)
+                result.append(target)
+        return result
+
+    def iter_packages(self):
+        """
+        Все записи индекса: (package, version, deps).
+        Версии пакета идут по возрастанию, последняя — самая новая.
+        """
+        for name, versions in self.packages.items():
+            for version in self._sorted(name)[1]:
+                yield name, version, versions[version]
 
     def get_dependencies(self, package: str, version: str):
         if package not in self.packages:
@@ -55,4 +275,257 @@ class ApkRepository:
         if version not in self.packages[package]:
             raise ValueError(f"Версия '{version}' для пакета '{package}' не найдена")
 
-        return self.packages[package][version]
\ No newline at end of file
+        return self.packages[package][version]
+
+    # ===== инкрементальное обновление =====
+
+    def copy(self):
+        """
+        Неглубокая копия: внешние словари свои, внутренние объекты общие.
+        apply_records() внутренние объекты не меняет, а заменяет, поэтому
+        копию можно обновлять, не трогая оригинал (его читают запросы).
+        """
+        clone = copy.copy(self)
+        clone.packages = dict(self.packages)
+        clone.providers = dict(self.providers)
+        clone.fingerprints = dict(self.fingerprints)
+        clone._order = dict(self._order)
+        if self._provider_index is not None:
+            clone._provider_index = dict(self._provider_index)
+        return clone
+
+    def refreshed(self):
+        """
+        Скачивает индекс заново и возвращает (новый репозиторий, IndexDelta).
+        Сам репозиторий не меняется; index_checksum нового — по тому же
+        скачиванию.
+        """
+        digest = hashlib.sha256()
+        records = list(self.fetch_records(digest))
+        repo = self.copy()
+        delta = repo.apply_records(records)
+        repo.index_checksum = digest.digest()
+        return repo, delta
+
+    def apply_records(self, records) -> IndexDelta:
+        """
+        Приводит репозиторий к новому набору записей, заменяя только те,
+        что изменились (сравнение по (package, version) и контрольной
+        сумме C:). Индекс провайдеров пересчитывается только для затронутых
+        виртуальных имён. Возвращает IndexDelta с изменившимися рёбрами.
+        """
+        fresh = {(r["name"], r["version"]): r for r in records}
+        delta = IndexDelta()
+        for key, record in fresh.items():
+            old = self.fingerprints.get(key)
+            if old is None:
+                delta.added.append(key)
+            elif old != _fingerprint(record):
+                delta.changed.append(key)
+        delta.removed = [key for key in self.fingerprints if key not in fresh]
+        if not delta:
+            return delta
+
+        # что предоставляли уходящие записи — восстанавливаем по providers
+        outgoing = set(delta.removed + delta.changed)
+        provided_by: dict[tuple[str, str], list[str]] = {}
+        for provided, candidates in self.providers.items():
+            for name, version, _ in candidates:
+                if (name, version) in outgoing:
+                    provided_by.setdefault((name, version), []).append(provided)
+
+        touched = {name for name, _ in delta.added + delta.removed + delta.changed}
+        # имена, чьё разрешение могло поменяться: провайдеры старых и новых
+        # записей, а также сами имена пакетов (пакет важнее провайдера)
+        affected = set(touched)
+        for key in delta.removed + delta.changed:
+            affected.update(provided_by.get(key, ()))
+        for key in delta.added + delta.changed:
+            affected.update(fresh[key].get("provides", []))
+
+        old_resolution = {name: self._target(name) for name in affected}
+        virtual = {name for name in affected if name in self.providers}
+        # пакеты, ссылающиеся на затронутые имена, — их цели тоже могут сдвинуться
+        watched = set(touched)
+        for name, _, deps in self.iter_packages():
+            if name not in watched and any(parse_dependency(d)[0] in affected for d in deps):
+                watched.add(name)
+        before = {name: self._edges(name) for name in watched}
+
+        for key in delta.removed + delta.changed:
+            del self.fingerprints[key]
+            self._drop(key, provided_by.get(key, ()))
+        for key in delta.changed + delta.added:
+            self._put(fresh[key])
+
+        index = self._provider_index
+        if index is None:
+            index = self.build_provider_index()
+        for name in affected:
+            candidates = self.providers.get(name)
+            if candidates:
+                index[name] = _best_provider(candidates)
+                virtual.add(name)
+            else:
+                index.pop(name, None)
+            new = self._target(name)
+            if name in virtual and new != old_resolution[name]:
+                delta.providers[name] = (old_resolution[name], new)
+
+        for name in sorted(watched):
+            after = self._edges(name)
+            if after != before[name]:
+                delta.record_targets(name, before[name], after)
+        return delta
+
+    def _edges(self, package: str) -> set[tuple[str, str]]:
+        """
+        Рёбра графа от всех версий пакета: (узел версии, узел зависимости),
+        как в ReverseIndex.
+        """
+        edges = set()
+        for version, deps in self.packages.get(package, {}).items():
+            source = self.label(package, version)
+            for dep in deps:
+                target = self._target(dep) or dep
+                if target != source:
+                    edges.add((source, target))
+        return edges
+
+    def _put(self, record: dict):
+        # внутренние словари и списки заменяются копиями (см. copy())
+        name = record["name"]
+        version = record["version"]
+        versions = dict(self.packages.get(name, {}))
+        versions[version] = record.get("deps", [])
+        self.packages[name] = versions
+        self.fingerprints[(name, version)] = _fingerprint(record)
+        self._order.pop(name, None)
+
+        entry = (name, version, record.get("provider_priority", 0))
+        for provided in record.get("provides", []):
+            self.providers[provided] = self.providers.get(provided, []) + [entry]
+
+    def _drop(self, key: tuple[str, str], provides):
+        name, version = key
+        versions = dict(self.packages.get(name, {}))
+        versions.pop(version, None)
+        if versions:
+            self.packages[name] = versions
+        else:
+            self.packages.pop(name, None)
+        self._order.pop(name, None)
+
+        for provided in provides:
+            rest = [c for c in self.providers.get(provided, [])
+                    if (c[0], c[1]) != (name, version)]
+            if rest:
+                self.providers[provided] = rest
+            else:
+                self.providers.pop(provided, None)
+
+
+class _HashingReader:
+    """
+    Файлоподобная обёртка: всё прочитанное попадает в digest.
+    """
+
+    def __init__(self, source, digest):
+        self.source = source
+        self.digest = digest
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(size)
+        self.digest.update(chunk)
+        return chunk
+
+    def drain(self):
+        # tarfile останавливается после APKINDEX, хвост архива дочитываем
+        for _ in iter(lambda: self.read(64 * 1024), b""):
+            pass
+
+
+def _best_provider(candidates: list[tuple[str, str, int]]) -> tuple[str, str]:
+    # больший k:, при равенстве — первый по имени; из его версий — самая новая
+    best = min(candidates, key=lambda c: (-c[2], c[0]))
+    versions = [c[1] for c in candidates if c[0] == best[0] and c[2] == best[2]]
+    return best[0], max(versions, key=version_key)
+
+
+def _fingerprint(record: dict):
+    # C: меняется вместе с содержимым пакета; без него сравниваем поля
+    if record.get("checksum"):
+        return record["checksum"]
+    return (tuple(record.get("deps", [])), tuple(record.get("provides", [])),
+            record.get("provider_priority", 0))
+
+
+def parse_records(lines):
+    """
+    Генератор записей APKINDEX из последовательности строк.
+    Каждая запись — dict с ключами name, version, deps,
+    provides, provider_priority, checksum и, если есть, conflicts.
+    """
+    current_pkg = {}
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith("P:"):  # имя
+            current_pkg["name"] = line[2:]
+        elif line.startswith("V:"):  # версия
+            current_pkg["version"] = line[2:]
+        elif line.startswith("D:"):  # зависимости
+            deps = line[2:].split()
+            # "!foo" — конфликт: ребром графа не является
+            current_pkg["deps"] = [d for d in deps if not d.startswith("!")]
+            conflicts = [d[1:] for d in deps if d.startswith("!")]
+            if conflicts:
+                current_pkg["conflicts"] = conflicts
+        elif line.startswith("p:"):  # что пакет предоставляет
+            # "so:libc.musl-x86_64.so.1=1" -> "so:libc.musl-x86_64.so.1"
+            current_pkg["provides"] = [p.split("=", 1)[0] for p in line[2:].split()]
+        elif line.startswith("k:"):  # приоритет провайдера
+            try:
+                current_pkg["provider_priority"] = int(line[2:])
+            except ValueError:
+                pass
+        elif line.startswith("C:"):  # контрольная сумма пакета
+            current_pkg["checksum"] = line[2:]
+        elif line.strip() == "":
+            #конец записи пакета
+            if "name" in current_pkg and "version" in current_pkg:
+                yield current_pkg
+            current_pkg = {}
+
+    # последняя запись может быть без пустой строки в конце
+    if "name" in current_pkg and "version" in current_pkg:
+        yield current_pkg
+
+
+def iter_records(fileobj):
+    """
+    Потоково разбирает APKINDEX.tar.gz из файлоподобного объекта.
+    Архив не буферизуется целиком: tarfile в режиме "r|gz" читает его
+    последовательно, а член APKINDEX декодируется построчно.
+    """
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+        for member in tar:
+            if member.name != "APKINDEX":
+                continue
+            raw = metrics.TimedReader(tar.extractfile(member), "extract")
+            try:
+                yield from parse_records(_lines(raw))
+            finally:
+                raw.report()
+            return
+
+
+def _lines(reader, size: int = 64 * 1024):
+    # читаем блоками: замер времени на каждую строку обошёлся бы дороже
+    tail = b""
+    for chunk in iter(lambda: reader.read(size), b""):
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8")
+    if tail:
+        yield tail.decode("utf-8")
@@ -0,0 +1,129 @@
+# src/apk_version.py
+
+"""
+Версии apk и ограничения в зависимостях.
+
+Версия Alpine: 1.2.3[буква][_суффикс[N]...][-rN], например
+1.36.1-r15, 2.4a_rc2-r0, 20230101_git-r1. version_key() превращает её
+в кортеж, который сравнивается так же, как версии в apk-tools, поэтому
+версии пакета достаточно один раз отсортировать по ключу, а дальше
+искать нужную бинарным поиском.
+
+Зависимость в D: — имя с необязательным ограничением:
+    foo  foo=1.2-r0  foo>=1.2  foo<2  foo>1  foo<=3  foo~1.2  !foo
+"!foo" — конфликт, а не зависимость (см. apk_parser.parse_records).
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+_VERSION = re.compile(
+    r"^(\d+(?:\.\d+)*)([a-z]?)"
+    r"((?:_(?:alpha|beta|pre|rc|cvs|svn|git|hg|p)\d*)*)"
+    r"(?:-r(\d+))?$"
+)
+_SUFFIX = re.compile(r"_([a-z]+)(\d*)")
+
+# суффиксы до релиза меньше "без суффикса" (0), после релиза — больше
+_SUFFIX_RANK = {
+    "alpha": -4, "beta": -3, "pre": -2, "rc": -1,
+    "cvs": 1, "svn": 2, "git": 3, "hg": 4, "p": 5,
+}
+
+_DEPENDENCY = re.compile(r"^([^<>=~]+?)(?:(>=|<=|><|~=|=|<|>|~)(.*))?$")
+
+def is_valid_version(version: str) -> bool:
+    return _VERSION.match(version) is not None
+
+
+@lru_cache(maxsize=65536)
+def version_key(version: str) -> tuple:
+    """
+    Ключ сортировки версии. Некорректные версии меньше любых корректных
+    и сравниваются между собой как строки.
+    """
+    match = _VERSION.match(version)
+    if match is None:
+        return (0, (), version, (), 0)
+
+    digits, letter, suffixes, revision = match.groups()
+    parts = digits.split(".")
+    numbers = [(1, int(parts[0]), "")]
+    for part in parts[1:]:
+        # как в apk: компонент с ведущим нулём сравнивается как дробная часть
+        if part.startswith("0"):
+            numbers.append((0, 0, part.rstrip("0")))
+        else:
+            numbers.append((1, int(part), ""))
+
+    suffix_key = tuple((_SUFFIX_RANK[name], int(n or 0))
+                       for name, n in _SUFFIX.findall(suffixes)) + ((0, 0),)
+    return (1, tuple(numbers), letter, suffix_key, int(revision or 0))
+
+
+@lru_cache(maxsize=65536)
+def parse_dependency(dep: str) -> tuple[str, str | None, str | None]:
+    """
+    "foo>=1.2-r0" -> ("foo", ">=", "1.2-r0"), "so:libc.so" -> ("so:libc.so", None, None).
+    ~= приводится к ~.
+    """
+    match = _DEPENDENCY.match(dep)
+    if match is None:
+        return dep, None, None
+    name, op, version = match.groups()
+    if op == "~=":
+        op = "~"
+    return name, op, version
+
+
+def fuzzy_match(version: str, prefix: str) -> bool:
+    """
+    foo~1.2: версия совпадает с 1.2 или продолжает её новым компонентом
+    (1.2.3, 1.2_rc1, 1.2-r4), но не 1.20.
+    """
+    if not version.startswith(prefix):
+        return False
+    rest = version[len(prefix):]
+    return not rest or rest[0] in "._-" or (not prefix[-1:].isalpha() and rest[0].isalpha())
+
+
+def select_version(keys: list[tuple], versions: list[str],
+                   op: str | None, version: str | None) -> str | None:
+    """
+    Самая новая из versions (по возрастанию, keys — их version_key),
+    удовлетворяющая ограничению (op, version), или None.
+    """
+    if not versions:
+        return None
+    if op is None or op == "><":  # >< — ограничение по контрольной сумме
+        return versions[-1]
+    if op == "~":
+        return next((v for v in reversed(versions) if fuzzy_match(v, version)), None)
+
+    key = version_key(version)
+    if op == ">=" or op == ">":
+        i = bisect_left(keys, key) if op == ">=" else bisect_right(keys, key)
+        return versions[-1] if i < len(keys) else None
+    if op == "<=" or op == "<":
+        i = bisect_right(keys, key) if op == "<=" else bisect_left(keys, key)
+        return versions[i - 1] if i > 0 else None
+    # "="
+    lo, hi = bisect_left(keys, key), bisect_right(keys, key)
+    return versions[hi - 1] if hi > lo else None
+
+
+def node_label(name: str, version: str | None) -> str:
+    """
+    Имя узла графа: "foo" — самая новая версия пакета, "foo=1.2-r0" —
+    версия, выбранная ограничением зависимости (foo<2).
+    """
+    return name if version is None else f"{name}={version}"
+
+
+def split_label(label: str) -> tuple[str, str | None]:
+    """
+    Обратно к node_label: "foo=1.2-r0" -> ("foo", "1.2-r0"), "foo" -> ("foo", None).
+    """
+    name, sep, version = label.partition("=")
+    return (name, version) if sep else (label, None)
@@ -0,0 +1,127 @@
+# src/batch.py
+
+"""
+Пакетный режим: много запросов к одному разобранному индексу.
+
+Индекс загружается один раз, замыкания считаются в пуле процессов.
+На Linux пул создаётся через fork, и воркеры получают уже разобранный
+репозиторий без сериализации; на остальных платформах он передаётся
+один раз на воркер через initializer.
+"""
+
+import json
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from dependency_graph import DependencyGraph
+
+# репозиторий и фильтр (SkipIndex), с которыми работает процесс-воркер
+_repo = None
+_skip = None
+
+
+def _init_worker(repo, skip=None):
+    global _repo, _skip
+    _repo = repo
+    _skip = skip
+
+
+def read_queries(lines):
+    """
+    Разбирает строки вида "package" или "package/version".
+    Пустые строки и комментарии (#) пропускаются.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        package, _, version = line.partition("/")
+        yield package.strip(), version.strip() or None
+
+
+def compute_closure(repo, package: str, version: str | None,
+                    max_depth: int, skip=None) -> dict:
+    """
+    Замыкание зависимостей одного пакета в виде, готовом для JSON.
+    skip — фильтр пакетов (filters.SkipIndex / FilterSet) или None.
+    """
+    if repo.resolve(package) is None:
+        raise ValueError(f"Пакет '{package}' не найден")
+    if version is not None:
+        # проверяем версию заранее: build() глотает ошибки get_deps
+        repo.dependencies_of(package, version)
+
+    graph_builder = DependencyGraph(max_depth, skip=skip)
+    graph = graph_builder.build(
+        package, version, lambda name, ver: repo.dependencies_of(name, ver, skip)
+    )
+    return {
+        "package": package,
+        "version": version,
+        "nodes": len(graph),
+        "edges": sum(len(deps) for deps in graph.values()),
+        "graph": graph,
+    }
+
+
+def _run_query(query: tuple[str, str | None], max_depth: int) -> dict:
+    package, version = query
+    try:
+        return compute_closure(_repo, package, version, max_depth, _skip)
+    except Exception as e:
+        # ошибка одного пакета не должна останавливать весь прогон
+        return {"package": package, "version": version, "error": str(e)}
+
+
+def run_batch(repo, queries, out, max_depth: int,
+              skip=None, jobs: int | None = None,
+              window: int | None = None, extra: dict | None = None) -> tuple[int, int]:
+    """
+    Считает замыкания для всех запросов и пишет результаты в out
+    построчно (JSONL) в порядке готовности; готовые одновременно —
+    в порядке входа, так что с одним воркером порядок совпадает с входным.
+
+    window — сколько запросов одновременно находится в работе,
+    чтобы не держать в памяти очередь из всего входного файла.
+    skip — фильтр, посчитанный по индексу один раз (filters.SkipIndex):
+    воркеры получают его вместе с репозиторием.
+    Возвращает (всего, с ошибкой).
+    """
+    global _repo, _skip
+    jobs = jobs or multiprocessing.cpu_count()
+    window = window or 2 * jobs
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        # дочерние процессы унаследуют уже разобранный индекс
+        _repo, _skip = repo, skip
+        pool = ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("fork"))
+    else:
+        pool = ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(repo, skip))
+
+    total = failed = 0
+    pending = set()
+    order: dict = {}  # future -> номер запроса во входе
+
+    def flush(done):
+        nonlocal total, failed
+        for future in sorted(done, key=order.pop):
+            result = future.result()
+            if extra:
+                result.update(extra)
+            total += 1
+            if "error" in result:
+                failed += 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+
+    with pool:
+        for index, query in enumerate(queries):
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                flush(done)
+            future = pool.submit(_run_query, query, max_depth)
+            order[future] = index
+            pending.add(future)
+        flush(wait(pending).done)
+
+    return total, failed
@@ -0,0 +1,222 @@
+# src/benchmark.py
+
+"""
+Нагрузочные замеры на синтетических репозиториях (synthetic_repo.py).
+
+Для каждого размера генерируется репозиторий, затем по фазам замеряются
+время и пик памяти (tracemalloc):
+    download      — ApkRepository.download_index (file://)
+    parse         — ApkRepository.parse_index (потоковый разбор)
+    build         — DependencyGraph.build от первого пакета
+    reverse       — DependencyGraph.find_reverse_dependencies
+    to_dot        — DependencyGraph.to_dot
+    print_ascii   — DependencyGraph.print_ascii (в память)
+    test_repo     — загрузка TestRepository того же размера
+
+Результат — JSON (--output), его можно сравнить с прошлым прогоном:
+    python3 src/benchmark.py --packages 1000 10000 --output bench.json
+    python3 src/benchmark.py --packages 1000 10000 --compare bench.json
+"""
+
+import argparse
+import io
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from apk_parser import ApkRepository
+from dependency_graph import DependencyGraph
+from synthetic_repo import SyntheticConfig, generate, package_name
+from test_repo_loader import TestRepository
+
+PHASES = ("download", "parse", "build", "reverse", "to_dot", "print_ascii", "test_repo")
+
+
+class PhaseTimer:
+    """
+    Замеряет фазы одного прогона: {фаза: {"seconds": ..., "peak_bytes": ...}}.
+    С memory=False tracemalloc не включается (он заметно замедляет код).
+    """
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.results: dict[str, dict] = {}
+
+    def run(self, phase: str, func, *args):
+        if self.memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        value = func(*args)
+        elapsed = time.perf_counter() - start
+        result = {"seconds": elapsed}
+        if self.memory:
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        self.results[phase] = result
+        return value
+
+
+def run_once(paths: dict, config: SyntheticConfig, max_depth: int,
+             memory: bool) -> tuple[dict, dict]:
+    """
+    Один прогон всех фаз. Возвращает (замеры, размеры результатов).
+    """
+    timer = PhaseTimer(memory)
+    root = package_name(0)
+    target = package_name(config.packages - 1)
+
+    repo = ApkRepository(paths["repo_url"])
+    data = timer.run("download", repo.download_index)
+    timer.run("parse", repo.parse_index)
+
+    graph_builder = DependencyGraph(max_depth)
+    graph = timer.run("build", graph_builder.build, root, None, repo.dependencies_of)
+    reverse = timer.run("reverse", graph_builder.find_reverse_dependencies, target)
+    dot = timer.run("to_dot", graph_builder.to_dot, root)
+    ascii_out = io.StringIO()
+    timer.run("print_ascii", graph_builder.print_ascii, root, ascii_out)
+    timer.run("test_repo", TestRepository, paths["test_repo"])
+
+    sizes = {
+        "index_bytes": len(data),
+        "records": len(repo.fingerprints),
+        "graph_nodes": len(graph),
+        "graph_edges": sum(len(deps) for deps in graph.values()),
+        "reverse": len(reverse),
+        "dot_bytes": len(dot),
+        "ascii_bytes": len(ascii_out.getvalue()),
+    }
+    return timer.results, sizes
+
+
+def benchmark(config: SyntheticConfig, repeat: int = 3, max_depth: int = 1_000_000,
+              memory: bool = True, work_dir: str | None = None) -> dict:
+    """
+    Генерирует репозиторий и прогоняет фазы repeat раз. По каждой фазе —
+    минимум и медиана времени, максимум пика памяти.
+    """
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        start = time.perf_counter()
+        paths = generate(tmp, config)
+        generate_seconds = time.perf_counter() - start
+
+        runs = []
+        if memory:
+            tracemalloc.start()
+        try:
+            for _ in range(repeat):
+                runs.append(run_once(paths, config, max_depth, memory))
+        finally:
+            if memory:
+                tracemalloc.stop()
+
+    phases = {}
+    for phase in PHASES:
+        seconds = [timings[phase]["seconds"] for timings, _ in runs]
+        phases[phase] = {"min_seconds": min(seconds), "median_seconds": statistics.median(seconds)}
+        if memory:
+            phases[phase]["peak_bytes"] = max(timings[phase]["peak_bytes"] for timings, _ in runs)
+
+    return {
+        "config": config.to_dict(),
+        "generate_seconds": generate_seconds,
+        "sizes": runs[-1][1],
+        "phases": phases,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float,
+            min_seconds: float = 0.01) -> list[str]:
+    """
+    Сравнивает результаты по (число пакетов, фаза) по минимальному времени.
+    Возвращает список регрессий: фазы, ставшие медленнее более чем на threshold.
+    Фазы быстрее min_seconds в обоих прогонах не проверяются — там один шум.
+    Строки сравнения идут в stderr: stdout может занимать JSON (--output -).
+    """
+    base = {(r["config"]["packages"], phase): values
+            for r in baseline["results"] for phase, values in r["phases"].items()}
+    regressions = []
+    for result in current["results"]:
+        packages = result["config"]["packages"]
+        for phase, values in result["phases"].items():
+            old = base.get((packages, phase))
+            if old is None or old["min_seconds"] <= 0:
+                continue
+            ratio = values["min_seconds"] / old["min_seconds"]
+            line = f"{packages:>7} {phase:<12} {old['min_seconds']:.4f}s -> {values['min_seconds']:.4f}s  x{ratio:.2f}"
+            print(line, file=sys.stderr)
+            noise = max(values["min_seconds"], old["min_seconds"]) < min_seconds
+            if ratio > 1 + threshold and not noise:
+                regressions.append(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочные замеры на синтетических репозиториях")
+    parser.add_argument("--packages", type=int, nargs="+", default=[1000, 10000],
+                        help="Размеры репозитория (можно несколько)")
+    parser.add_argument("--fanout", type=float, default=3.0)
+    parser.add_argument("--chain", type=float, default=0.1)
+    parser.add_argument("--cycles", type=float, default=0.01)
+    parser.add_argument("--providers", type=int, default=100)
+    parser.add_argument("--virtual", type=float, default=0.2)
+    parser.add_argument("--versions", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-depth", type=int, default=1_000_000)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Без tracemalloc: точнее время, но без пика памяти")
+    parser.add_argument("--work-dir", help="Где создавать временные репозитории")
+    parser.add_argument("--output", help="Куда записать JSON ('-' — stdout)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Допустимое замедление при --compare (0.2 = 20%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.01,
+                        help="Более быстрые фазы при --compare не проверяются")
+    args = parser.parse_args()
+
+    if min(args.packages) < 2 or args.repeat < 1 or args.max_depth < 1:
+        print("[ERROR] --packages должен быть >= 2, --repeat и --max-depth >= 1.")
+        sys.exit(1)
+
+    baseline = None
+    if args.compare:
+        try:
+            baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Не удалось прочитать {args.compare}: {e}")
+            sys.exit(1)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [],
+    }
+    for packages in args.packages:
+        config = SyntheticConfig(packages, args.fanout, args.chain, args.cycles,
+                                 args.providers, args.virtual, args.versions, args.seed)
+        print(f"[INFO] {packages} пакетов...", file=sys.stderr)
+        report["results"].append(benchmark(config, args.repeat, args.max_depth,
+                                           not args.no_memory, args.work_dir))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+    elif args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"[INFO] Результаты сохранены: {args.output}", file=sys.stderr)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"[WARN] Замедлилось фаз: {len(regressions)}", file=sys.stderr)
+            sys.exit(1)
+        print("[INFO] Регрессий нет.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,31 @@
 # src/cli.py
 
 import argparse
+import json
 import os
 import sys
 import subprocess
+from contextlib import ExitStack
+from functools import partial
 from pathlib import Path
 
-from apk_parser import ApkRepository
+from analytics import SORT_KEYS, RepositoryAnalytics
+from apk_parser import ApkRepository, iter_records
+from apk_version import is_valid_version, split_label
+from batch import read_queries, run_batch
+from closure import ClosureEngine
+from closure_diff import ClosureDiff
 from dependency_graph import DependencyGraph
-from test_repo_loader import TestRepository
+from exporters import DotExporter, GraphMLExporter, JsonExporter
+from filters import FilterSet, read_rules
+from index_cache import IndexCache
+import metrics
+from multi_repo import MultiRepository, load_for_arches
+from package_store import CompactPackageStore
+from reverse_index import ReverseIndex
+from server import QueryService, make_server
+from snapshot import load_or_build
+from test_repo_loader import LazyTestRepository, TestRepository, file_stamp
 
 
 def error(msg: str):
@@ -21,7 +38,19 @@ def validate_args(args):
     Проверка параметров для этапов 1–5.
     """
 
-    if not args.package or len(args.package.strip()) == 0:
+    if args.diff:
+        validate_diff_args(args)
+        return True
+
+    if args.serve:
+        if args.arch and len(args.arch) > 1:
+            error("Сервер обслуживает одну архитектуру, укажите один --arch.")
+    elif args.batch:
+        if args.batch != "-" and not os.path.exists(args.batch):
+            error(f"Файл со списком пакетов не найден: {args.batch}")
+    elif args.analytics:
+        pass  # метрики считаются по всему репозиторию, пакет не нужен
+    elif not args.package or len(args.package.strip()) == 0:
         error("Имя пакета не может быть пустым.")
 
     # Либо repo-url, либо repo-path (тестовый режим)
@@ -41,12 +70,11 @@ def validate_args(args):
         error(f"Некорректный режим репозитория. Разрешено: {allowed_modes}")
 
     # Проверка версии (для реального репозитория)
-    if args.repo_url:
+    if args.repo_url and not args.batch and not args.serve and not args.analytics:
         if not args.version:
             error("Для реального репозитория необходимо указать --version.")
-        parts = args.version.split(".")
-        if len(parts) < 2:
-            error("Версия должна быть в формате X.Y или X.Y.Z.")
+        if not is_valid_version(args.version):
+            error(f"Некорректная версия apk: '{args.version}' (ожидается вида 1.2.3-r0).")
 
     # Имя файла для картинки
     if not args.output_file.endswith((".png", ".jpg", ".svg")):
@@ -55,9 +83,74 @@ def validate_args(args):
     if args.max_depth < 1:
         error("Максимальная глубина анализа должна быть >= 1.")
 
+    if args.repo_url:
+        if any("{arch}" in url for url in args.repo_url) and not args.arch:
+            error("В --repo-url есть {arch}, укажите --arch.")
+
+    if args.jobs is not None and args.jobs < 1:
+        error("--jobs должен быть >= 1.")
+
+    if args.refresh_interval < 0:
+        error("--refresh-interval не может быть отрицательным.")
+
+    if args.server_cache_size < 1:
+        error("--server-cache-size должен быть >= 1.")
+
+    if args.window is not None and args.window < 1:
+        error("--window должен быть >= 1.")
+
+    if args.ascii_max_lines is not None and args.ascii_max_lines < 1:
+        error("--ascii-max-lines должен быть >= 1.")
+
+    if args.ascii_width is not None and args.ascii_width < 8:
+        error("--ascii-width должен быть >= 8.")
+
+    if args.reverse_depth is not None and args.reverse_depth < 1:
+        error("Глубина обратных зависимостей должна быть >= 1.")
+
+    if args.cache_ttl < 0:
+        error("TTL кэша не может быть отрицательным.")
+
+    if args.cache_max_mb < 1:
+        error("Размер кэша должен быть >= 1 МБ.")
+
+    if args.offline and args.no_cache:
+        error("Офлайн-режим работает только с кэшем (уберите --no-cache).")
+
+    if args.top < 1:
+        error("--top должен быть >= 1.")
+
+    if args.filter_file and not os.path.exists(args.filter_file):
+        error(f"Файл с правилами фильтра не найден: {args.filter_file}")
+
+    if args.lazy_cache_size < 1:
+        error("--lazy-cache-size должен быть >= 1.")
+
+    if args.profile_output and not args.profile_phase:
+        error("--profile-output имеет смысл только вместе с --profile-phase.")
+
     return True
 
 
+def validate_diff_args(args):
+    """
+    Проверка параметров режима --diff: индексы берутся из --diff,
+    корни — из --package или --roots.
+    """
+    if args.repo_url or args.repo_path:
+        error("С --diff индексы задаются только в --diff OLD NEW.")
+    if not args.package and not args.roots:
+        error("Для --diff укажите --package или --roots.")
+    if args.package and args.roots:
+        error("Укажите либо --package, либо --roots, но не оба сразу.")
+    if args.roots and args.roots != "-" and not os.path.exists(args.roots):
+        error(f"Файл со списком корней не найден: {args.roots}")
+    if args.cache_ttl < 0:
+        error("TTL кэша не может быть отрицательным.")
+    if args.offline and args.no_cache:
+        error("Офлайн-режим работает только с кэшем (уберите --no-cache).")
+
+
 def print_stage1(args):
     """
     Вывод всех параметров — Этап 1.
@@ -69,140 +162,569 @@ def print_stage1(args):
 
 # === Вспомогательная функция для этапа 5 ===
 
-def save_graph_image(dot_text: str, output_file: str):
+class _Tee:
+    """
+    Пишет один и тот же текст сразу в несколько потоков.
+    """
+
+    def __init__(self, *outs):
+        self.outs = outs
+
+    def write(self, text: str):
+        for out in self.outs:
+            out.write(text)
+
+
+class _Pipe:
     """
-    Сохраняет DOT-файл и пытается сгенерировать PNG с помощью утилиты dot (Graphviz).
-    Если dot не установлен, хотя бы оставляем .dot.
+    stdin утилиты dot. Если dot закрыл вход раньше времени, запись в него
+    прекращается, а остальные выходы _Tee дописываются до конца.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.broken = False
+
+    def write(self, text: str):
+        if self.broken:
+            return
+        try:
+            self.out.write(text)
+        except OSError:  # BrokenPipeError и родственные
+            self.broken = True
+
+    def close(self):
+        try:
+            self.out.close()
+        except OSError:
+            self.broken = True
+
+
+def save_graph_image(graph_builder: DependencyGraph, root_pkg: str, output_file: str,
+                     write_dot_file: bool = True, json_file: str | None = None,
+                     graphml_file: str | None = None):
+    """
+    Этап 5: за один обход графа пишет DOT сразу в stdin утилиты dot
+    (Graphviz, формат по расширению output_file) и, по желанию, в .dot-файл,
+    JSON и GraphML. Временных файлов нет. Если dot не установлен,
+    хотя бы оставляем .dot — даже когда он не был заказан.
     """
     out_path = Path(output_file)
     dot_path = out_path.with_suffix(".dot")
+    image_format = out_path.suffix[1:].lower()
+
+    with metrics.phase("graphviz"), ExitStack() as stack:
+        sinks = []
+        if write_dot_file:
+            sinks.append(stack.enter_context(dot_path.open("w", encoding="utf-8")))
+
+        # пробуем запустить Graphviz
+        proc = pipe = None
+        try:
+            proc = subprocess.Popen(
+                ["dot", f"-T{image_format}", "-o", str(out_path)],
+                stdin=subprocess.PIPE, text=True, encoding="utf-8",
+            )
+            pipe = _Pipe(proc.stdin)
+            sinks.append(pipe)
+        except FileNotFoundError:
+            print("[WARN] Утилита 'dot' (Graphviz) не найдена. "
+                  f"{image_format.upper()} не создан, используйте DOT-файл для визуализации.")
+            if not write_dot_file:
+                # с --no-dot-file граф иначе не сохранился бы вовсе
+                write_dot_file = True
+                sinks.append(stack.enter_context(dot_path.open("w", encoding="utf-8")))
+
+        exporters = [DotExporter(_Tee(*sinks))] if sinks else []
+        if json_file:
+            exporters.append(JsonExporter(stack.enter_context(
+                open(json_file, "w", encoding="utf-8"))))
+        if graphml_file:
+            exporters.append(GraphMLExporter(stack.enter_context(
+                open(graphml_file, "w", encoding="utf-8"))))
+
+        try:
+            graph_builder.export(root_pkg, exporters)
+        finally:
+            if proc is not None:
+                pipe.close()
+                proc.wait()  # время работы dot тоже входит в фазу
+
+    if write_dot_file:
+        print(f"[INFO] DOT-файл сохранён: {dot_path}")
+    if json_file:
+        print(f"[INFO] JSON сохранён: {json_file}")
+    if graphml_file:
+        print(f"[INFO] GraphML сохранён: {graphml_file}")
+
+    if proc is not None:
+        if pipe.broken:
+            print(f"[WARN] dot закрыл вход раньше времени (код возврата {proc.returncode}): "
+                  f"{image_format.upper()} не создан или неполон")
+        elif proc.returncode == 0:
+            print(f"[INFO] {image_format.upper()} изображение сохранено: {out_path}")
+        else:
+            print(f"[WARN] Ошибка при генерации {image_format.upper()} через dot: "
+                  f"код возврата {proc.returncode}")
 
-    # сохраняем DOT
-    with dot_path.open("w", encoding="utf-8") as f:
-        f.write(dot_text)
 
-    print(f"[INFO] DOT-файл сохранён: {dot_path}")
+def make_filters(args) -> FilterSet:
+    """
+    Все правила --filter и --filter-file, скомпилированные в один FilterSet.
+    """
+    rules = list(args.filter or [])
+    if args.filter_file:
+        with open(args.filter_file, "r", encoding="utf-8") as f:
+            rules.extend(read_rules(f))
+    return FilterSet(rules)
 
-    # пробуем запустить Graphviz
-    try:
-        subprocess.run(
-            ["dot", "-Tpng", str(dot_path), "-o", str(out_path)],
-            check=True
-        )
-        print(f"[INFO] PNG изображение сохранено: {out_path}")
-    except FileNotFoundError:
-        print("[WARN] Утилита 'dot' (Graphviz) не найдена. "
-              "PNG не создан, используйте DOT-файл для визуализации.")
-    except subprocess.CalledProcessError as e:
-        print(f"[WARN] Ошибка при генерации PNG через dot: {e}")
+
+def bind_filters(repo, filters: FilterSet):
+    """
+    Фильтр, заранее посчитанный по всем именам индекса (SkipIndex),
+    или None, если правил нет.
+    """
+    if not filters:
+        return None
+    return filters.bind(repo)
+
+
+def make_cache(args) -> IndexCache | None:
+    """
+    Дисковый кэш APKINDEX по параметрам командной строки.
+    """
+    if args.no_cache:
+        return None
+    return IndexCache(
+        args.cache_dir,
+        ttl=args.cache_ttl,
+        offline=args.offline,
+        max_size=args.cache_max_mb * 1024 * 1024,
+    )
+
+
+def print_reverse(repo, args):
+    """
+    Этап 4: кто транзитивно зависит от пакета (обратный индекс по всему репозиторию).
+    """
+    with metrics.phase("reverse"):
+        index = ReverseIndex(repo)
+        rev = index.query(args.package, args.reverse_depth)
+    if not rev:
+        print("(нет пакетов, зависящих от данного)")
+        return
+    for pkg, depth in rev:
+        print(f"{pkg} (глубина {depth})")
+    # узлы "foo=1.0-r0" и "foo=1.1-r0" — один и тот же зависящий пакет
+    packages = {split_label(pkg)[0] for pkg, _ in rev}
+    direct = {split_label(pkg)[0] for pkg in index.direct(args.package)}
+    print(f"[INFO] Всего зависящих пакетов: {len(packages)} (напрямую: {len(direct)})")
+
+
+def print_closure(repo, args):
+    """
+    Полное транзитивное замыкание пакета и циклы, найденные
+    через сжатие сильно связных компонент.
+    """
+    engine = ClosureEngine(repo)
+
+    if args.closure:
+        with metrics.phase("closure"):
+            closure = engine.closure(args.package)
+        for pkg in sorted(closure):
+            print(pkg)
+        print(f"[INFO] Пакетов в замыкании: {len(closure)}")
+        cycle = engine.cycle_of(args.package)
+        if cycle:
+            print(f"[INFO] Пакет входит в цикл: {', '.join(cycle)}")
+
+    if args.cycles:
+        with metrics.phase("closure"):
+            cycles = engine.cycles()
+        print(f"\n=== CYCLES ({len(cycles)}) ===")
+        for members in cycles:
+            print(", ".join(members))
+
+
+def print_analytics(repo, args):
+    """
+    Метрики по всем пакетам репозитория: таблица первых --top строк,
+    отсортированная по --sort, и самая длинная цепочка зависимостей.
+    """
+    analytics = RepositoryAnalytics(repo)
+    rows = analytics.report(args.sort)
+
+    print(f"{'package':<32} {'fan_in':>8} {'direct':>7} {'closure':>8} {'depth':>6}")
+    for row in rows[:args.top]:
+        cycle = "  (cycle)" if row["cycle"] else ""
+        print(f"{row['package']:<32} {row['fan_in']:>8} {row['direct_in']:>7} "
+              f"{row['closure']:>8} {row['depth']:>6}{cycle}")
+    print(f"[INFO] Пакетов: {len(rows)}, компонент: {len(analytics.engine.members)}")
+
+    if rows:
+        deepest = max(rows, key=lambda r: (r["depth"], r["package"]))
+        chain = analytics.chain(deepest["package"])
+        print(f"[INFO] Самая длинная цепочка ({len(chain) - 1} рёбер): {' -> '.join(chain)}")
+
+    if args.analytics_json:
+        with open(args.analytics_json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False)
+        print(f"[INFO] Полный отчёт сохранён: {args.analytics_json}")
 
 
 # === Этапы 2–5: работа с реальным репозиторием ===
 
-def build_graph_real_repo(args):
+def build_graph_real_repo(args, filters: FilterSet):
     """
-    Реальный репозиторий Alpine.
+    Реальный репозиторий Alpine (один или несколько, для одной или
+    нескольких архитектур).
     """
     print("\n[INFO] Режим: Реальный Alpine репозиторий")
 
-    repo = ApkRepository(args.repo_url)
-    print("[INFO] Загружаем APKINDEX.tar.gz...")
+    arches = args.arch or [None]
+    print(f"[INFO] Загружаем APKINDEX.tar.gz ({len(args.repo_url)} репоз. "
+          f"x {len(arches)} арх.)...")
 
     try:
-        repo.parse_index()
+        if args.snapshot:
+            repos = load_snapshots(args, arches)
+        else:
+            repos = load_for_arches(
+                args.repo_url, arches, make_cache(args),
+                mirror=args.repo_mode == "mirror", max_workers=args.jobs,
+            )
     except Exception as e:
         error(f"Не удалось обработать APKINDEX: {e}")
 
-    print("[INFO] APKINDEX успешно загружен.")
+    for arch, repo in repos.items():
+        if len(repos) > 1:
+            print(f"\n##### {arch} #####")
+        for url in getattr(repo, "repo_urls", []):
+            if url not in repo.statuses:
+                continue  # зеркало, ответ которого не понадобился
+            status = repo.statuses[url]
+            suffix = f" (кэш: {status})" if status else ""
+            print(f"[INFO] APKINDEX успешно загружен: {url}{suffix}")
+
+        output_file = args.output_file
+        if len(repos) > 1:
+            out = Path(output_file)
+            output_file = str(out.with_name(f"{out.stem}-{arch}{out.suffix}"))
+        analyze_real_repo(repo, args, output_file, filters)
+
+
+def snapshot_path(path: str, arch: str | None) -> str:
+    if not arch:
+        return path
+    p = Path(path)
+    return str(p.with_name(f"{p.stem}-{arch}{p.suffix}"))
+
+
+def parsed(repo):
+    """
+    Разбирает индекс репозитория и возвращает сам репозиторий
+    (сборщик для load_or_build).
+    """
+    repo.parse_index()
+    return repo
+
+
+def load_snapshots(args, arches: list[str | None]) -> dict:
+    """
+    Для каждой архитектуры берёт индекс из бинарного снимка --snapshot,
+    а если снимка нет или исходный индекс поменялся — разбирает
+    индекс заново и перезаписывает снимок. Свежесть проверяется по
+    ETag / Last-Modified (source_stamp), архив для этого не хешируется.
+    """
+    repos = {}
+    for arch in arches:
+        repo = MultiRepository(
+            [url.replace("{arch}", arch) if arch else url for url in args.repo_url],
+            make_cache(args), mirror=args.repo_mode == "mirror", max_workers=args.jobs,
+        )
+        path = snapshot_path(args.snapshot, arch)
+        store, loaded = load_or_build(path, repo.source_stamp(), partial(parsed, repo))
+        state = "загружен" if loaded else "пересобран"
+        print(f"[INFO] Снимок индекса {state}: {path}")
+        repos[arch] = store
+    return repos
+
+
+def analyze_real_repo(repo, args, output_file: str, filters: FilterSet):
+    """
+    Этапы 3–5 для уже загруженного репозитория.
+    """
+    if args.compact and not isinstance(repo, CompactPackageStore):
+        repo = CompactPackageStore.from_repository(repo)
+        print(f"[INFO] Индекс упакован в компактное хранилище ({len(repo)} пакетов).")
+
+    if args.analytics:
+        print("\n=== ANALYTICS (REAL REPO) ===")
+        print_analytics(repo, args)
+        return
+
     print(f"[INFO] Строим граф зависимостей для {args.package}:{args.version}")
 
-    graph_builder = DependencyGraph(args.max_depth, args.filter)
+    graph_builder = DependencyGraph(args.max_depth, skip=bind_filters(repo, filters))
 
     def get_deps(package_name: str, version: str | None):
         """
         Корневой пакет — используем точную версию.
         Внутренние узлы — берём любую доступную версию.
+        Виртуальные имена (so:, cmd:, /bin/sh) разрешаются через провайдеров,
+        если их не отсекает фильтр (class:so и т. п.).
         """
-        if version is not None:
-            return repo.get_dependencies(package_name, version)
-
-        if package_name in repo.packages:
-            versions = list(repo.packages[package_name].keys())
-            if versions:
-                any_version = versions[-1]
-                return repo.get_dependencies(package_name, any_version)
+        return repo.dependencies_of(package_name, version, graph_builder.skip)
 
-        return []
-
-    graph = graph_builder.build(args.package, args.version, get_deps)
-
-    # Этап 4: обратные зависимости
+    # Этап 4: обратные зависимости — по всему репозиторию, а не по подграфу
     if args.reverse:
         print("\n=== REVERSE DEPENDENCIES (REAL REPO) ===")
-        rev = graph_builder.find_reverse_dependencies(args.package)
-        if not rev:
-            print("(нет пакетов, зависящих от данного)")
-        else:
-            for r in rev:
-                print(r)
+        print_reverse(repo, args)
         # для отчёта по этапу 4 этого достаточно, PNG можно не строить
         return
 
+    # полное замыкание и циклы — по всему репозиторию
+    if args.closure or args.cycles:
+        print("\n=== CLOSURE (REAL REPO) ===")
+        print_closure(repo, args)
+        return
+
+    graph = graph_builder.build(args.package, args.version, get_deps)
+
     # Этап 3: вывод графа
     print("\n=== DEPENDENCY GRAPH (REAL REPO) ===")
     if args.ascii:
-        graph_builder.print_ascii(args.package)
+        graph_builder.print_ascii(args.package, max_lines=args.ascii_max_lines,
+                                  max_width=args.ascii_width)
     else:
         for pkg, deps in graph.items():
             deps_str = ", ".join(deps) if deps else "(нет)"
             print(f"{pkg}: {deps_str}")
 
     # Этап 5: DOT + PNG
-    dot_text = graph_builder.to_dot(args.package)
-    save_graph_image(dot_text, args.output_file)
+    save_graph_image(graph_builder, args.package, output_file,
+                     write_dot_file=not args.no_dot_file,
+                     json_file=args.json_output, graphml_file=args.graphml_output)
 
 
 # === Этапы 3–5: тестовый репозиторий ===
 
-def build_graph_test_repo(args):
+def open_test_repo(args, path: str | None = None):
+    """
+    Тестовый репозиторий (по умолчанию --repo-path): целиком в памяти
+    или (--lazy) через mmap с разбором зависимостей по требованию.
+    """
+    path = path or args.repo_path
+    if args.lazy:
+        index_dir = Path(args.cache_dir) / "lazy" if args.cache_dir else None
+        return LazyTestRepository(path, cache_size=args.lazy_cache_size,
+                                  sidecar=not args.no_sidecar, index_dir=index_dir)
+    return TestRepository(path)
+
+
+def build_graph_test_repo(args, filters: FilterSet):
     """
     Тестовый режим (из файла test_repo*.txt).
     """
     print("\n[INFO] Режим: Тестовый репозиторий (файл)")
 
-    repo = TestRepository(args.repo_path)
+    if args.snapshot:
+        repo, loaded = load_or_build(args.snapshot, file_stamp(args.repo_path),
+                                     partial(open_test_repo, args))
+        state = "загружен" if loaded else "пересобран"
+        print(f"[INFO] Снимок индекса {state}: {args.snapshot}")
+    else:
+        repo = open_test_repo(args)
+    if args.compact and not isinstance(repo, CompactPackageStore):
+        repo = CompactPackageStore.from_repository(repo)
 
-    graph_builder = DependencyGraph(args.max_depth, args.filter)
+    graph_builder = DependencyGraph(args.max_depth, skip=bind_filters(repo, filters))
 
     def get_deps(package_name: str, version: str | None):
-        return repo.get_dependencies(package_name)
-
-    graph = graph_builder.build(args.package, args.version, get_deps)
+        return repo.dependencies_of(package_name)
 
-    # Этап 4: обратные зависимости
+    # Этап 4: обратные зависимости — по всему репозиторию, а не по подграфу
     if args.reverse:
         print("\n=== REVERSE DEPENDENCIES (TEST REPO) ===")
-        rev = graph_builder.find_reverse_dependencies(args.package)
-        if not rev:
-            print("(нет пакетов, зависящих от данного)")
-        else:
-            for r in rev:
-                print(r)
+        print_reverse(repo, args)
         # здесь тоже можно не строить PNG, но если хочешь — сними return
         return
 
+    # полное замыкание и циклы — по всему репозиторию
+    if args.closure or args.cycles:
+        print("\n=== CLOSURE (TEST REPO) ===")
+        print_closure(repo, args)
+        return
+
+    if args.analytics:
+        print("\n=== ANALYTICS (TEST REPO) ===")
+        print_analytics(repo, args)
+        return
+
+    graph = graph_builder.build(args.package, args.version, get_deps)
+
     # Этап 3: прямой граф
     print("\n=== DEPENDENCY GRAPH (TEST REPO) ===")
     if args.ascii:
-        graph_builder.print_ascii(args.package)
+        graph_builder.print_ascii(args.package, max_lines=args.ascii_max_lines,
+                                  max_width=args.ascii_width)
     else:
         for pkg, deps in graph.items():
             deps_str = ", ".join(deps) if deps else "(нет зависимостей)"
             print(f"{pkg}: {deps_str}")
 
     # Этап 5: DOT + PNG (можно показать красивую картинку даже для тестового графа)
-    dot_text = graph_builder.to_dot(args.package)
-    save_graph_image(dot_text, args.output_file)
+    save_graph_image(graph_builder, args.package, args.output_file,
+                     write_dot_file=not args.no_dot_file,
+                     json_file=args.json_output, graphml_file=args.graphml_output)
+
+
+# === Пакетный режим ===
+
+def run_batch_mode(args, filters: FilterSet):
+    """
+    Читает список package[/version] и печатает замыкания в JSONL.
+    Служебные сообщения идут в stderr, чтобы не смешиваться с результатом.
+    """
+    if args.repo_path:
+        repos = {None: open_test_repo(args)}
+    else:
+        try:
+            repos = load_for_arches(
+                args.repo_url, args.arch or [None], make_cache(args),
+                mirror=args.repo_mode == "mirror", max_workers=args.jobs,
+            )
+        except Exception as e:
+            error(f"Не удалось обработать APKINDEX: {e}")
+
+    source = sys.stdin if args.batch == "-" else open(args.batch, "r", encoding="utf-8")
+    with source:
+        queries = read_queries(source)
+        if len(repos) > 1:
+            # для нескольких архитектур список нужен повторно (stdin не перечитать)
+            queries = list(queries)
+
+        for arch, repo in repos.items():
+            if args.compact:
+                repo = CompactPackageStore.from_repository(repo)
+            total, failed = run_batch(
+                repo, queries, sys.stdout, args.max_depth, bind_filters(repo, filters),
+                jobs=args.jobs, window=args.window,
+                extra={"arch": arch} if arch else None,
+            )
+            print(f"[INFO] Обработано запросов: {total}, с ошибкой: {failed}",
+                  file=sys.stderr)
+
+
+# === Сравнение двух индексов ===
+
+def load_index_source(source: str, args):
+    """
+    Индекс для --diff: локальный APKINDEX.tar.gz, каталог с ним,
+    файл тестового репозитория или URL репозитория (удалённый — через
+    кэш, локальные файлы читаются напрямую).
+    """
+    path = Path(source)
+    if path.is_file() and source.endswith(".tar.gz"):
+        repo = ApkRepository(path.resolve().parent.as_uri())
+        with path.open("rb") as f, metrics.phase("parse"):
+            for record in iter_records(f):
+                repo.add_record(record)
+        return repo
+    if path.is_file():
+        return open_test_repo(args, source)
+    if path.is_dir():
+        source = path.resolve().as_uri()
+    repo = MultiRepository([source], make_cache(args))
+    repo.parse_index()
+    return repo
+
+
+def run_diff_mode(args):
+    """
+    Печатает в JSONL, как меняются замыкания корней при переходе
+    со старого индекса на новый. Неизменившиеся корни не печатаются.
+    """
+    old_source, new_source = args.diff
+    try:
+        old_repo = load_index_source(old_source, args)
+        new_repo = load_index_source(new_source, args)
+    except Exception as e:
+        error(f"Не удалось загрузить индекс: {e}")
+
+    if args.roots:
+        source = sys.stdin if args.roots == "-" else open(args.roots, "r", encoding="utf-8")
+        with source:
+            roots = [package for package, _ in read_queries(source)]
+    else:
+        roots = [args.package]
+
+    differ = ClosureDiff(old_repo, new_repo)
+    changed = 0
+    for root in roots:
+        result = differ.diff(root)
+        if not result["changed"]:
+            continue
+        changed += 1
+        print(json.dumps(result, ensure_ascii=False))
+    print(f"[INFO] Корней: {len(roots)}, изменилось: {changed}", file=sys.stderr)
+
+
+# === Режим сервера ===
+
+def run_server_mode(args, filters: FilterSet):
+    """
+    Загружает индекс один раз и отвечает на запросы по HTTP / Unix-сокету,
+    периодически проверяя, не обновился ли исходный индекс.
+    """
+    if args.repo_path:
+        def check():
+            return file_stamp(args.repo_path)
+
+        def loader():
+            repo = open_test_repo(args)
+            return repo, repo.index_checksum
+    else:
+        arch = args.arch[0] if args.arch else None
+        urls = [url.replace("{arch}", arch) if arch else url for url in args.repo_url]
+
+        def make_repo():
+            return MultiRepository(urls, make_cache(args),
+                                   mirror=args.repo_mode == "mirror", max_workers=args.jobs)
+
+        def check():
+            # ETag / Last-Modified, а не sha256: архив скачивается, только если отпечаток сменился
+            return make_repo().source_stamp()
+
+        def loader():
+            repo = make_repo()
+            repo.parse_index()
+            return repo, repo.index_checksum
+
+    def compact_loader():
+        repo, checksum = loader()
+        if args.compact:
+            repo = CompactPackageStore.from_repository(repo)
+        return repo, checksum
+
+    try:
+        service = QueryService(compact_loader, check, cache_size=args.server_cache_size,
+                               refresh_interval=args.refresh_interval,
+                               filters=filters)
+    except Exception as e:
+        error(f"Не удалось загрузить индекс: {e}")
+
+    server = make_server(service, args.listen)
+    service.start_refresher()
+    print(f"[INFO] Сервер запущен: {args.listen}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+        print("[INFO] Сервер остановлен.")
 
 
 def main():
@@ -210,34 +732,175 @@ def main():
         description="Dependency Graph Visualizer – этапы 1–5"
     )
 
-    parser.add_argument("--package", required=True, help="Имя пакета")
-    parser.add_argument("--repo-url", help="URL Alpine репозитория")
+    parser.add_argument("--package", help="Имя пакета")
+    parser.add_argument("--repo-url", nargs="+", action="extend",
+                        help="URL Alpine репозитория; можно несколько "
+                             "(порядок = приоритет), {arch} подставляется из --arch")
     parser.add_argument("--repo-path", help="Путь к тестовому репозиторию (файл)")
     parser.add_argument("--repo-mode", default="local",
-                        help="Режим: local/remote/mirror/test")
+                        help="Режим: local/remote/mirror/test "
+                             "(mirror — несколько --repo-url как зеркала одного репозитория)")
+    parser.add_argument("--arch", nargs="+", action="extend",
+                        help="Архитектуры (x86_64 aarch64 ...) для подстановки в {arch}")
+    parser.add_argument("--jobs", type=int,
+                        help="Число потоков/процессов для параллельной загрузки")
     parser.add_argument("--version", help="Версия пакета (для реального репо)")
     parser.add_argument("--output-file", default="graph.png",
                         help="Файл для изображения графа (PNG/JPG/SVG)")
+    parser.add_argument("--no-dot-file", action="store_true",
+                        help="Не сохранять .dot рядом с изображением "
+                             "(DOT всё равно передаётся в Graphviz через stdin; "
+                             "если Graphviz не найден, .dot сохраняется)")
+    parser.add_argument("--json-output",
+                        help="Дополнительно сохранить граф как JSON (список смежности)")
+    parser.add_argument("--graphml-output",
+                        help="Дополнительно сохранить граф в формате GraphML")
     parser.add_argument("--ascii", action="store_true",
                         help="Вывод зависимостей в виде ASCII-дерева")
+    parser.add_argument("--ascii-max-lines", type=int,
+                        help="Ограничить число строк ASCII-дерева")
+    parser.add_argument("--ascii-width", type=int,
+                        help="Обрезать строки ASCII-дерева до заданной ширины")
     parser.add_argument("--max-depth", type=int, default=3,
                         help="Максимальная глубина анализа")
-    parser.add_argument("--filter",
-                        help="Игнорировать пакеты, содержащие подстроку")
+    parser.add_argument("--filter", action="append",
+                        help="Не раскрывать подходящие пакеты; можно несколько. Подстрока "
+                             "или glob:py3-*, re:^lib.*-dev$, class:so, allow:<правило>")
+    parser.add_argument("--filter-file",
+                        help="Файл с правилами фильтра, по одному в строке")
     parser.add_argument("--reverse", action="store_true",
                         help="Вывести обратные зависимости (Этап 4)")
+    parser.add_argument("--reverse-depth", type=int,
+                        help="Ограничить глубину поиска обратных зависимостей")
+    parser.add_argument("--closure", action="store_true",
+                        help="Вывести полное транзитивное замыкание пакета")
+    parser.add_argument("--cycles", action="store_true",
+                        help="Вывести все циклы зависимостей в репозитории")
+    parser.add_argument("--analytics", action="store_true",
+                        help="Метрики по всему репозиторию: транзитивный fan-in, "
+                             "размер замыкания, длина цепочек")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="fan_in",
+                        help="Сортировка отчёта --analytics")
+    parser.add_argument("--top", type=int, default=20,
+                        help="Сколько строк отчёта --analytics напечатать")
+    parser.add_argument("--analytics-json",
+                        help="Сохранить отчёт --analytics по всем пакетам в JSON")
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"),
+                        help="Сравнить замыкания корней между двумя индексами "
+                             "(URL, каталог, APKINDEX.tar.gz или тестовый файл); JSONL")
+    parser.add_argument("--roots",
+                        help="Файл с корнями для --diff, по одному в строке ('-' — stdin)")
+    parser.add_argument("--batch",
+                        help="Файл со строками package[/version] ('-' — stdin); "
+                             "результаты печатаются в JSONL")
+    parser.add_argument("--window", type=int,
+                        help="Сколько запросов пакетного режима держать в работе "
+                             "одновременно (по умолчанию 2 * --jobs)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Запустить сервер запросов с индексом в памяти")
+    parser.add_argument("--listen", default="127.0.0.1:8080",
+                        help="Адрес сервера: host:port (HTTP) или unix:/path/to.sock")
+    parser.add_argument("--refresh-interval", type=float, default=300,
+                        help="Как часто (сек) сервер проверяет обновление индекса; 0 — никогда")
+    parser.add_argument("--server-cache-size", type=int, default=1024,
+                        help="Размер LRU-кэша ответов сервера")
+    parser.add_argument("--compact", action="store_true",
+                        help="Хранить индекс в компактном виде "
+                             "(интернированные имена, CSR-массивы)")
+    parser.add_argument("--snapshot",
+                        help="Файл бинарного снимка индекса: загружается через mmap "
+                             "без разбора, пересобирается при смене исходного индекса")
+    parser.add_argument("--lazy", action="store_true",
+                        help="Тестовый репозиторий: отобразить файл через mmap и разбирать "
+                             "зависимости только по требованию (для очень больших файлов)")
+    parser.add_argument("--lazy-cache-size", type=int, default=65536,
+                        help="Сколько разобранных пакетов держать в памяти при --lazy")
+    parser.add_argument("--no-sidecar", action="store_true",
+                        help="При --lazy не сохранять индекс смещений "
+                             "(он лежит в <каталог кэша>/lazy)")
+    parser.add_argument("--cache-dir",
+                        help="Каталог кэша APKINDEX "
+                             "(по умолчанию ~/.cache/dependency-visualizer)")
+    parser.add_argument("--cache-ttl", type=int, default=3600,
+                        help="Сколько секунд копия в кэше считается свежей")
+    parser.add_argument("--cache-max-mb", type=int, default=200,
+                        help="Максимальный размер кэша в МБ")
+    parser.add_argument("--offline", action="store_true",
+                        help="Не ходить в сеть, использовать только кэш")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Не использовать дисковый кэш APKINDEX")
+    parser.add_argument("--profile", action="store_true",
+                        help="Вывести в stderr время и пик памяти по фазам и счётчики")
+    parser.add_argument("--metrics-json",
+                        help="Сохранить замеры по фазам и счётчики в JSON ('-' — stderr)")
+    parser.add_argument("--profile-phase",
+                        choices=["download", "extract", "parse", "build", "reverse",
+                                 "closure", "analytics", "diff", "ascii", "graphviz"],
+                        help="Включить cProfile на время фазы")
+    parser.add_argument("--profile-output",
+                        help="Куда записать статистику cProfile (по умолчанию <фаза>.prof)")
 
     args = parser.parse_args()
     validate_args(args)
+    try:
+        filters = make_filters(args)
+    except ValueError as e:
+        error(str(e))
+
+    if not (args.profile or args.metrics_json or args.profile_phase):
+        run(args, filters)
+        return
+
+    collector = metrics.Metrics(memory=bool(args.profile or args.metrics_json),
+                                profile_phase=args.profile_phase,
+                                profile_file=args.profile_output)
+    try:
+        with metrics.activate(collector):
+            run(args, filters)
+    finally:
+        report_metrics(collector, args)
+
+
+def report_metrics(collector, args):
+    """
+    Печатает/сохраняет замеры. Всё идёт в stderr, чтобы не смешиваться
+    с результатом (JSONL пакетного режима и т. п.).
+    """
+    if args.profile:
+        print(collector.format_report(), file=sys.stderr)
+    if args.metrics_json:
+        text = json.dumps(collector.to_dict(), ensure_ascii=False, indent=2)
+        if args.metrics_json == "-":
+            print(text, file=sys.stderr)
+        else:
+            Path(args.metrics_json).write_text(text + "\n", encoding="utf-8")
+            print(f"[INFO] Замеры сохранены: {args.metrics_json}", file=sys.stderr)
+    if collector.profile_phase:
+        print(f"[INFO] cProfile ({collector.profile_phase}): {collector.profile_file}",
+              file=sys.stderr)
+
+
+def run(args, filters: FilterSet):
+    if args.diff:
+        run_diff_mode(args)
+        return
+
+    if args.serve:
+        run_server_mode(args, filters)
+        return
+
+    if args.batch:
+        run_batch_mode(args, filters)
+        return
 
     # Этап 1: вывод параметров
     print_stage1(args)
 
     # Этапы 2–5
     if args.repo_path:
-        build_graph_test_repo(args)
+        build_graph_test_repo(args, filters)
     else:
-        build_graph_real_repo(args)
+        build_graph_real_repo(args, filters)
 
     print("\n[INFO] Этап 5 завершён.")
 
@@ -0,0 +1,207 @@
+# src/closure.py
+
+from collections import OrderedDict
+
+import metrics
+
+
+class ClosureEngine:
+    """
+    Транзитивные замыкания по всему репозиторию.
+
+    Один раз считает сильно связные компоненты (итеративный Тарьян)
+    и сжимает каждый цикл в одну вершину. Замыкание компоненты —
+    frozenset имён, собранный из замыканий её потомков; результаты
+    хранятся в LRU-кэше и переиспользуются между запросами.
+
+    Узлы — как у repo.dependencies_of(): пакет (самая новая версия) или
+    "foo=1.5-r0", если ограничение зависимости выбрало другую версию.
+    """
+
+    def __init__(self, repo, cache_size: int = 4096):
+        self.repo = repo
+        self.cache_size = cache_size
+
+        self.nodes: list[str] = []
+        self.node_id: dict[str, int] = {}
+        self.adjacency: list[list[int]] = []
+        self._load_graph()
+
+        self.component: list[int] = []          # узел -> номер компоненты
+        self.members: list[list[int]] = []      # компонента -> узлы
+        self.comp_edges: list[list[int]] = []   # сжатый DAG
+        self._tarjan()
+
+        self._cache: OrderedDict[int, frozenset[str]] = OrderedDict()
+
+    def _intern(self, name: str) -> int:
+        nid = self.node_id.get(name)
+        if nid is None:
+            nid = self.node_id[name] = len(self.nodes)
+            self.nodes.append(name)
+            self.adjacency.append([])
+        return nid
+
+    def _load_graph(self):
+        for name, _, _ in self.repo.iter_packages():
+            self._intern(name)
+        # узлы выбранных версий ("foo=1.5-r0") добавляются по ходу
+        nid = 0
+        while nid < len(self.nodes):
+            self.adjacency[nid] = [self._intern(dep)
+                                   for dep in self._dependencies(self.nodes[nid])]
+            nid += 1
+
+    def _dependencies(self, name: str) -> list[str]:
+        # зависимость без своей записи в репозитории — лист, как в DependencyGraph.build
+        try:
+            return self.repo.dependencies_of(name)
+        except ValueError:
+            return []
+
+    def _tarjan(self):
+        """
+        Итеративный алгоритм Тарьяна. Компоненты нумеруются в порядке
+        завершения, то есть зависимости получают меньшие номера.
+        """
+        n = len(self.nodes)
+        index = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        component = [-1] * n
+        stack: list[int] = []
+        counter = 0
+        adjacency = self.adjacency
+
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, child_pos = work.pop()
+                if child_pos == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+
+                children = adjacency[node]
+                recurse = False
+                while child_pos < len(children):
+                    child = children[child_pos]
+                    child_pos += 1
+                    if index[child] == -1:
+                        work.append((node, child_pos))
+                        work.append((child, 0))
+                        recurse = True
+                        break
+                    if on_stack[child] and index[child] < low[node]:
+                        low[node] = index[child]
+                if recurse:
+                    continue
+
+                if low[node] == index[node]:
+                    comp = len(self.members)
+                    members = []
+                    while True:
+                        v = stack.pop()
+                        on_stack[v] = False
+                        component[v] = comp
+                        members.append(v)
+                        if v == node:
+                            break
+                    self.members.append(members)
+
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+
+        self.component = component
+        for members in self.members:
+            comp = component[members[0]]
+            targets = {component[d] for v in members for d in self.adjacency[v]}
+            targets.discard(comp)
+            self.comp_edges.append(sorted(targets))
+
+    def node_of(self, package: str) -> int | None:
+        """
+        Узел для имени пакета, узла "foo=1.5-r0", зависимости с ограничением
+        ("foo<2") или виртуального имени; None — такого узла нет.
+        """
+        nid = self.node_id.get(package)
+        if nid is None:
+            resolved = self.repo.resolve(package)
+            if resolved is not None:
+                nid = self.node_id.get(self.repo.label(*resolved), self.node_id.get(resolved[0]))
+        return nid
+
+    def cycles(self) -> list[list[str]]:
+        """
+        Все циклы репозитория: компоненты из нескольких пакетов
+        и пакеты, зависящие сами от себя.
+        """
+        result = []
+        for members in self.members:
+            if len(members) > 1 or members[0] in self.adjacency[members[0]]:
+                result.append(sorted(self.nodes[v] for v in members))
+        return result
+
+    def cycle_of(self, package: str) -> list[str] | None:
+        nid = self.node_of(package)
+        if nid is None:
+            return None
+        members = self.members[self.component[nid]]
+        if len(members) == 1 and nid not in self.adjacency[nid]:
+            return None
+        return sorted(self.nodes[v] for v in members)
+
+    def _component_closure(self, comp: int) -> frozenset[str]:
+        """
+        Замыкание компоненты (включая её саму). Потомки считаются
+        раньше родителей — явный стек вместо рекурсии.
+        """
+        cached = self._cache.get(comp)
+        if cached is not None:
+            metrics.count("closure_cache_hits")
+            self._cache.move_to_end(comp)
+            return cached
+
+        metrics.count("closure_cache_misses")
+        local: dict[int, frozenset[str]] = {}
+        stack = [comp]
+        while stack:
+            c = stack[-1]
+            if c in local:
+                stack.pop()
+                continue
+            pending = [d for d in self.comp_edges[c]
+                       if d not in local and d not in self._cache]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            parts = {self.nodes[v] for v in self.members[c]}
+            for d in self.comp_edges[c]:
+                parts |= local[d] if d in local else self._cache[d]
+            local[c] = frozenset(parts)
+
+        for c, closure in local.items():
+            self._remember(c, closure)
+        return local[comp]
+
+    def _remember(self, comp: int, closure: frozenset[str]):
+        self._cache[comp] = closure
+        self._cache.move_to_end(comp)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def closure(self, package: str) -> frozenset[str]:
+        """
+        Все пакеты, от которых транзитивно зависит package (включая его).
+        Виртуальные имена разрешаются через провайдеров.
+        """
+        nid = self.node_of(package)
+        if nid is None:
+            return frozenset([package])
+        return self._component_closure(self.component[nid])
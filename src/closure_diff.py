@@ -0,0 +1,177 @@
+# src/closure_diff.py
+
+"""
+Как меняются замыкания зависимостей при переходе с одного индекса на
+другой (например, v3.19 -> edge).
+
+Для каждого пакета обоих индексов считается хеш в духе дерева Меркла:
+хеш сильно связной компоненты — от имён её пакетов, их разрешённых
+зависимостей и хешей дочерних компонент. Версии в хеш не входят: пакет,
+у которого поменялась только версия, а зависимости те же, считается
+неизменным (кроме узлов "foo=1.5-r0" — версии, выбранной ограничением
+зависимости: там версия входит в имя узла). Равные хеши означают одинаковый подграф под пакетом, поэтому
+при сравнении замыканий такие подграфы не обходятся.
+
+Узлы замыкания корня делятся на две части:
+    E — пакеты, чей хеш отличается (или которых нет в другом индексе);
+        их обходим явно;
+    F — "граница": первые встреченные пакеты с одинаковым хешем;
+        всё, что под ними, совпадает в обоих индексах.
+Если границы в старом и новом индексе совпадают, разница замыканий —
+это разница E; иначе к ней добавляется разница замыканий границ
+(берутся из кэша ClosureEngine).
+"""
+
+import hashlib
+
+import metrics
+from closure import ClosureEngine
+
+
+def closure_hashes(engine: ClosureEngine) -> list[bytes]:
+    """
+    Хеш замыкания для каждого узла engine.nodes. Компоненты в порядке
+    Тарьяна (потомки раньше родителей), так что хеши детей уже готовы.
+    """
+    comp_hash: list[bytes] = []
+    for c, members in enumerate(engine.members):
+        h = hashlib.blake2b(digest_size=16)
+        for v in sorted(members, key=engine.nodes.__getitem__):
+            h.update(engine.nodes[v].encode("utf-8") + b"\0")
+            for d in sorted(engine.nodes[d] for d in set(engine.adjacency[v])):
+                h.update(b"\1" + d.encode("utf-8"))
+            h.update(b"\2")
+        for child in sorted(comp_hash[d] for d in engine.comp_edges[c]):
+            h.update(child)
+        comp_hash.append(h.digest())
+
+    hashes = []
+    for v, name in enumerate(engine.nodes):
+        # внутри цикла замыкание общее, различаются только имена
+        h = hashlib.blake2b(comp_hash[engine.component[v]], digest_size=16)
+        h.update(name.encode("utf-8"))
+        hashes.append(h.digest())
+    return hashes
+
+
+class _Side:
+    """
+    Один индекс: движок замыканий, хеши и доступ к ним по имени.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.engine = ClosureEngine(repo)
+        self.hashes = closure_hashes(self.engine)
+
+    def key(self, package: str) -> str:
+        nid = self.engine.node_of(package)
+        return self.engine.nodes[nid] if nid is not None else package
+
+    def hash_of(self, name: str) -> bytes | None:
+        nid = self.engine.node_id.get(name)
+        return self.hashes[nid] if nid is not None else None
+
+    def targets(self, name: str) -> list[str]:
+        nid = self.engine.node_id.get(name)
+        if nid is None:
+            return []
+        return [self.engine.nodes[d] for d in self.engine.adjacency[nid]]
+
+    def closure_of(self, names) -> set[str]:
+        result: set[str] = set()
+        for name in names:
+            result |= self.engine.closure(name)
+        return result
+
+
+class ClosureDiff:
+    """
+    Сравнение замыканий между старым и новым индексом.
+    Хеши считаются один раз на индекс и переиспользуются для всех корней.
+    """
+
+    def __init__(self, old_repo, new_repo):
+        with metrics.phase("diff"):
+            self.old = _Side(old_repo)
+            self.new = _Side(new_repo)
+
+    def _walk(self, side: _Side, other: _Side, root: str) -> tuple[set[str], set[str]]:
+        """
+        Обход замыкания root в side, который не заходит в подграфы с тем же
+        хешем в other. Возвращает (E, F) — см. описание модуля.
+        """
+        expanded: set[str] = set()
+        frontier: set[str] = set()
+        seen = {root}
+        stack = [root]
+        while stack:
+            name = stack.pop()
+            h = side.hash_of(name)
+            if h is not None and h == other.hash_of(name):
+                frontier.add(name)
+                continue
+            expanded.add(name)
+            for dep in side.targets(name):
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+        return expanded, frontier
+
+    def diff(self, package: str) -> dict:
+        """
+        Разница замыканий одного корня:
+        {"package", "changed", "added_nodes", "removed_nodes",
+         "added_edges", "removed_edges"} (рёбра — пары [пакет, зависимость]).
+        """
+        with metrics.phase("diff"):
+            return self._diff(package)
+
+    def _diff(self, package: str) -> dict:
+        old_root, new_root = self.old.key(package), self.new.key(package)
+        result = {"package": package, "changed": False,
+                  "added_nodes": [], "removed_nodes": [],
+                  "added_edges": [], "removed_edges": []}
+
+        old_hash = self.old.hash_of(old_root)
+        if old_root == new_root and old_hash is not None and old_hash == self.new.hash_of(new_root):
+            metrics.count("diff_skipped_roots")
+            return result
+
+        new_e, new_f = self._walk(self.new, self.old, new_root)
+        old_e, old_f = self._walk(self.old, self.new, old_root)
+        metrics.count("diff_expanded", len(new_e) + len(old_e))
+
+        added = new_e - old_e
+        removed = old_e - new_e
+        # у E хеши разные, поэтому с подграфами под границей они не пересекаются
+        only_new: set[str] = set()
+        only_old: set[str] = set()
+        if new_f != old_f:
+            new_side = self.new.closure_of(new_f)
+            old_side = self.old.closure_of(old_f)
+            only_new = new_side - old_side
+            only_old = old_side - new_side
+            added |= only_new
+            removed |= only_old
+
+        added_edges = set()
+        removed_edges = set()
+        for name in new_e:
+            old_targets = set(self.old.targets(name)) if name in old_e else set()
+            added_edges.update((name, d) for d in self.new.targets(name) if d not in old_targets)
+        for name in old_e:
+            new_targets = set(self.new.targets(name)) if name in new_e else set()
+            removed_edges.update((name, d) for d in self.old.targets(name) if d not in new_targets)
+        # пакеты под границей, попавшие только в одно замыкание, — со всеми рёбрами
+        for name in only_new:
+            added_edges.update((name, d) for d in self.new.targets(name))
+        for name in only_old:
+            removed_edges.update((name, d) for d in self.old.targets(name))
+
+        result["added_nodes"] = sorted(added)
+        result["removed_nodes"] = sorted(removed)
+        result["added_edges"] = sorted(added_edges)
+        result["removed_edges"] = sorted(removed_edges)
+        result["changed"] = bool(added or removed or added_edges or removed_edges)
+        return result
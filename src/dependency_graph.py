@@ -1,16 +1,30 @@
 # src/dependency_graph.py
 
+import io
+import sys
+
+import metrics
+from exporters import DotExporter, export_graph
+from filters import compile_filters
+from traversal import bfs, tree_walk
+
 class DependencyGraph:
     """
     Хранит граф зависимостей и умеет его строить и печатать.
     Формат графа: { "pkg": ["dep1", "dep2", ...], ... }
     """
 
-    def __init__(self, max_depth: int, filter_substring: str | None = None):
+    def __init__(self, max_depth: int, filter_substring: str | None = None,
+                 skip=None):
+        """
+        skip — что угодно с "name in skip": FilterSet или, лучше,
+        SkipIndex, заранее посчитанный по индексу (filters.py).
+        filter_substring — старый вариант: одна подстрока.
+        """
         self.max_depth = max_depth
-        self.filter_substring = (
-            filter_substring.lower() if filter_substring else None
-        )
+        if skip is None and filter_substring:
+            skip = compile_filters((filter_substring,))
+        self.skip = skip
         self.graph: dict[str, list[str]] = {}
 
     def _should_skip(self, name: str) -> bool:
@@ -19,44 +33,40 @@ class DependencyGraph:
         Пакет с таким именем не будет анализироваться глубже,
         но его можно оставить как "лист" у родителя.
         """
-        if not self.filter_substring:
-            return False
-        return self.filter_substring in name.lower()
+        return self.skip is not None and name in self.skip
 
     def build(self, root_pkg: str, version: str | None, get_deps_func):
         """
-        Строит граф зависимостей алгоритмом BFS с рекурсией.
+        Строит граф зависимостей итеративным BFS (traversal.bfs).
 
         get_deps_func(package_name: str, version: str | None) -> list[str]
         """
-        visited: set[str] = set()
-        queue: list[tuple[str, int]] = [(root_pkg, 0)]
-
         # чтобы корень точно появился в графе
         if root_pkg not in self.graph:
             self.graph[root_pkg] = []
 
-        def bfs_recursive(q: list[tuple[str, int]]):
-            if not q:
-                return
-
-            pkg, depth = q.pop(0)  # "очередь" для BFS
+        def prune(pkg: str, depth: int) -> bool:
+            # фильтр по подстроке: не анализируем глубже
+            return self._should_skip(pkg)
 
-            # не выходим за максимальную глубину
-            if depth >= self.max_depth:
-                return
+        # узлы на глубине max_depth - 1 ещё получают список зависимостей,
+        # но сами зависимости в очередь уже не попадают
+        walk = bfs(root_pkg, lambda pkg: self.graph.get(pkg, []),
+                   max_depth=self.max_depth - 1, prune=prune)
 
-            # чтобы не зациклиться
-            if pkg in visited:
-                return
-            visited.add(pkg)
+        with metrics.phase("build"):
+            self._expand(walk, version, get_deps_func)
+        return self.graph
 
-            # фильтр по подстроке: не анализируем глубже
+    def _expand(self, walk, version: str | None, get_deps_func):
+        nodes = edges = 0
+        for pkg, depth in walk:
+            nodes += 1
             if self._should_skip(pkg):
                 # но всё равно оставим в графе как "лист"
                 if pkg not in self.graph:
                     self.graph[pkg] = []
-                return
+                continue
 
             try:
                 deps = get_deps_func(pkg, version if depth == 0 else None)
@@ -64,136 +74,97 @@ class DependencyGraph:
                 deps = []
 
             # сохраняем зависимости в графе
-            cleaned_deps: list[str] = []
-            for d in deps:
-                # не добавляем в граф те имена, которые сразу отфильтровали
-                cleaned_deps.append(d)
+            self.graph[pkg] = list(deps)
+            edges += len(deps)
 
-            self.graph[pkg] = cleaned_deps
-
-            # добавляем зависимости в очередь, если ещё не достигли глубины
-            next_depth = depth + 1
-            if next_depth < self.max_depth:
-                for dep in cleaned_deps:
-                    if dep not in visited:
-                        q.append((dep, next_depth))
-
-            # продолжаем BFS рекурсивно
-            bfs_recursive(q)
-
-        bfs_recursive(queue)
-        return self.graph
+        metrics.count("nodes_visited", nodes)
+        metrics.count("edges", edges)
 
     def to_dot(self, root_pkg: str) -> str:
         """
         Генерирует текстовое представление графа в формате Graphviz DOT.
         Используется для визуализации (этап 5).
         """
-        lines: list[str] = []
-        lines.append("digraph dependencies {")
-        lines.append('    rankdir=LR;')  # горизонтальный вид, чтобы красивее
-        lines.append('    node [shape=box, fontsize=10];')
-
-        visited: set[str] = set()
-
-        def dfs(node: str):
-            if node in visited:
-                return
-            visited.add(node)
-
-            # если у узла нет детей, всё равно объявим его в графе
-            if node not in self.graph or not self.graph[node]:
-                lines.append(f'    "{node}";')
-                return
+        buffer = io.StringIO()
+        self.export(root_pkg, [DotExporter(buffer)])
+        return buffer.getvalue()
 
-            for dep in self.graph.get(node, []):
-                lines.append(f'    "{node}" -> "{dep}";')
-                dfs(dep)
-
-        dfs(root_pkg)
-
-        lines.append("}")
-        return "\n".join(lines)
+    def export(self, root_pkg: str, exporters: list):
+        """
+        Пишет граф сразу во все экспортёры (см. exporters.py) за один обход.
+        """
+        export_graph(self.graph, root_pkg, exporters)
 
     # ===== Вывод графа в виде ASCII-дерева =====
 
-    def print_ascii(self, root_pkg: str):
+    def print_ascii(self, root_pkg: str, out=None, max_lines: int | None = None,
+                    max_width: int | None = None):
         """
         Печатает граф в виде дерева с пометкой циклов.
-        """
 
-        def dfs(node: str, prefix: str, is_last: bool, path: set[str]):
-            cycle = node in path
+        Общая зависимость раскрывается только при первой встрече,
+        дальше выводится ссылкой "(see above)" — иначе на графах с
+        "ромбами" вывод растёт экспоненциально с глубиной.
+        max_lines / max_width ограничивают число строк и их ширину.
+        Всё пишется в out (по умолчанию stdout) одной операцией.
+        """
+        with metrics.phase("ascii"):
+            self._print_ascii(root_pkg, out, max_lines, max_width)
 
-            # формируем строку для текущего узла
-            line = ""
-            if prefix:
-                line += prefix
-                line += "└── " if is_last else "├── "
+    def _print_ascii(self, root_pkg: str, out, max_lines: int | None,
+                     max_width: int | None):
+        out = out if out is not None else sys.stdout
+        lines: list[str] = []
+        expanded: set[str] = set()
+        repeat = False  # текущий узел уже раскрывался выше
+        truncated = False
+
+        def prune(node: str, depth: int) -> bool:
+            return repeat
+
+        walk = tree_walk(root_pkg, lambda n: self.graph.get(n, []), prune=prune)
+        for node, lasts, cycle in walk:
+            has_children = bool(self.graph.get(node))
+            repeat = not cycle and has_children and node in expanded
+            if has_children:
+                expanded.add(node)
+
+            # префикс: по одной колонке на каждого предка (кроме корня)
+            line = "".join("    " if last else "│   " for last in lasts[:-1])
+            if lasts:
+                line += "└── " if lasts[-1] else "├── "
             line += node
             if cycle:
                 line += " (cycle)"
+            elif repeat:
+                line += " (see above)"
 
-            print(line)
-
-            if cycle:
-                # дальше по циклу не идём
-                return
+            if max_width is not None and len(line) > max_width:
+                line = line[:max(max_width - 1, 0)] + "…"
+            lines.append(line)
 
-            children = self.graph.get(node, [])
-            if not children:
-                return
+            if max_lines is not None and len(lines) >= max_lines:
+                truncated = next(walk, None) is not None
+                break
 
-            path.add(node)
-
-            for index, child in enumerate(children):
-                last_child = index == len(children) - 1
-                # формируем новый префикс для потомков
-                new_prefix = prefix
-                if prefix:
-                    new_prefix += "    " if is_last else "│   "
-                dfs(child, new_prefix, last_child, path)
-
-            path.remove(node)
-
-        # корень рисуем отдельно (без префикса)
-        print(root_pkg)
-        children = self.graph.get(root_pkg, [])
-        for idx, child in enumerate(children):
-            last = idx == len(children) - 1
-            dfs(child, "", last, set([root_pkg]))
+        if truncated:
+            lines.append(f"... (вывод ограничен {max_lines} строками)")
+        out.write("\n".join(lines) + "\n")
+        out.flush()
 
     def find_reverse_dependencies(self, target: str) -> list[str]:
         """
         Возвращает список пакетов, которые зависят (транзитивно) от target.
-        Используем BFS с рекурсией.
+        Используем итеративный BFS по обратной таблице.
         """
 
-        reverse_graph = {}  # ключ: пакет → список тех, кто от него зависит
-
-        # строим обратную таблицу зависимостей
-        for pkg, deps in self.graph.items():
-            for d in deps:
-                reverse_graph.setdefault(d, []).append(pkg)
-
-        result = []
-        visited = set()
-        queue = [target]
-
-        def bfs():
-            if not queue:
-                return
-
-            cur = queue.pop(0)
-            visited.add(cur)
-
-            if cur in reverse_graph:
-                for parent in reverse_graph[cur]:
-                    if parent not in visited:
-                        result.append(parent)
-                        queue.append(parent)
+        with metrics.phase("reverse"):
+            reverse_graph = {}  # ключ: пакет → список тех, кто от него зависит
 
-            bfs()
+            # строим обратную таблицу зависимостей
+            for pkg, deps in self.graph.items():
+                for d in deps:
+                    reverse_graph.setdefault(d, []).append(pkg)
 
-        bfs()
-        return result
\ No newline at end of file
+            walk = bfs(target, lambda n: reverse_graph.get(n, []))
+            return [pkg for pkg, depth in walk if depth > 0]
@@ -0,0 +1,116 @@
+# src/exporters.py
+
+"""
+Потоковые экспортёры графа: DOT, JSON (список смежности) и GraphML.
+
+Каждый экспортёр пишет в любой файлоподобный объект по мере обхода,
+весь документ в памяти не собирается. export_graph() делает один
+обход графа и раздаёт события сразу всем экспортёрам.
+"""
+
+import json
+from xml.sax.saxutils import quoteattr
+
+from traversal import dfs
+
+
+def _dot_id(name: str) -> str:
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class DotExporter:
+    """
+    Graphviz DOT. Узел без зависимостей объявляется отдельной строкой.
+    """
+
+    def __init__(self, out):
+        self.out = out
+
+    def begin(self, root: str):
+        self.out.write("digraph dependencies {\n")
+        self.out.write("    rankdir=LR;\n")  # горизонтальный вид, чтобы красивее
+        self.out.write("    node [shape=box, fontsize=10];\n")
+
+    def node(self, name: str, deps: list[str]):
+        # если у узла нет детей, всё равно объявим его в графе
+        if not deps:
+            self.out.write(f"    {_dot_id(name)};\n")
+
+    def edge(self, parent: str, child: str):
+        self.out.write(f"    {_dot_id(parent)} -> {_dot_id(child)};\n")
+
+    def end(self):
+        self.out.write("}")
+
+
+class JsonExporter:
+    """
+    JSON: {"root": ..., "graph": {"pkg": ["dep1", ...], ...}}
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.first = True
+
+    def begin(self, root: str):
+        self.out.write('{"root": ' + json.dumps(root, ensure_ascii=False) + ', "graph": {')
+
+    def node(self, name: str, deps: list[str]):
+        sep = "" if self.first else ", "
+        self.first = False
+        self.out.write(sep + json.dumps(name, ensure_ascii=False) + ": "
+                       + json.dumps(deps, ensure_ascii=False))
+
+    def edge(self, parent: str, child: str):
+        pass  # рёбра уже записаны в списке смежности узла
+
+    def end(self):
+        self.out.write("}}\n")
+
+
+class GraphMLExporter:
+    """
+    GraphML (узлы и рёбра идут вперемешку — схема это допускает).
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.edges = 0
+
+    def begin(self, root: str):
+        self.out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.out.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        self.out.write('  <graph id="dependencies" edgedefault="directed">\n')
+
+    def node(self, name: str, deps: list[str]):
+        self.out.write(f"    <node id={quoteattr(name)}/>\n")
+
+    def edge(self, parent: str, child: str):
+        self.edges += 1
+        self.out.write(f'    <edge id="e{self.edges}" source={quoteattr(parent)} '
+                       f"target={quoteattr(child)}/>\n")
+
+    def end(self):
+        self.out.write("  </graph>\n</graphml>\n")
+
+
+def export_graph(graph: dict[str, list[str]], root: str, exporters: list):
+    """
+    Один DFS от root, каждое событие (узел / ребро) уходит всем экспортёрам.
+    Порядок событий совпадает с прежним to_dot: ребро пишется до захода
+    в дочерний узел.
+    """
+    for exporter in exporters:
+        exporter.begin(root)
+
+    def on_edge(parent: str, child: str):
+        for exporter in exporters:
+            exporter.edge(parent, child)
+
+    for node, _ in dfs(root, lambda n: graph.get(n, []), on_edge=on_edge):
+        deps = graph.get(node, [])
+        for exporter in exporters:
+            exporter.node(node, deps)
+
+    for exporter in exporters:
+        exporter.end()
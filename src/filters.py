@@ -0,0 +1,183 @@
+# src/filters.py
+
+"""
+Фильтры пакетов: какие узлы обход посещает, но не раскрывает.
+
+Правило — строка:
+    core               — подстрока без учёта регистра (как старый --filter)
+    glob:py3-*         — шаблон имени целиком (fnmatch)
+    re:^lib.*-dev$     — регулярное выражение (поиск в любом месте имени)
+    class:so           — виртуальные имена класса: so:..., cmd:..., pc:...;
+                         class:file — пути (/bin/sh)
+    allow:<правило>    — исключение: подходящие имена не фильтруются никогда
+
+Правила компилируются в два регулярных выражения (запрещающее и
+разрешающее), так что имя проверяется за один проход. Каждое re: в общем
+выражении стоит в своей группе, а его глобальные флаги ((?i)...) действуют
+только на него; re: с именованными группами или обратными ссылками (\\1)
+в общее выражение не встраиваются и проверяются отдельно. FilterSet.bind(repo)
+заранее прогоняет через них все имена индекса и возвращает SkipIndex:
+после этого проверка узла при обходе — одно обращение к битовой карте
+или словарю. Один SkipIndex годится для любого числа запросов
+(пакетный режим, сервер).
+"""
+
+import fnmatch
+import re
+from functools import lru_cache
+
+from apk_version import split_label
+from package_store import StringTable
+
+
+_GLOBAL_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+_GROUP_REFS = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+
+def _scoped(value: str) -> str:
+    """
+    re: в виде группы для общего выражения: ведущие (?i)(?x)...
+    превращаются в (?ix:...), чтобы не действовать на соседние правила.
+    """
+    flags = ""
+    while match := _GLOBAL_FLAGS.match(value):
+        flags += match.group(1)
+        value = value[match.end():]
+    if "x" in flags:
+        value += "\n"  # комментарий # в конце не должен съесть скобку
+    return f"(?{flags}:{value})" if flags else f"(?:{value})"
+
+
+def _rule_pattern(rule: str) -> tuple[str, bool]:
+    """
+    -> (выражение, проверять отдельно).
+    """
+    kind, sep, value = rule.partition(":")
+    if not sep or kind not in ("glob", "re", "class"):
+        # "so:libc..." или просто "core" — подстрока
+        return f"(?i:{re.escape(rule)})", False
+    if not value:
+        raise ValueError(f"Пустое правило фильтра: '{rule}'")
+    if kind == "glob":
+        return f"^(?:{fnmatch.translate(value)})", False
+    if kind == "re":
+        compiled = re.compile(value)  # ошибка должна указывать на само выражение, а не на сборку
+        if compiled.groupindex or _GROUP_REFS.search(value):
+            # номера и имена групп в общем выражении съедут или совпадут
+            return value, True
+        return _scoped(value), False
+    if value == "file":
+        return "^/", False
+    return f"^{re.escape(value)}:", False
+
+
+def _compile(patterns: list[tuple[str, bool]]):
+    shared = [pattern for pattern, alone in patterns if not alone]
+    searches = [re.compile(pattern).search for pattern, alone in patterns if alone]
+    if shared:
+        searches.insert(0, re.compile("|".join(shared)).search)
+    if len(searches) <= 1:
+        return searches[0] if searches else None
+    return lambda name: any(search(name) for search in searches)
+
+
+class FilterSet:
+    """
+    Скомпилированный набор правил. name in filters — True, если пакет
+    надо пропустить (посетить, но не раскрывать).
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        deny, allow = [], []
+        try:
+            for rule in self.rules:
+                if rule.startswith("allow:"):
+                    allow.append(_rule_pattern(rule[len("allow:"):]))
+                else:
+                    deny.append(_rule_pattern(rule))
+            self._deny = _compile(deny)
+            self._allow = _compile(allow)
+        except re.error as e:
+            raise ValueError(f"Некорректное правило фильтра: {e}")
+
+    def __repr__(self) -> str:
+        return f"FilterSet({list(self.rules)!r})"
+
+    def __bool__(self) -> bool:
+        return self._deny is not None
+
+    def __contains__(self, name: str) -> bool:
+        return self.matches(name)
+
+    def matches(self, name: str) -> bool:
+        if self._deny is None:
+            return False
+        name = split_label(name)[0]  # узел "foo=1.5-r0" проверяется как foo
+        if not self._deny(name):
+            return False
+        return self._allow is None or not self._allow(name)
+
+    def bind(self, repo) -> "SkipIndex":
+        return SkipIndex(self, repo)
+
+
+@lru_cache(maxsize=256)
+def compile_filters(rules: tuple[str, ...]) -> FilterSet:
+    """
+    FilterSet по набору правил; одинаковые наборы компилируются один раз.
+    """
+    return FilterSet(rules)
+
+
+def read_rules(lines) -> list[str]:
+    """
+    Правила из файла: по одному в строке, # — комментарий.
+    """
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            rules.append(line)
+    return rules
+
+
+class SkipIndex:
+    """
+    Результат FilterSet, заранее посчитанный для всех имён индекса.
+
+    Для CompactPackageStore (и снимка) это bytearray по таблице
+    интернированных строк; для остальных репозиториев — словарь
+    имя -> bool по пакетам и их зависимостям. Имена, которых в индексе
+    не было, проверяются правилами и запоминаются.
+    """
+
+    def __init__(self, filters: FilterSet, repo):
+        self.filters = filters
+        self._ids: StringTable | None = None
+        self._bitmap = b""
+        self._known: dict[str, bool] = {}
+
+        strings = getattr(repo, "strings", None)
+        if isinstance(strings, StringTable):
+            self._ids = strings
+            self._bitmap = bytearray(map(filters.matches, strings.strings))
+        elif hasattr(repo, "packages"):
+            # для LazyTestRepository полный проход не нужен — там всё по требованию
+            for name, _, deps in repo.iter_packages():
+                self._remember(name)
+                for dep in deps:
+                    self._remember(dep)
+
+    def _remember(self, name: str) -> bool:
+        skip = self._known.get(name)
+        if skip is None:
+            skip = self._known[name] = self.filters.matches(name)
+        return skip
+
+    def __contains__(self, name: str) -> bool:
+        if self._ids is not None:
+            sid = self._ids.id_of(name)
+            if sid is not None and sid < len(self._bitmap):
+                return bool(self._bitmap[sid])
+        return self._remember(name)
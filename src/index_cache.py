@@ -0,0 +1,340 @@
+# src/index_cache.py
+
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+
+import metrics
+
+
+def default_cache_dir() -> Path:
+    """
+    Каталог кэша по умолчанию: $XDG_CACHE_HOME/dependency-visualizer
+    (или ~/.cache/dependency-visualizer).
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return Path(base) / "dependency-visualizer"
+
+
+def local_path(url: str) -> Path | None:
+    """
+    Путь к файлу для file://-адреса, для остальных — None.
+    """
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme != "file":
+        return None
+    return Path(urllib.request.url2pathname(parsed.path))
+
+
+def make_stamp(*parts) -> bytes:
+    """
+    Отпечаток версии источника из его примет (URL, ETag, размер, mtime...).
+    """
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).digest()
+
+
+def remote_stamp(url: str, timeout: float = 60.0) -> bytes | None:
+    """
+    Отпечаток без кэша: для file:// — размер и mtime файла, для HTTP —
+    ETag / Last-Modified из ответа на HEAD. None, если сервер не
+    прислал ни того, ни другого (тогда остаётся только хешировать архив).
+    """
+    path = local_path(url)
+    if path is not None:
+        st = path.stat()
+        return make_stamp(url, st.st_size, st.st_mtime_ns)
+    request = urllib.request.Request(url, method="HEAD")
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        size = response.headers.get("Content-Length")
+    if not (etag or last_modified):
+        return None
+    return make_stamp(url, etag, last_modified, size)
+
+
+class IndexCache:
+    """
+    Дисковый кэш архивов APKINDEX.tar.gz.
+
+    Для каждого URL хранится пара файлов:
+        <key>.tar.gz — сам архив
+        <key>.json   — метаданные (url, ETag, Last-Modified, время загрузки)
+
+    Ключ — sha256 от URL. Устаревшая копия (старше ttl секунд)
+    перепроверяется условным запросом If-None-Match / If-Modified-Since,
+    на ответ 304 используется локальный файл. Если сервер недоступен или
+    отвечает 5xx, берётся старая копия (с предупреждением в stderr).
+
+    file:// не кэшируется: архив и так лежит на диске, а копия по TTL
+    отставала бы от файла, который меняют на месте.
+    """
+
+    def __init__(self, cache_dir: str | Path | None = None, ttl: int = 3600,
+                 offline: bool = False, max_size: int = 200 * 1024 * 1024,
+                 timeout: float = 60.0):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.ttl = ttl
+        self.offline = offline
+        self.max_size = max_size
+        self.timeout = timeout
+        # чем закончился последний fetch: hit / revalidated / downloaded / offline / stale / local
+        self.last_status: str | None = None
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        return self.cache_dir / f"{key}.tar.gz", self.cache_dir / f"{key}.json"
+
+    def _read_meta(self, meta_path: Path) -> dict | None:
+        try:
+            with meta_path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta_path: Path, meta: dict):
+        tmp = meta_path.with_suffix(".json.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def _touch(self, path: Path):
+        # время последнего использования — для вытеснения
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def fetch(self, url: str) -> Path:
+        """
+        Возвращает путь к локальной копии архива, при необходимости
+        скачивая или перепроверяя его.
+        """
+        local = self._local(url)
+        if local is not None:
+            return local
+        found = self._lookup(url)
+        if isinstance(found, Path):
+            metrics.count("cache_hits")
+            return found
+        metrics.count("cache_misses")
+
+        response, data_path, meta_path = found
+        with response:
+            self._store(response, data_path)
+            self._commit(url, response, data_path, meta_path)
+        return data_path
+
+    @contextmanager
+    def open(self, url: str):
+        """
+        Открывает архив на чтение как поток.
+
+        Если копия в кэше актуальна — это локальный файл. Иначе — тело
+        HTTP-ответа, которое по мере чтения параллельно пишется в кэш,
+        так что разбор индекса идёт одновременно со скачиванием.
+        """
+        local = self._local(url)
+        if local is not None:
+            with local.open("rb") as f:
+                yield f
+            return
+        found = self._lookup(url)
+        if isinstance(found, Path):
+            metrics.count("cache_hits")
+            with found.open("rb") as f:
+                yield f
+            return
+        metrics.count("cache_misses")
+
+        response, data_path, meta_path = found
+        tmp = data_path.with_suffix(f".tmp{os.getpid()}")
+        try:
+            with response, metrics.CountingReader(response) as counted, \
+                    tmp.open("wb") as sink:
+                reader = _TeeReader(counted, sink)
+                yield reader
+                # дочитываем хвост (паддинг tar), чтобы в кэш лёг целый архив
+                reader.drain()
+            os.replace(tmp, data_path)
+            self._commit(url, response, data_path, meta_path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def _local(self, url: str) -> Path | None:
+        # file:// — сам файл, мимо кэша
+        path = local_path(url)
+        if path is not None:
+            self.last_status = "local"
+        return path
+
+    def stamp(self, url: str) -> bytes:
+        """
+        Отпечаток текущей версии архива без чтения его содержимого:
+        после обычной проверки по TTL / условного запроса берутся ETag,
+        Last-Modified и размер из метаданных кэша. Изменившийся архив при
+        этом скачивается в кэш, так что разбор его уже не качает.
+        Для file:// — размер и mtime файла. Если сервер не прислал ни
+        ETag, ни Last-Modified, хешируется локальная копия.
+        """
+        path = self.fetch(url)
+        if local_path(url) is not None:
+            st = path.stat()
+            return make_stamp(url, st.st_size, st.st_mtime_ns)
+        meta = self._read_meta(self._paths(url)[1]) or {}
+        if meta.get("etag") or meta.get("last_modified"):
+            return make_stamp(url, meta.get("etag"), meta.get("last_modified"), meta.get("size"))
+        digest = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.digest()
+
+    def _lookup(self, url: str):
+        """
+        Возвращает Path, если можно обойтись локальной копией,
+        либо (response, data_path, meta_path) — если надо читать из сети.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        data_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path) if data_path.exists() else None
+
+        if meta is not None:
+            if self.offline:
+                self.last_status = "offline"
+                self._touch(data_path)
+                return data_path
+            if time.time() - meta.get("fetched_at", 0) < self.ttl:
+                self.last_status = "hit"
+                self._touch(data_path)
+                return data_path
+        elif self.offline:
+            raise RuntimeError(f"Офлайн-режим: в кэше нет копии {url}")
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            e.close()
+            if meta is None:
+                raise
+            if e.code == 304:
+                # 304 Not Modified — копия актуальна, продлеваем её жизнь
+                meta["fetched_at"] = time.time()
+                self._write_meta(meta_path, meta)
+                self._touch(data_path)
+                self.last_status = "revalidated"
+                return data_path
+            if e.code < 500:
+                raise  # 404 и т. п. — ответ сервера, а не сбой
+            return self._stale(url, data_path, e)
+        except (urllib.error.URLError, OSError) as e:
+            if meta is None:
+                raise
+            return self._stale(url, data_path, e)
+
+        return response, data_path, meta_path
+
+    def _stale(self, url: str, data_path: Path, error: Exception) -> Path:
+        # сеть или сервер недоступны, но есть старая копия — работаем с ней
+        print(f"[WARN] Не удалось обновить {url} ({error}), используется копия из кэша",
+              file=sys.stderr)
+        self.last_status = "stale"
+        self._touch(data_path)
+        return data_path
+
+    def _commit(self, url: str, response, data_path: Path, meta_path: Path):
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "size": data_path.stat().st_size,
+        }
+        self._write_meta(meta_path, meta)
+        self.last_status = "downloaded"
+        self._evict(keep=data_path)
+
+    def _store(self, response, data_path: Path):
+        """
+        Пишет тело ответа во временный файл и атомарно подменяет архив,
+        чтобы параллельные запуски не увидели недописанный файл.
+        """
+        tmp = data_path.with_suffix(f".tmp{os.getpid()}")
+        try:
+            with tmp.open("wb") as f:
+                while True:
+                    chunk = response.read(64 * 1024)
+                    if not chunk:
+                        break
+                    metrics.count("bytes_downloaded", len(chunk))
+                    f.write(chunk)
+            os.replace(tmp, data_path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def _evict(self, keep: Path | None = None):
+        """
+        Удаляет самые давно использованные архивы, пока суммарный
+        размер кэша не станет меньше max_size.
+        """
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*.tar.gz"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            for victim in (path, path.with_name(path.name[:-len(".tar.gz")] + ".json")):
+                try:
+                    victim.unlink()
+                except OSError:
+                    pass
+            total -= size
+
+
+class _TeeReader:
+    """
+    Файлоподобная обёртка: всё прочитанное из source копирует в sink.
+    """
+
+    def __init__(self, source, sink):
+        self.source = source
+        self.sink = sink
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(size)
+        if chunk:
+            self.sink.write(chunk)
+        return chunk
+
+    def drain(self):
+        while self.read(64 * 1024):
+            pass
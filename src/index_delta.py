@@ -0,0 +1,57 @@
+# src/index_delta.py
+
+
+class IndexDelta:
+    """
+    Разница между двумя версиями индекса.
+
+    added / removed / changed — записи (package, version);
+    targets    — { package: (старые рёбра, новые рёбра) } для всех пакетов,
+                 чьи разрешённые зависимости могли измениться;
+    providers  — { виртуальное имя: (старый провайдер, новый) };
+    edges_added / edges_removed — изменившиеся рёбра (узел, зависимость);
+                 узлы — как в графе: "foo" или "foo=1.5-r0"
+                 (apk_version.node_label).
+    """
+
+    def __init__(self):
+        self.added: list[tuple[str, str]] = []
+        self.removed: list[tuple[str, str]] = []
+        self.changed: list[tuple[str, str]] = []
+        self.targets: dict[str, tuple[set[tuple[str, str]], set[tuple[str, str]]]] = {}
+        self.providers: dict[str, tuple[str | None, str | None]] = {}
+        self.edges_added: list[tuple[str, str]] = []
+        self.edges_removed: list[tuple[str, str]] = []
+
+    def record_targets(self, package: str, old: set[tuple[str, str]],
+                       new: set[tuple[str, str]]):
+        self.targets[package] = (old, new)
+        self.edges_added.extend(sorted(new - old))
+        self.edges_removed.extend(sorted(old - new))
+
+    @property
+    def packages(self) -> set[str]:
+        """
+        Пакеты, которых коснулось обновление (запись или рёбра).
+        """
+        names = {name for name, _ in self.added + self.removed + self.changed}
+        names.update(self.targets)
+        return names
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed or self.providers)
+
+    def summary(self) -> str:
+        return (f"записей: +{len(self.added)} -{len(self.removed)} ~{len(self.changed)}, "
+                f"рёбер: +{len(self.edges_added)} -{len(self.edges_removed)}, "
+                f"провайдеров изменилось: {len(self.providers)}")
+
+    def to_dict(self) -> dict:
+        return {
+            "added": [list(k) for k in self.added],
+            "removed": [list(k) for k in self.removed],
+            "changed": [list(k) for k in self.changed],
+            "providers": {k: list(v) for k, v in self.providers.items()},
+            "edges_added": [list(e) for e in self.edges_added],
+            "edges_removed": [list(e) for e in self.edges_removed],
+        }
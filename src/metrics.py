@@ -0,0 +1,271 @@
+# src/metrics.py
+
+"""
+Замеры по фазам и счётчики.
+
+Библиотечный код отмечает фазы и события через функции модуля:
+
+    with metrics.phase("parse"):
+        ...
+    metrics.count("provider_lookups")
+
+Пока сборщик не активирован, это почти бесплатно (одна проверка).
+Вызывающий код включает сбор так:
+
+    m = Metrics(memory=True)
+    m.add_hook(lambda kind, name, value: print(kind, name, value))
+    with activate(m):
+        repo.parse_index()
+    print(m.to_dict())
+
+Хук получает (kind, name, value): kind = "phase" (value — замер одного
+вызова фазы) или "count" (value — приращение счётчика).
+
+Чтение потока можно отнести к своей фазе, обернув его в TimedReader
+(CountingReader — фаза download): время чтений копится и отдаётся одним
+замером, а из объемлющих фаз вычитается. Так потоковый разбор индекса
+делится на download, extract и parse, хотя идут они вперемешку.
+
+Фазы:  download, extract, parse, build, reverse, closure, analytics, diff,
+       ascii, graphviz.
+Счётчики: bytes_downloaded, cache_hits, cache_misses, provider_lookups,
+          nodes_visited, edges, closure_cache_hits, closure_cache_misses,
+          diff_skipped_roots, diff_expanded.
+"""
+
+import cProfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+_active: "Metrics | None" = None
+
+
+class Metrics:
+    """
+    Сборщик замеров: {фаза: {"seconds", "calls", "peak_bytes"}} и счётчики.
+
+    memory=True включает tracemalloc (заметно замедляет код); пик памяти
+    общий для процесса, вложенные фазы учитываются и во внешней.
+    profile_phase — фаза, вокруг которой включается cProfile; статистика
+    всех её вызовов пишется в profile_file (формат pstats).
+    """
+
+    def __init__(self, memory: bool = False, profile_phase: str | None = None,
+                 profile_file: str | None = None):
+        self.memory = memory
+        self.profile_phase = profile_phase
+        self.profile_file = profile_file or (f"{profile_phase}.prof" if profile_phase else None)
+        self.phases: dict[str, dict] = {}
+        self.counters: dict[str, int] = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+        self._local = threading.local()  # стеки открытых фаз своего потока
+        self._profiler = None
+
+    def add_hook(self, hook):
+        """
+        hook(kind, name, value) вызывается на каждый замер фазы и счётчик.
+        """
+        self._hooks.append(hook)
+
+    def _emit(self, kind: str, name: str, value):
+        for hook in self._hooks:
+            hook(kind, name, value)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        self._emit("count", name, n)
+
+    @contextmanager
+    def phase(self, name: str):
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            stack = self._stack()
+            if stack:
+                # пик внешней фазы до вложенной, reset_peak его сотрёт
+                stack[-1] = max(stack[-1], tracemalloc.get_traced_memory()[1])
+            stack.append(0)
+            tracemalloc.reset_peak()
+        profiler = self._start_profile(name)
+        frames = self._frames()
+        frames.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            carved = frames.pop()
+            self.carve(carved)  # вычтенное не входит и во внешние фазы
+            elapsed = time.perf_counter() - start - carved
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.profile_file)
+            record = {"seconds": elapsed}
+            if tracing:
+                carried = self._stack().pop()
+                record["peak_bytes"] = max(tracemalloc.get_traced_memory()[1], carried)
+            self._record(name, record)
+            self._emit("phase", name, record)
+
+    def _stack(self) -> list[int]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _frames(self) -> list[float]:
+        # на каждую открытую фазу (и чтение TimedReader) — время,
+        # отнесённое к другим фазам и не входящее в неё
+        frames = getattr(self._local, "frames", None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    def carve(self, seconds: float):
+        """
+        Вычитает seconds из текущей открытой фазы этого потока.
+        """
+        frames = self._frames()
+        if frames:
+            frames[-1] += seconds
+
+    def add_phase(self, name: str, seconds: float):
+        """
+        Замер фазы, время которой измерено снаружи (см. TimedReader).
+        """
+        record = {"seconds": seconds}
+        self._record(name, record)
+        self._emit("phase", name, record)
+
+    def _start_profile(self, name: str):
+        if name != self.profile_phase:
+            return None
+        if self._profiler is None:
+            self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError:
+            return None  # профилировщик уже работает (рекурсивная фаза, другой поток)
+        return self._profiler
+
+    def _record(self, name: str, record: dict):
+        with self._lock:
+            total = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0})
+            total["seconds"] += record["seconds"]
+            total["calls"] += 1
+            if "peak_bytes" in record:
+                total["peak_bytes"] = max(total.get("peak_bytes", 0), record["peak_bytes"])
+
+    def to_dict(self) -> dict:
+        result = {"phases": self.phases, "counters": self.counters}
+        if self.profile_phase:
+            result["profile"] = {"phase": self.profile_phase, "file": self.profile_file}
+        return result
+
+    def format_report(self) -> str:
+        lines = ["=== METRICS ==="]
+        for name, values in self.phases.items():
+            line = f"{name:<10} {values['seconds']:9.4f}s  x{values['calls']}"
+            if "peak_bytes" in values:
+                line += f"  пик {values['peak_bytes'] / (1024 * 1024):.1f} МБ"
+            lines.append(line)
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<18} {value}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def activate(metrics: Metrics):
+    """
+    Делает metrics текущим сборщиком (для всех потоков процесса).
+    При memory=True на это время включается tracemalloc.
+    """
+    global _active
+    previous = _active
+    started = metrics.memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _active = metrics
+    try:
+        yield metrics
+    finally:
+        _active = previous
+        if started:
+            tracemalloc.stop()
+
+
+def phase(name: str):
+    """
+    Контекстный менеджер фазы текущего сборщика (или пустой).
+    """
+    metrics = _active
+    return metrics.phase(name) if metrics is not None else nullcontext()
+
+
+def count(name: str, n: int = 1):
+    metrics = _active
+    if metrics is not None:
+        metrics.count(name, n)
+
+
+class TimedReader:
+    """
+    Файлоподобная обёртка: время чтений относится к фазе phase.
+    Замер отдаётся один — в report() или close(); из объемлющих
+    фаз это время вычитается сразу. Вложенные TimedReader (распаковка
+    поверх загрузки) вычитаются из внешнего так же.
+    """
+
+    def __init__(self, source, phase: str):
+        self.source = source
+        self.phase = phase
+        self.seconds = 0.0
+
+    def read(self, size: int = -1) -> bytes:
+        metrics = _active
+        if metrics is None:
+            return self.source.read(size)
+        frames = metrics._frames()
+        frames.append(0.0)
+        start = time.perf_counter()
+        try:
+            chunk = self.source.read(size)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds += elapsed - frames.pop()
+            metrics.carve(elapsed)
+        return chunk
+
+    def report(self):
+        metrics = _active
+        if metrics is not None and self.seconds:
+            metrics.add_phase(self.phase, self.seconds)
+        self.seconds = 0.0
+
+    def close(self):
+        self.report()
+        self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CountingReader(TimedReader):
+    """
+    Поток из сети: прочитанные байты идут в счётчик name,
+    время чтения — в фазу download.
+    """
+
+    def __init__(self, source, name: str = "bytes_downloaded"):
+        super().__init__(source, "download")
+        self.name = name
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = super().read(size)
+        count(self.name, len(chunk))
+        return chunk
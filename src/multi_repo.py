@@ -0,0 +1,255 @@
+# src/multi_repo.py
+
+import copy
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from apk_parser import ApkRepository
+from index_cache import IndexCache
+
+
+class MultiRepository(ApkRepository):
+    """
+    Несколько репозиториев Alpine (main, community, testing, ...) как один.
+
+    Индексы качаются и разбираются параллельно в пуле потоков, поэтому
+    общее время загрузки определяется самым медленным репозиторием.
+    Порядок repo_urls — это приоритет: пакет берётся целиком (со всеми
+    версиями) из первого репозитория, где он есть.
+
+    mirror=True — адреса считаются зеркалами одного репозитория:
+    они пробуются по очереди, используется первое ответившее.
+    """
+
+    def __init__(self, repo_urls: list[str], cache: IndexCache | None = None,
+                 mirror: bool = False, max_workers: int | None = None):
+        if not repo_urls:
+            raise ValueError("Список репозиториев пуст")
+        super().__init__(repo_urls[0], cache)
+        self.repo_urls = [url.rstrip("/") for url in repo_urls]
+        self.mirror = mirror
+        self.max_workers = max_workers or min(8, len(self.repo_urls))
+        self.statuses: dict[str, str | None] = {}  # url -> статус кэша
+        self.origin: dict[str, str] = {}  # package -> url репозитория
+
+    def source_checksum(self) -> bytes:
+        """
+        Общая контрольная сумма набора: адреса в порядке приоритета
+        и sha256 каждого архива. Для зеркал — сумма архива первого
+        ответившего зеркала (содержимое у них одно).
+        """
+        digest = hashlib.sha256()
+        if self.mirror:
+            errors = []
+            for url in self.repo_urls:
+                try:
+                    digest.update(ApkRepository(url, self.cache).source_checksum())
+                    return digest.digest()
+                except RuntimeError as e:
+                    errors.append(f"{url}: {e}")
+            raise RuntimeError("Ни одно зеркало не ответило: " + "; ".join(errors))
+        for url in self.repo_urls:
+            digest.update(url.encode("utf-8") + b"\0")
+            digest.update(ApkRepository(url, self.cache).source_checksum())
+        return digest.digest()
+
+    def source_stamp(self) -> bytes:
+        """
+        Отпечаток набора для проверки снимка: адреса в порядке приоритета
+        и отпечаток каждого индекса (ApkRepository.source_stamp). Для
+        зеркал — отпечаток первого ответившего.
+        """
+        digest = hashlib.sha256()
+        if self.mirror:
+            errors = []
+            for url in self.repo_urls:
+                try:
+                    digest.update(ApkRepository(url, self.cache).source_stamp())
+                    return digest.digest()
+                except RuntimeError as e:
+                    errors.append(f"{url}: {e}")
+            raise RuntimeError("Ни одно зеркало не ответило: " + "; ".join(errors))
+        for url in self.repo_urls:
+            digest.update(url.encode("utf-8") + b"\0")
+            digest.update(ApkRepository(url, self.cache).source_stamp())
+        return digest.digest()
+
+    def _load_records(self, url: str, sink) -> bytes:
+        """
+        Потоково передаёт записи индекса url в sink(url, record).
+        -> sha256 архива: сумма считается по тем же байтам.
+        Фаза parse — своя у каждого потока: из неё вычитаются чтение
+        из сети и распаковка этого же потока (download, extract).
+        """
+        # у каждого потока своя копия кэша, чтобы не путать last_status
+        cache = copy.copy(self.cache) if self.cache is not None else None
+        digest = hashlib.sha256()
+        with metrics.phase("parse"):
+            for record in ApkRepository(url, cache).fetch_records(digest):
+                sink(url, record)
+        self.statuses[url] = cache.last_status if cache is not None else None
+        return digest.digest()
+
+    def _load_all(self, sink, digest=None):
+        """
+        Грузит индексы всех репозиториев параллельно, записи идут в sink
+        по мере разбора. В digest — та же сумма, что у source_checksum().
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._load_records, url, sink) for url in self.repo_urls]
+            # суммы в порядке приоритета, ошибки пробрасываем как есть
+            checksums = [f.result() for f in futures]
+        if digest is not None:
+            for url, checksum in zip(self.repo_urls, checksums):
+                digest.update(url.encode("utf-8") + b"\0")
+                digest.update(checksum)
+
+    def parse_index(self, stream: bool = True):
+        """
+        Записи сливаются в репозиторий прямо при разборе: целиком в памяти
+        не держится ни один индекс.
+        """
+        digest = hashlib.sha256()
+        self.origin = {}
+        merge = _StreamMerge(self)
+        if self.mirror:
+            self._load_mirror(merge.accept, merge.discard, digest)
+        else:
+            self._load_all(merge.accept, digest)
+        self.index_checksum = digest.digest()
+
+    def fetch_records(self, digest=None) -> list[dict]:
+        """
+        Записи всех репозиториев, уже слитые по приоритету (нужны целиком
+        для сравнения со старым индексом, см. refreshed()).
+        Заодно обновляет origin. В digest попадает та же контрольная
+        сумма, что считает source_checksum().
+        """
+        loaded: dict[str, list[dict]] = {url: [] for url in self.repo_urls}
+        sink = lambda url, record: loaded[url].append(record)
+        if self.mirror:
+            self._load_mirror(sink, lambda url: loaded[url].clear(), digest)
+        else:
+            self._load_all(sink, digest)
+        return self._merge(list(loaded.items()))
+
+    def copy(self):
+        clone = super().copy()
+        clone.statuses = dict(self.statuses)
+        return clone
+
+    def _load_mirror(self, sink, discard, digest=None):
+        """
+        Зеркала пробуются по очереди: следующее — только если предыдущее
+        не ответило или оборвалось посреди архива (тогда его записи
+        убираются через discard(url)). Параллельно зеркала не качаются:
+        лишняя загрузка, начавшись, уже не остановится.
+        """
+        errors = []
+        for url in self.repo_urls:
+            try:
+                checksum = self._load_records(url, sink)
+            except Exception as e:
+                discard(url)
+                errors.append(f"{url}: {e}")
+                continue
+            if digest is not None:
+                digest.update(checksum)
+            return
+        raise RuntimeError("Ни одно зеркало не ответило: " + "; ".join(errors))
+
+    def _merge(self, loaded: list[tuple[str, list[dict]]]) -> list[dict]:
+        """
+        Сливает записи в один список. Если пакет уже пришёл из репозитория
+        с большим приоритетом, записи из остальных игнорируются.
+        """
+        origin: dict[str, str] = {}
+        merged = []
+        for url, records in loaded:
+            for record in records:
+                owner = origin.setdefault(record["name"], url)
+                if owner == url:
+                    merged.append(record)
+        self.origin = origin
+        return merged
+
+
+class _StreamMerge:
+    """
+    Слияние записей по приоритету прямо во время параллельной загрузки.
+
+    Записи приходят из потоков вперемешку: если пакет уже взят из
+    репозитория с меньшим приоритетом, а потом встретился в более
+    приоритетном, прежние версии выбрасываются. Для этого запоминаются
+    только provides принятых записей, сами записи не хранятся.
+    """
+
+    def __init__(self, repo: MultiRepository):
+        self.repo = repo
+        self.rank = {url: i for i, url in enumerate(repo.repo_urls)}
+        self.provided: dict[str, list[tuple[str, list[str]]]] = {}
+        self.lock = threading.Lock()
+
+    def accept(self, url: str, record: dict):
+        name = record["name"]
+        with self.lock:
+            owner = self.repo.origin.setdefault(name, url)
+            if owner != url:
+                if self.rank[url] > self.rank[owner]:
+                    return
+                self._evict(name)
+                self.repo.origin[name] = url
+            self.repo.add_record(record)
+            if record.get("provides"):
+                self.provided.setdefault(name, []).append((record["version"], record["provides"]))
+
+    def discard(self, url: str):
+        """
+        Убирает всё, что успело прийти из url (оборванная загрузка зеркала).
+        """
+        with self.lock:
+            for name in [n for n, owner in self.repo.origin.items() if owner == url]:
+                self._evict(name)
+                del self.repo.origin[name]
+
+    def _evict(self, name: str):
+        repo = self.repo
+        for version in repo.packages.pop(name, {}):
+            repo.fingerprints.pop((name, version), None)
+        repo._order.pop(name, None)
+        for _, provides in self.provided.pop(name, []):
+            for provided in provides:
+                rest = [c for c in repo.providers.get(provided, []) if c[0] != name]
+                if rest:
+                    repo.providers[provided] = rest
+                else:
+                    repo.providers.pop(provided, None)
+        repo._provider_index = None
+
+
+def load_for_arches(url_templates: list[str], arches: list[str | None],
+                    cache: IndexCache | None = None, mirror: bool = False,
+                    max_workers: int | None = None) -> dict[str, MultiRepository]:
+    """
+    Загружает набор репозиториев сразу для нескольких архитектур.
+    В адресах "{arch}" заменяется на архитектуру (None — адреса
+    используются как есть). Все архитектуры грузятся одновременно;
+    результат — свой MultiRepository на каждую.
+    """
+    repos = {
+        arch: MultiRepository([t.replace("{arch}", arch) if arch else t
+                               for t in url_templates],
+                              cache, mirror=mirror, max_workers=max_workers)
+        for arch in arches
+    }
+    if len(repos) == 1:
+        for repo in repos.values():
+            repo.parse_index()
+        return repos
+
+    with ThreadPoolExecutor(max_workers=len(repos)) as pool:
+        for future in [pool.submit(repo.parse_index) for repo in repos.values()]:
+            future.result()
+    return repos
@@ -0,0 +1,272 @@
+# src/package_store.py
+
+from array import array
+
+from apk_version import node_label, parse_dependency, select_version, split_label, version_key
+
+
+class StringTable:
+    """
+    Таблица интернированных строк: каждое имя хранится один раз,
+    дальше везде используется его целочисленный id.
+    """
+
+    __slots__ = ("strings", "_ids")
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self._ids: dict[str, int] = {}
+
+    @classmethod
+    def from_list(cls, strings: list[str]) -> "StringTable":
+        table = cls()
+        table.strings = strings
+        table._ids = dict(zip(strings, range(len(strings))))
+        return table
+
+    def intern(self, s: str) -> int:
+        sid = self._ids.get(s)
+        if sid is None:
+            sid = len(self.strings)
+            self._ids[s] = sid
+            self.strings.append(s)
+        return sid
+
+    def id_of(self, s: str) -> int | None:
+        return self._ids.get(s)
+
+    def __getitem__(self, sid: int) -> str:
+        return self.strings[sid]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class PackageEntry:
+    """
+    Пакет в компактном хранилище: id имени и номера его записей
+    (по одной на версию). latest — запись, которую берём без версии.
+    Создаётся лениво, при первом обращении к пакету.
+    """
+
+    __slots__ = ("name_id", "records", "latest")
+
+    def __init__(self, name_id: int, records: list[int]):
+        self.name_id = name_id
+        self.records = records
+        self.latest = records[-1]
+
+
+class CompactPackageStore:
+    """
+    Компактное хранилище пакетов.
+
+    Запись i — это пара (пакет, версия):
+        rec_name[i], rec_version[i]      — id строк
+        dep_targets[dep_offsets[i]:dep_offsets[i + 1]]
+                                         — id зависимостей (CSR)
+        rec_prev[i]                      — предыдущая запись того же пакета или -1
+    latest[sid]   — последняя запись пакета с именем sid или -1.
+    provider[sid] — id узла графа, к которому разрешается зависимость
+                    или виртуальное имя sid ("foo" или "foo=1.5-r0",
+                    apk_version.node_label), или -1.
+
+    Наружу отдаёт тот же API, что ApkRepository / TestRepository
+    (get_dependencies, dependencies_of, resolve), поэтому обход графа,
+    обратные зависимости и экспорт работают с ним без изменений.
+    """
+
+    def __init__(self):
+        self.strings = StringTable()
+        self.rec_name = array("I")
+        self.rec_version = array("I")
+        self.rec_prev = array("i")
+        self.dep_offsets = array("I", [0])
+        self.dep_targets = array("I")
+        self.latest = array("i")
+        self.provider = array("i")
+        self._entries: dict[int, PackageEntry] = {}
+        self._mmap = None  # заполняется, если хранилище открыто из снимка
+
+    @classmethod
+    def from_repository(cls, repo) -> "CompactPackageStore":
+        """
+        Переносит в хранилище все пакеты репозитория
+        (ApkRepository или TestRepository) вместе с разрешением провайдеров.
+        iter_packages() отдаёт версии по возрастанию, поэтому latest —
+        самая новая версия, а не последняя в файле индекса. Виртуальные
+        имена (p:) разрешаются все, даже те, от которых никто не зависит.
+        """
+        store = cls()
+        for name, version, deps in repo.iter_packages():
+            store.add(name, version, deps)
+        store.resolve_providers(repo.resolve, getattr(repo, "providers", ()))
+        return store
+
+    def add(self, name: str, version: str, deps: list[str]):
+        intern = self.strings.intern
+        name_id = intern(name)
+        index = len(self.rec_name)
+
+        self.rec_name.append(name_id)
+        self.rec_version.append(intern(version))
+        self.dep_targets.extend(intern(d) for d in deps)
+        self.dep_offsets.append(len(self.dep_targets))
+
+        self._grow(self.latest)
+        self.rec_prev.append(self.latest[name_id])
+        self.latest[name_id] = index
+        self._entries.pop(name_id, None)
+
+    def _grow(self, per_string: array):
+        # массивы "по строкам" догоняем до размера таблицы строк
+        missing = len(self.strings) - len(per_string)
+        if missing > 0:
+            per_string.extend([-1] * missing)
+
+    def _entry(self, name_id: int | None) -> PackageEntry | None:
+        if name_id is None or name_id >= len(self.latest) or self.latest[name_id] < 0:
+            return None
+        entry = self._entries.get(name_id)
+        if entry is None:
+            records = []
+            index = self.latest[name_id]
+            while index >= 0:
+                records.append(index)
+                index = self.rec_prev[index]
+            records.reverse()
+            entry = self._entries[name_id] = PackageEntry(name_id, records)
+        return entry
+
+    def resolve_providers(self, resolve_func, virtual=()):
+        """
+        Один раз разрешает каждую встречающуюся зависимость и каждое
+        имя из virtual в узел графа.
+        resolve_func(dep: str) -> (package, version | None) | None
+        """
+        targets = list(self.dep_targets)
+        targets.extend(self.strings.intern(name) for name in virtual)
+        provider = array("i", [-1]) * len(self.strings)
+        seen = set()
+        for sid in targets:
+            if sid in seen:
+                continue
+            seen.add(sid)
+            resolved = resolve_func(self.strings[sid])
+            if resolved is not None:
+                provider[sid] = self.strings.intern(self.label(*resolved))
+        # intern мог добавить новые строки — дополняем массивы
+        self._grow(provider)
+        self._grow(self.latest)
+        self.provider = provider
+
+    # ===== API, совместимый с ApkRepository =====
+
+    def _record(self, package: str, version: str | None) -> int:
+        entry = self._entry(self.strings.id_of(package))
+        if entry is None:
+            raise ValueError(f"Пакет '{package}' не найден")
+
+        if version is None:
+            return entry.latest
+
+        version_id = self.strings.id_of(version)
+        for index in entry.records:
+            if self.rec_version[index] == version_id:
+                return index
+        raise ValueError(f"Версия '{version}' для пакета '{package}' не найдена")
+
+    def _targets(self, index: int):
+        return self.dep_targets[self.dep_offsets[index]:self.dep_offsets[index + 1]]
+
+    def get_dependencies(self, package: str, version: str | None = None) -> list[str]:
+        strings = self.strings.strings
+        return [strings[sid] for sid in self._targets(self._record(package, version))]
+
+    def dependencies_of(self, package: str, version: str | None = None,
+                        skip=None) -> list[str]:
+        """
+        Как ApkRepository.dependencies_of, в том числе skip: отсечённые
+        фильтром имена из D: остаются неразрешёнными листьями.
+        """
+        if version is None and package not in self:
+            # узел "foo=1.5-r0" — зависимости выбранной версии
+            package, version = split_label(package)
+            if version is None or version not in self.versions(package):
+                return []
+
+        strings = self.strings.strings
+        provider = self.provider
+        result: list[str] = []
+        seen: set[int] = set()
+        skipped: set[str] = set()
+        for sid in self._targets(self._record(package, version)):
+            if skip is not None:
+                name = parse_dependency(strings[sid])[0]
+                if name in skip:
+                    if name not in skipped:
+                        skipped.add(name)
+                        result.append(name)
+                    continue
+            target = provider[sid] if sid < len(provider) else -1
+            if target < 0:
+                target = sid
+            if target not in seen:
+                seen.add(target)
+                result.append(strings[target])
+        return result
+
+    def resolve(self, dep: str) -> tuple[str, str] | None:
+        """
+        Как ApkRepository.resolve: пакет с таким именем, затем уже
+        разрешённая зависимость, затем ограничение ("foo<2") по версиям
+        пакета и, наконец, провайдер виртуального имени.
+        """
+        sid = self.strings.id_of(dep)
+        entry = self._entry(sid)
+        if entry is not None:
+            return dep, self.strings[self.rec_version[entry.latest]]
+        resolved = self._provided(sid)
+        if resolved is not None:
+            return resolved
+        name, op, version = parse_dependency(dep)
+        if op is not None and name in self:
+            versions = self.versions(name)
+            selected = select_version([version_key(v) for v in versions], versions, op, version)
+            return (name, selected) if selected is not None else None
+        return self._provided(self.strings.id_of(name)) if name != dep else None
+
+    def _provided(self, sid: int | None) -> tuple[str, str] | None:
+        if sid is None or sid >= len(self.provider) or self.provider[sid] < 0:
+            return None
+        name, version = split_label(self.strings[self.provider[sid]])
+        return self.resolve(name) if version is None else (name, version)
+
+    def label(self, package: str, version: str | None) -> str:
+        entry = self._entry(self.strings.id_of(package))
+        if version is None or entry is None or \
+                self.strings[self.rec_version[entry.latest]] == version:
+            return package
+        return node_label(package, version)
+
+    def versions(self, package: str) -> list[str]:
+        entry = self._entry(self.strings.id_of(package))
+        if entry is None:
+            return []
+        return [self.strings[self.rec_version[i]] for i in entry.records]
+
+    def iter_packages(self):
+        strings = self.strings.strings
+        for index in range(len(self.rec_name)):
+            yield (
+                strings[self.rec_name[index]],
+                strings[self.rec_version[index]],
+                [strings[sid] for sid in self._targets(index)],
+            )
+
+    def __contains__(self, package: str) -> bool:
+        name_id = self.strings.id_of(package)
+        return name_id is not None and name_id < len(self.latest) and self.latest[name_id] >= 0
+
+    def __len__(self) -> int:
+        return sum(1 for index in self.latest if index >= 0)
@@ -0,0 +1,111 @@
+# src/reverse_index.py
+
+from apk_version import split_label
+from traversal import bfs
+
+_ROOTS = object()  # общий корень обхода для всех узлов одного пакета
+
+
+class ReverseIndex:
+    """
+    Обратный индекс по всему репозиторию: пакет -> кто от него зависит.
+
+    Строится один раз по всем записям индекса (все версии), зависимости
+    приводятся к реальным пакетам через провайдеров (so:, cmd:, /bin/sh).
+    Узлы — как в графе зависимостей: самая новая версия пакета — его имя,
+    остальные — "foo=1.5-r0" (apk_version.node_label), так что ребро
+    "bar<2" ведёт к той версии bar, которую выбрало ограничение.
+    Запрос "кто транзитивно зависит от X" — это BFS по индексу от всех
+    узлов X, его стоимость пропорциональна размеру ответа, а не всего
+    репозитория.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.dependents: dict[str, list[str]] = {}
+        # пакет -> узлы его не самых новых версий, от которых кто-то зависит
+        self.variants: dict[str, set[str]] = {}
+        self._build()
+
+    def _build(self):
+        repo = self.repo
+        seen: set[tuple[str, str]] = set()
+        for name, version, deps in repo.iter_packages():
+            source = repo.label(name, version)
+            for dep in deps:
+                resolved = repo.resolve(dep)
+                target = repo.label(*resolved) if resolved is not None else dep
+                if target == source or (target, source) in seen:
+                    continue
+                seen.add((target, source))
+                self.dependents.setdefault(target, []).append(source)
+                if resolved is not None and target != resolved[0]:
+                    self.variants.setdefault(resolved[0], set()).add(target)
+
+    def patched(self, repo, delta) -> "ReverseIndex":
+        """
+        Новый индекс для обновлённого репозитория: меняются только списки
+        пакетов, у которых появились или пропали зависимые (delta —
+        IndexDelta), остальные списки общие со старым индексом.
+        """
+        index = ReverseIndex.__new__(ReverseIndex)
+        index.repo = repo
+        index.dependents = dict(self.dependents)
+        index.variants = dict(self.variants)
+        copied: set[str] = set()
+
+        def own(target: str) -> list[str]:
+            if target not in copied:
+                copied.add(target)
+                index.dependents[target] = list(index.dependents.get(target, []))
+            return index.dependents[target]
+
+        for name, target in delta.edges_removed:
+            dependents = own(target)
+            if name in dependents:
+                dependents.remove(name)
+        for name, target in delta.edges_added:
+            dependents = own(target)
+            if name not in dependents:
+                dependents.append(name)
+            package, version = split_label(target)
+            if version is not None:
+                index.variants[package] = index.variants.get(package, set()) | {target}
+        for target in copied:
+            if not index.dependents[target]:
+                del index.dependents[target]
+        return index
+
+    def _keys(self, package: str) -> list[str]:
+        # разрешаем и виртуальные имена: "so:libc.musl-x86_64.so.1" -> musl
+        resolved = self.repo.resolve(package)
+        name = resolved[0] if resolved is not None else package
+        return [name] + sorted(self.variants.get(name, ()))
+
+    def direct(self, package: str) -> list[str]:
+        """
+        Пакеты, которые напрямую зависят от package (от любой его версии).
+        """
+        keys = self._keys(package)
+        result: dict[str, None] = {}
+        for key in keys:
+            result.update(dict.fromkeys(d for d in self.dependents.get(key, ())
+                                        if split_label(d)[0] != keys[0]))
+        return list(result)
+
+    def query(self, package: str, max_depth: int | None = None) -> list[tuple[str, int]]:
+        """
+        Все пакеты, транзитивно зависящие от package, с расстоянием до него:
+        [(pkg, depth), ...] в порядке BFS. max_depth ограничивает глубину.
+        """
+        keys = self._keys(package)
+
+        def neighbors(node):
+            return keys if node is _ROOTS else self.dependents.get(node, ())
+
+        # узлы пакета — на глубине 1 от общего корня; его же версии в ответ
+        # не входят, даже если зависят от него через другие пакеты
+        walk = bfs(_ROOTS, neighbors,
+                   max_depth=max_depth + 1 if max_depth is not None else None)
+        return [(pkg, depth - 1) for pkg, depth in walk
+                if depth > 1 and split_label(pkg)[0] != keys[0]]
@@ -0,0 +1,339 @@
+# src/server.py
+
+"""
+Долгоживущий сервер запросов: индекс загружается один раз и остаётся
+в памяти, запросы приходят по HTTP или через Unix-сокет.
+
+Запрос — набор полей:
+    op       — closure | reverse | tree | dot
+    package  — имя пакета
+    version  — версия корня (необязательно)
+    depth    — глубина (по умолчанию 3)
+    filter   — правило фильтра (filters.py) или список правил (необязательно);
+               добавляется к правилам, с которыми запущен сервер
+
+HTTP:  GET /query?op=closure&package=bash&depth=2   -> JSON
+Unix:  одна строка JSON на запрос, одна строка JSON в ответ.
+"""
+
+import io
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from apk_version import split_label
+from dependency_graph import DependencyGraph
+from filters import FilterSet, compile_filters
+from reverse_index import ReverseIndex
+
+OPERATIONS = ("closure", "reverse", "tree", "dot")
+
+
+class IndexState:
+    """
+    Загруженный индекс и построенные по нему структуры. После создания
+    не меняется: при обновлении сервер подменяет состояние целиком, а
+    запросы, которые уже выполняются, дорабатывают со старым.
+    """
+
+    def __init__(self, repo, checksum: bytes, generation: int,
+                 reverse: ReverseIndex | None = None):
+        self.repo = repo
+        self.checksum = checksum
+        self.generation = generation
+        self.loaded_at = time.time()
+        self._reverse = reverse
+        self._skips: OrderedDict = OrderedDict()  # правила -> SkipIndex
+        self._lock = threading.Lock()
+
+    @property
+    def reverse(self) -> ReverseIndex:
+        with self._lock:
+            if self._reverse is None:
+                self._reverse = ReverseIndex(self.repo)
+            return self._reverse
+
+    def skip_for(self, filters: FilterSet):
+        """
+        SkipIndex для набора правил по этому индексу; считается один раз
+        на набор, хранятся последние несколько наборов.
+        """
+        with self._lock:
+            skip = self._skips.get(filters.rules)
+            if skip is None:
+                skip = self._skips[filters.rules] = filters.bind(self.repo)
+                while len(self._skips) > 32:
+                    self._skips.popitem(last=False)
+            else:
+                self._skips.move_to_end(filters.rules)
+            return skip
+
+    def successor(self):
+        """
+        Следующее состояние, полученное инкрементально (repo.refreshed()):
+        -> (IndexState, IndexDelta). Контрольная сумма — по тому же
+        скачиванию, что и записи. Уже построенный обратный индекс
+        не пересобирается, а исправляется по delta.
+        """
+        repo, delta = self.repo.refreshed()
+        with self._lock:
+            reverse = self._reverse.patched(repo, delta) if self._reverse is not None else None
+        return IndexState(repo, repo.index_checksum, self.generation + 1, reverse), delta
+
+
+class QueryService:
+    """
+    Выполняет запросы к текущему состоянию и кэширует ответы в LRU
+    по ключу (op, package, version, depth, filter).
+
+    loader() -> (repo, checksum) загружает индекс; checksum должна быть
+    посчитана по тем же данным, из которых собран repo. check() -> stamp
+    дёшево проверяет, изменился ли источник (ETag / Last-Modified, mtime
+    файла): индекс загружается заново, только если отпечаток отличается
+    от прошлого. Если check не задан, для проверки вызывается loader.
+    Если репозиторий умеет refreshed() (ApkRepository), новый индекс
+    накладывается на старый как разница, и кэш ответов сохраняется для
+    запросов, не задевающих изменившиеся пакеты.
+
+    filters — правила фильтра для всех запросов; фильтр по ним
+    считается по индексу сразу при загрузке и при каждом обновлении.
+    """
+
+    def __init__(self, loader, check=None, cache_size: int = 1024,
+                 refresh_interval: float | None = None, filters: FilterSet | None = None):
+        self.loader = loader
+        self.check = check
+        self.filters = filters if filters is not None else FilterSet(())
+        self.cache_size = cache_size
+        self.refresh_interval = refresh_interval
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.last_delta = None
+
+        # отпечаток берётся до загрузки: изменение во время неё заметит следующая проверка
+        self._stamp = check() if check is not None else None
+        repo, checksum = loader()
+        self.state = self._warm(IndexState(repo, checksum, 1))
+
+    def _warm(self, state: IndexState) -> IndexState:
+        if self.filters:
+            state.skip_for(self.filters)
+        return state
+
+    # ===== обновление индекса =====
+
+    def refresh(self) -> bool:
+        """
+        Проверяет источник и, если индекс изменился, загружает новый
+        и подменяет состояние. Возвращает True, если подмена была.
+        """
+        current = self.state
+        stamp = self.check() if self.check is not None else None
+        if stamp is not None and stamp == self._stamp:
+            return False
+
+        if hasattr(current.repo, "refreshed"):
+            state, delta = current.successor()
+        else:
+            repo, checksum = self.loader()
+            state, delta = IndexState(repo, checksum, current.generation + 1), None
+        # отпечаток запоминается только после удачной загрузки
+        self._stamp = stamp
+        if state.checksum == current.checksum:
+            return False
+        self.last_delta = delta
+
+        # ссылка меняется одним присваиванием — запросы в работе не страдают
+        self.state = self._warm(state)
+        with self._cache_lock:
+            kept = self._carry_over(state.generation, delta)
+            self._cache.clear()
+            self._cache.update(kept)
+        return True
+
+    def _carry_over(self, generation: int, delta) -> OrderedDict:
+        """
+        Ответы, которые остаются верными после обновления, под ключом
+        нового поколения. Ответ переживает обновление, если ни один узел
+        его графа не затронут delta. Обратные запросы сбрасываются всегда.
+        """
+        kept = OrderedDict()
+        if delta is None:
+            return kept
+        touched = delta.packages
+        for key, (result, nodes) in self._cache.items():
+            package = key[2]
+            if nodes is None or package in touched or package in delta.providers:
+                continue
+            if touched.isdisjoint(nodes):
+                kept[(generation,) + key[1:]] = (dict(result, generation=generation), nodes)
+        return kept
+
+    def start_refresher(self):
+        if not self.refresh_interval:
+            return
+        thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        thread.start()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                if self.refresh():
+                    print(f"[INFO] Индекс обновлён (поколение {self.state.generation})")
+                    if self.last_delta is not None:
+                        print(f"[INFO] Изменения: {self.last_delta.summary()}")
+            except Exception as e:
+                print(f"[WARN] Не удалось обновить индекс: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    # ===== запросы =====
+
+    def handle(self, query: dict) -> dict:
+        try:
+            if not isinstance(query, dict):
+                raise ValueError("Запрос должен быть JSON-объектом")
+            op = query.get("op", "closure")
+            if not isinstance(op, str) or op not in OPERATIONS:
+                raise ValueError(f"Неизвестная операция '{op}'. Разрешено: {list(OPERATIONS)}")
+            package = query.get("package")
+            if not package or not isinstance(package, str):
+                raise ValueError("Не указан package")
+            version = query.get("version") or None
+            if version is not None and not isinstance(version, str):
+                raise ValueError("version должна быть строкой")
+            depth = int(query.get("depth") or 3)
+            if depth < 1:
+                raise ValueError("depth должен быть >= 1")
+            rules = query.get("filter") or ()
+            if isinstance(rules, str):
+                rules = (rules,)
+            if not isinstance(rules, list | tuple) or not all(isinstance(r, str) for r in rules):
+                raise ValueError("filter — строка или список строк")
+            filters = compile_filters(self.filters.rules + tuple(rules))
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}
+
+        state = self.state
+        key = (state.generation, op, package, version, depth, filters.rules)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached[0]
+
+        try:
+            result, nodes = self._execute(state, op, package, version, depth, filters)
+        except Exception as e:
+            return {"error": str(e)}
+
+        result.update({"op": op, "package": package, "generation": state.generation})
+        with self._cache_lock:
+            self._cache[key] = (result, nodes)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _execute(self, state: IndexState, op: str, package: str,
+                 version: str | None, depth: int, filters: FilterSet):
+        """
+        -> (ответ, узлы графа). Узлы нужны, чтобы при обновлении индекса
+        понять, задет ли ответ; для reverse они не собираются (None).
+        """
+        repo = state.repo
+        resolved = repo.resolve(package)
+        if resolved is None:
+            raise ValueError(f"Пакет '{package}' не найден")
+        if version is None:
+            # виртуальное имя (so:..., cmd:...) -> пакет-провайдер
+            package = resolved[0]
+
+        if op == "reverse":
+            return {"reverse": [{"package": p, "depth": d}
+                                for p, d in state.reverse.query(package, depth)]}, None
+
+        skip = state.skip_for(filters) if filters else None
+        graph_builder = DependencyGraph(depth, skip=skip)
+        graph_builder.build(package, version,
+                            lambda name, ver: repo.dependencies_of(name, ver, skip))
+        # узлы "foo=1.5-r0" сверяются с обновлением по имени пакета
+        nodes = frozenset(split_label(node)[0] for node in
+                          set(graph_builder.graph).union(*graph_builder.graph.values()))
+        if op == "closure":
+            return {"graph": graph_builder.graph}, nodes
+        if op == "dot":
+            return {"dot": graph_builder.to_dot(package)}, nodes
+
+        buffer = io.StringIO()
+        graph_builder.print_ascii(package, out=buffer)
+        return {"tree": buffer.getvalue()}, nodes
+
+
+# ===== транспорт =====
+
+class _HttpHandler(BaseHTTPRequestHandler):
+    service: QueryService = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/query":
+            self._reply(404, {"error": "Используйте /query"})
+            return
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        result = self.service.handle(query)
+        self._reply(400 if "error" in result else 200, result)
+
+    def _reply(self, code: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # не засоряем вывод строкой на каждый запрос
+
+
+class _UnixHandler(socketserver.StreamRequestHandler):
+    service: QueryService = None
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                query = json.loads(line)
+            except ValueError as e:
+                result = {"error": f"Некорректный JSON: {e}"}
+            else:
+                result = self.service.handle(query)
+            self.wfile.write(json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: QueryService, listen: str):
+    """
+    listen: "host:port" для HTTP или "unix:/path/to.sock" для Unix-сокета.
+    """
+    if listen.startswith("unix:"):
+        path = listen[len("unix:"):]
+        if os.path.exists(path):
+            os.unlink(path)
+        handler = type("UnixHandler", (_UnixHandler,), {"service": service})
+        return _ThreadingUnixServer(path, handler)
+
+    host, _, port = listen.rpartition(":")
+    handler = type("HttpHandler", (_HttpHandler,), {"service": service})
+    return ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
@@ -0,0 +1,257 @@
+# src/snapshot.py
+
+"""
+Бинарный снимок разобранного индекса.
+
+Формат (все числа little-endian, секции выровнены на 4 байта):
+    заголовок   — magic, версия формата, отпечаток исходного индекса
+                  (source_stamp), размеры
+    strings     — интернированные строки в UTF-8 подряд
+    str_offsets — uint32[n_strings + 1], строка i — strings[off[i]:off[i + 1]]
+    str_slots   — int32[n_slots], хеш-таблица "строка -> id" (crc32,
+                  линейное пробирование, -1 — пусто)
+    rec_name    — uint32[n_records]
+    rec_version — uint32[n_records]
+    rec_prev    — int32[n_records]
+    dep_offsets — uint32[n_records + 1]
+    dep_targets — uint32[n_targets]
+    latest      — int32[n_strings]
+    provider    — int32[n_strings]
+
+Снимок открывается через mmap: массивы не копируются и не разбираются,
+а используются прямо из отображённого файла (memoryview.cast). Строки
+тоже не декодируются при загрузке: строка по id берётся по таблице
+смещений, id по строке — по хеш-таблице, обе лежат в файле.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from package_store import CompactPackageStore, StringTable
+
+MAGIC = b"APKSNAP\0"
+FORMAT_VERSION = 5  # 5: provider заполнен и для виртуальных имён, от которых никто не зависит
+
+# magic, версия, отпечаток, n_strings, n_records, n_targets, strings_len, n_slots
+_HEADER = struct.Struct("<8sI32sIIIII")
+
+
+def _pad(n: int) -> int:
+    return (4 - n % 4) % 4
+
+
+def _slot_count(n_strings: int) -> int:
+    # степень двойки, заполнение не больше половины
+    size = 1
+    while size < 2 * n_strings:
+        size *= 2
+    return size
+
+
+def pack_strings(strings) -> tuple[bytes, array, array]:
+    """
+    Строки в том виде, в каком их читает MappedStringTable:
+    -> (UTF-8 подряд, uint32 смещения, int32 хеш-таблица id).
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    blob = b"".join(encoded)
+
+    offsets = array("I", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    n_slots = _slot_count(len(encoded))
+    mask = n_slots - 1
+    slots = array("i", [-1]) * n_slots
+    for sid, data in enumerate(encoded):
+        slot = zlib.crc32(data) & mask
+        while slots[slot] >= 0:
+            slot = (slot + 1) & mask
+        slots[slot] = sid
+    return blob, offsets, slots
+
+
+def write_snapshot(path: str, store: CompactPackageStore, stamp: bytes):
+    """
+    Записывает компактное хранилище в файл (атомарно, через временный файл).
+    stamp — отпечаток исходного индекса, по нему снимок потом проверяется.
+    """
+    strings = store.strings.strings
+    blob, offsets, slots = pack_strings(strings)
+    n_slots = len(slots)
+
+    per_string = []
+    for source in (store.latest, store.provider):
+        values = array("i", source)
+        values.extend([-1] * (len(strings) - len(values)))
+        per_string.append(values)
+
+    sections = [
+        offsets,
+        slots,
+        array("I", store.rec_name),
+        array("I", store.rec_version),
+        array("i", store.rec_prev),
+        array("I", store.dep_offsets),
+        array("I", store.dep_targets),
+        *per_string,
+    ]
+    if sys.byteorder != "little":
+        for section in sections:
+            section.byteswap()
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, stamp, len(strings),
+                             len(store.rec_name), len(store.dep_targets), len(blob),
+                             n_slots))
+        f.write(blob)
+        f.write(b"\0" * _pad(len(blob)))
+        for section in sections:
+            section.tofile(f)
+    os.replace(tmp, path)
+
+
+def load_snapshot(path: str, stamp: bytes | None = None) -> CompactPackageStore | None:
+    """
+    Открывает снимок через mmap. Возвращает None, если файла нет, он
+    другой версии формата или собран из другого индекса (stamp).
+    Полученное хранилище только для чтения.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _HEADER.size:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, stored_stamp, n_strings, n_records, n_targets, strings_len, n_slots = \
+        _HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        mm.close()
+        return None
+    if stamp is not None and stored_stamp != stamp:
+        mm.close()
+        return None
+    if sys.byteorder != "little":
+        # на big-endian массивы пришлось бы переворачивать — проще пересобрать
+        mm.close()
+        return None
+
+    view = memoryview(mm)
+    pos = _HEADER.size
+    blob = view[pos:pos + strings_len]
+    pos += strings_len + _pad(strings_len)
+
+    def take(count: int, fmt: str):
+        nonlocal pos
+        part = view[pos:pos + 4 * count].cast(fmt)
+        pos += 4 * count
+        return part
+
+    store = CompactPackageStore.__new__(CompactPackageStore)
+    store.strings = MappedStringTable(blob, take(n_strings + 1, "I"), take(n_slots, "i"))
+    store.rec_name = take(n_records, "I")
+    store.rec_version = take(n_records, "I")
+    store.rec_prev = take(n_records, "i")
+    store.dep_offsets = take(n_records + 1, "I")
+    store.dep_targets = take(n_targets, "I")
+    store.latest = take(n_strings, "i")
+    store.provider = take(n_strings, "i")
+    store._entries = {}
+    store._mmap = mm  # отображение должно жить столько же, сколько хранилище
+    return store
+
+
+def load_or_build(path: str, stamp: bytes, build_repo) -> tuple[CompactPackageStore, bool]:
+    """
+    Берёт хранилище из снимка, а если снимок устарел — строит репозиторий
+    заново (build_repo() -> ApkRepository / TestRepository) и сохраняет
+    новый снимок. Возвращает (хранилище, загружено_ли_из_снимка).
+    """
+    store = load_snapshot(path, stamp)
+    if store is not None:
+        return store, True
+
+    store = CompactPackageStore.from_repository(build_repo())
+    write_snapshot(path, store, stamp)
+    return store, False
+
+
+class _MappedStrings:
+    """
+    Последовательность строк снимка: декодируется только то, к чему
+    обращались (и запоминается).
+    """
+
+    __slots__ = ("blob", "offsets", "extra", "_decoded")
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+        self.extra: list[str] = []  # строки, добавленные после загрузки
+        self._decoded: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1 + len(self.extra)
+
+    def __getitem__(self, sid: int) -> str:
+        string = self._decoded.get(sid)
+        if string is None:
+            n = len(self.offsets) - 1
+            if sid >= n:
+                return self.extra[sid - n]
+            if sid < 0:
+                raise IndexError(sid)
+            string = self._decoded[sid] = \
+                str(self.blob[self.offsets[sid]:self.offsets[sid + 1]], "utf-8")
+        return string
+
+    def __iter__(self):
+        for sid in range(len(self)):
+            yield self[sid]
+
+
+class MappedStringTable(StringTable):
+    """
+    StringTable поверх снимка: строки и хеш-таблица id остаются в mmap,
+    при загрузке ничего не разбирается. intern() новых строк работает,
+    они хранятся отдельно в памяти.
+    """
+
+    __slots__ = ("_slots",)
+
+    def __init__(self, blob, offsets, slots):
+        self.strings = _MappedStrings(blob, offsets)
+        self._slots = slots
+        self._ids = {}  # только строки, добавленные через intern()
+
+    def id_of(self, s: str) -> int | None:
+        data = s.encode("utf-8")
+        strings = self.strings
+        slots = self._slots
+        if slots:
+            mask = len(slots) - 1
+            slot = zlib.crc32(data) & mask
+            while True:
+                sid = slots[slot]
+                if sid < 0:
+                    break
+                if strings.blob[strings.offsets[sid]:strings.offsets[sid + 1]] == data:
+                    return sid
+                slot = (slot + 1) & mask
+        return self._ids.get(s)
+
+    def intern(self, s: str) -> int:
+        sid = self.id_of(s)
+        if sid is None:
+            sid = self._ids[s] = len(self.strings)
+            self.strings.extra.append(s)
+        return sid
@@ -0,0 +1,219 @@
+# src/synthetic_repo.py
+
+"""
+Генератор синтетических репозиториев для нагрузочных проверок.
+
+Пакеты pkg000000 ... зависят в основном от пакетов с большими номерами
+(получается DAG), часть рёбер ведёт назад и образует циклы. Часть
+зависимостей идёт через виртуальные имена (so:libsynN.so.1) с несколькими
+провайдерами разного приоритета, часть — с ограничением на версию.
+
+Результат — APKINDEX.tar.gz (тот же формат, что у Alpine) и/или
+файл тестового репозитория (формат TestRepository).
+
+    python3 src/synthetic_repo.py --packages 50000 --fanout 4 --cycles 0.01 --out /tmp/synth
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import random
+import sys
+import tarfile
+from pathlib import Path
+
+
+class SyntheticConfig:
+    """
+    Параметры генерации.
+
+    packages  — число пакетов
+    fanout    — среднее число зависимостей у пакета
+    chain     — вероятность зависимости i -> i+1 (длинные цепочки, глубокий обход)
+    cycles    — доля пакетов с обратным ребром (циклы)
+    providers — число виртуальных имён (so:...), у каждого 1–3 провайдера
+    virtual   — доля зависимостей через виртуальные имена
+    versions  — версий на пакет
+    seed      — зерно генератора, одинаковое зерно даёт одинаковый репозиторий
+    """
+
+    def __init__(self, packages: int = 1000, fanout: float = 3.0, chain: float = 0.1,
+                 cycles: float = 0.01, providers: int = 100, virtual: float = 0.2,
+                 versions: int = 1, seed: int = 1):
+        self.packages = packages
+        self.fanout = fanout
+        self.chain = chain
+        self.cycles = cycles
+        self.providers = providers
+        self.virtual = virtual
+        self.versions = versions
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def package_name(index: int) -> str:
+    return f"pkg{index:06d}"
+
+
+def generate_records(config: SyntheticConfig):
+    """
+    Генерирует записи в формате apk_parser.parse_records
+    (name, version, deps, provides, provider_priority, checksum).
+    """
+    rng = random.Random(config.seed)
+    n = config.packages
+
+    # виртуальные имена и их провайдеры
+    virtual_names = [f"so:libsyn{j}.so.1" for j in range(config.providers)]
+    provides: dict[int, list[str]] = {}
+    for name in virtual_names:
+        for provider in rng.sample(range(n), min(n, rng.randint(1, 3))):
+            provides.setdefault(provider, []).append(name)
+
+    for i in range(n):
+        deps: list[str] = []
+        if i + 1 < n:
+            if rng.random() < config.chain:
+                deps.append(package_name(i + 1))
+            # pkg000000 — "мета-пакет" вроде alpine-base, от него идёт обход
+            count = int(4 * config.fanout) + 1 if i == 0 else rng.randint(0, int(2 * config.fanout))
+            for _ in range(count):
+                if virtual_names and rng.random() < config.virtual:
+                    deps.append(rng.choice(virtual_names))
+                    continue
+                dep = package_name(rng.randrange(i + 1, n))
+                if rng.random() < 0.1:
+                    dep += ">=1.0-r0"
+                deps.append(dep)
+        if i > 0 and rng.random() < config.cycles:
+            deps.append(package_name(rng.randrange(0, i)))
+        deps = list(dict.fromkeys(deps))
+
+        name = package_name(i)
+        priority = rng.choice((0, 10, 100)) if i in provides else 0
+        for v in range(config.versions):
+            version = f"1.{v}.{i % 7}-r{v % 3}"
+            checksum = "Q1" + base64.b64encode(
+                hashlib.sha1(f"{name}-{version}".encode()).digest()).decode()
+            yield {
+                "name": name,
+                "version": version,
+                # у старых версий на одну зависимость меньше
+                "deps": deps if v == config.versions - 1 else deps[:-1],
+                "provides": provides.get(i, []),
+                "provider_priority": priority,
+                "checksum": checksum,
+            }
+
+
+def format_record(record: dict) -> str:
+    lines = [f"C:{record['checksum']}", f"P:{record['name']}",
+             f"V:{record['version']}", "A:x86_64"]
+    if record["provider_priority"]:
+        lines.append(f"k:{record['provider_priority']}")
+    if record["deps"]:
+        lines.append("D:" + " ".join(record["deps"]))
+    if record["provides"]:
+        lines.append("p:" + " ".join(f"{p}=1" for p in record["provides"]))
+    return "\n".join(lines) + "\n\n"
+
+
+def write_apkindex(path: str | Path, records) -> int:
+    """
+    Пишет APKINDEX.tar.gz. Текст индекса сначала уходит во временный
+    файл рядом (tarfile нужен размер члена заранее), в памяти не копится.
+    Возвращает число записей.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    raw = path.with_name(f".APKINDEX.{os.getpid()}")
+    count = 0
+    try:
+        with raw.open("w", encoding="utf-8") as f:
+            for record in records:
+                f.write(format_record(record))
+                count += 1
+        with tarfile.open(path, "w:gz") as tar:
+            tar.add(raw, arcname="APKINDEX")
+    finally:
+        raw.unlink(missing_ok=True)
+    return count
+
+
+def write_test_repo(path: str | Path, records) -> int:
+    """
+    Пишет файл тестового репозитория (A:B C). Версий и виртуальных имён
+    там нет, поэтому берётся последняя версия пакета, виртуальные имена
+    заменяются первым провайдером, ограничения на версию отбрасываются.
+    """
+    latest: dict[str, list[str]] = {}
+    provider_of: dict[str, str] = {}
+    for record in records:
+        latest[record["name"]] = record["deps"]
+        for provided in record["provides"]:
+            provider_of.setdefault(provided, record["name"])
+
+    with open(path, "w", encoding="utf-8") as f:
+        for name, deps in latest.items():
+            targets = []
+            for dep in deps:
+                dep = dep.split(">=", 1)[0]
+                targets.append(provider_of.get(dep, dep))
+            f.write(f"{name}:{' '.join(dict.fromkeys(targets))}\n")
+    return len(latest)
+
+
+def generate(out_dir: str | Path, config: SyntheticConfig, arch: str = "x86_64",
+             test_repo: bool = True) -> dict:
+    """
+    Создаёт <out_dir>/<arch>/APKINDEX.tar.gz и <out_dir>/test_repo.txt.
+    Возвращает пути: {"repo_url": "file://...", "index": ..., "test_repo": ...}.
+    """
+    out_dir = Path(out_dir).resolve()
+    index = out_dir / arch / "APKINDEX.tar.gz"
+    write_apkindex(index, generate_records(config))
+    result = {"repo_url": (out_dir / arch).as_uri(), "index": str(index)}
+    if test_repo:
+        result["test_repo"] = str(out_dir / "test_repo.txt")
+        write_test_repo(result["test_repo"], generate_records(config))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетического репозитория")
+    parser.add_argument("--out", required=True, help="Каталог для результата")
+    parser.add_argument("--packages", type=int, default=1000)
+    parser.add_argument("--fanout", type=float, default=3.0)
+    parser.add_argument("--chain", type=float, default=0.1)
+    parser.add_argument("--cycles", type=float, default=0.01)
+    parser.add_argument("--providers", type=int, default=100)
+    parser.add_argument("--virtual", type=float, default=0.2)
+    parser.add_argument("--versions", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--arch", default="x86_64")
+    parser.add_argument("--no-test-repo", action="store_true",
+                        help="Не писать файл тестового репозитория")
+    args = parser.parse_args()
+
+    if args.packages < 1 or args.versions < 1:
+        print("[ERROR] --packages и --versions должны быть >= 1.")
+        sys.exit(1)
+    for option in ("chain", "cycles", "virtual"):
+        if not 0 <= getattr(args, option) <= 1:
+            print(f"[ERROR] --{option} должен быть в диапазоне [0, 1].")
+            sys.exit(1)
+
+    config = SyntheticConfig(args.packages, args.fanout, args.chain, args.cycles,
+                             args.providers, args.virtual, args.versions, args.seed)
+    paths = generate(args.out, config, args.arch, not args.no_test_repo)
+    print(f"[INFO] APKINDEX: {paths['index']} ({args.packages} пакетов)")
+    print(f"[INFO] --repo-url {paths['repo_url']}")
+    if "test_repo" in paths:
+        print(f"[INFO] Тестовый репозиторий: {paths['test_repo']}")
+
+
+if __name__ == "__main__":
+    main()
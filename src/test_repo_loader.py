@@ -1,5 +1,39 @@
 # src/test_repo_loader.py
 
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+import metrics
+
+from index_cache import default_cache_dir, make_stamp
+from package_store import StringTable
+from snapshot import MappedStringTable, pack_strings
+
+
+def file_checksum(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def file_stamp(path: str) -> bytes:
+    """
+    Отпечаток файла для проверки снимка: путь, размер и mtime, без чтения.
+    """
+    st = os.stat(path)
+    return make_stamp(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
 class TestRepository:
     """
     Тестовый репозиторий.
@@ -15,13 +49,16 @@ class TestRepository:
     def __init__(self, path: str):
         self.path = path
         self.packages: dict[str, list[str]] = {}
+        self.index_checksum: bytes | None = None  # sha256 разобранного файла
         self._load()
 
     def _load(self):
+        digest = hashlib.sha256()
         try:
-            with open(self.path, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
+            with metrics.phase("parse"), open(self.path, "rb") as f:
+                for raw in f:
+                    digest.update(raw)
+                    line = raw.decode("utf-8").strip()
                     if not line or line.startswith("#"):
                         continue
                     if ":" not in line:
@@ -32,9 +69,246 @@ class TestRepository:
                     self.packages[name] = deps
         except FileNotFoundError:
             raise RuntimeError(f"Файл тестового репозитория не найден: {self.path}")
+        self.index_checksum = digest.digest()
 
     def get_dependencies(self, package: str) -> list[str]:
         if package not in self.packages:
             # в тестовом режиме лучше явно показывать ошибку
             raise ValueError(f"Пакет '{package}' не найден в тестовом репозитории")
-        return self.packages[package]
\ No newline at end of file
+        return self.packages[package]
+
+    def dependencies_of(self, package: str, version: str | None = None,
+                        skip=None) -> list[str]:
+        # в тестовом репозитории версий и виртуальных имён нет — разрешать нечего
+        return self.get_dependencies(package)
+
+    def resolve(self, dep: str) -> tuple[str, None] | None:
+        return (dep, None) if dep in self.packages else None
+
+    def label(self, package: str, version: str | None) -> str:
+        return package
+
+    def iter_packages(self):
+        for name, deps in self.packages.items():
+            yield name, "", deps
+
+    def source_checksum(self) -> bytes:
+        return file_checksum(self.path)
+
+    def source_stamp(self) -> bytes:
+        return file_stamp(self.path)
+
+
+# "имя:" в начале строки; строки-комментарии (#) и строки без ':' не подходят
+_ENTRY = re.compile(rb"^[ \t]*([^\s:#][^:\n]*?)[ \t]*:", re.MULTILINE)
+
+SIDECAR_MAGIC = b"TREPIDX\0"
+SIDECAR_VERSION = 2  # 2: массивы и хеш-таблица имён читаются прямо из mmap
+
+# magic, версия, размер файла, mtime_ns, число пакетов, длина блока имён, слотов
+_SIDECAR_HEADER = struct.Struct("<8sIQQIII")
+
+
+class LazyTestRepository:
+    """
+    Тестовый репозиторий того же формата, что TestRepository, для
+    очень больших файлов.
+
+    Файл отображается через mmap и за один проход регулярным выражением
+    строится индекс "имя -> смещение списка зависимостей": имена в
+    StringTable, смещения — массив по id имени. Сами списки разбираются
+    только при обращении и хранятся в LRU-кэше на cache_size пакетов,
+    так что память растёт с той частью графа, которую обходят. Кэш
+    под замком: сервер обращается к репозиторию из нескольких потоков.
+
+    Индекс сохраняется в index_dir (по умолчанию <каталог кэша>/lazy,
+    рядом с входным файлом ничего не пишется) и при следующих запусках
+    отображается оттуда через mmap, если размер и mtime файла не
+    поменялись. sidecar=False — не читать и не писать его.
+    """
+
+    def __init__(self, path: str, cache_size: int = 65536, sidecar: bool = True,
+                 index_dir: str | Path | None = None):
+        self.path = path
+        self.cache_size = cache_size
+        self.sidecar = sidecar
+        self.index_dir = Path(index_dir) if index_dir is not None else default_cache_dir() / "lazy"
+        self.names = StringTable()
+        self.offsets = array("Q")  # id имени -> смещение его зависимостей
+        self._cache: OrderedDict[str, list[str]] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._checksum: bytes | None = None
+        self._sidecar_mm = None
+        self._open()
+
+    def _open(self):
+        self._map()
+        with metrics.phase("parse"):
+            self._index()
+
+    def _map(self):
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            raise RuntimeError(f"Файл тестового репозитория не найден: {self.path}")
+        with f:
+            st = os.fstat(f.fileno())
+            # mmap пустого файла не создаётся
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b""
+        self._stamp = (st.st_size, st.st_mtime_ns)
+
+    def _index(self):
+        if self.sidecar and self._read_sidecar():
+            return
+        names, offsets = self.names, self.offsets
+        for m in _ENTRY.finditer(self._mm):
+            sid = names.intern(m.group(1).decode("utf-8"))
+            if sid < len(offsets):
+                offsets[sid] = m.end()  # повторная строка пакета заменяет прежнюю
+            else:
+                offsets.append(m.end())
+        if self.sidecar:
+            self._write_sidecar()
+
+    def sidecar_path(self) -> Path:
+        key = hashlib.sha256(os.path.abspath(self.path).encode("utf-8")).hexdigest()[:32]
+        return self.index_dir / f"{key}.idx"
+
+    def _read_sidecar(self) -> bool:
+        if sys.byteorder != "little":
+            return False  # массивы в файле little-endian, проще пересобрать
+        try:
+            with open(self.sidecar_path(), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < _SIDECAR_HEADER.size:
+                    return False
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return False
+        magic, version, file_size, mtime_ns, count, names_len, n_slots = \
+            _SIDECAR_HEADER.unpack_from(mm, 0)
+        expected = _SIDECAR_HEADER.size + 8 * count + 4 * (count + 1) + 4 * n_slots + names_len
+        if (magic != SIDECAR_MAGIC or version != SIDECAR_VERSION
+                or (file_size, mtime_ns) != self._stamp or size != expected):
+            mm.close()  # другой формат или файл поменялся — индекс устарел
+            return False
+
+        view = memoryview(mm)
+        pos = _SIDECAR_HEADER.size
+        self.offsets = view[pos:pos + 8 * count].cast("Q")
+        pos += 8 * count
+        str_offsets = view[pos:pos + 4 * (count + 1)].cast("I")
+        pos += 4 * (count + 1)
+        slots = view[pos:pos + 4 * n_slots].cast("i")
+        pos += 4 * n_slots
+        self.names = MappedStringTable(view[pos:pos + names_len], str_offsets, slots)
+        self._sidecar_mm = mm
+        return True
+
+    def _write_sidecar(self):
+        blob, str_offsets, slots = pack_strings(self.names.strings)
+        header = _SIDECAR_HEADER.pack(SIDECAR_MAGIC, SIDECAR_VERSION, *self._stamp,
+                                      len(self.offsets), len(blob), len(slots))
+        sections = [array("Q", self.offsets), str_offsets, slots]
+        if sys.byteorder != "little":
+            for section in sections:
+                section.byteswap()
+        path = self.sidecar_path()
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(header)
+                for section in sections:
+                    section.tofile(f)
+                f.write(blob)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # каталог недоступен для записи — обойдёмся без индекса на диске
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def _parse(self, offset: int) -> list[str]:
+        end = self._mm.find(b"\n", offset)
+        if end < 0:
+            end = len(self._mm)
+        return self._mm[offset:end].decode("utf-8").split()
+
+    def get_dependencies(self, package: str) -> list[str]:
+        with self._cache_lock:
+            deps = self._cache.get(package)
+            if deps is not None:
+                self._cache.move_to_end(package)
+                return deps
+
+        sid = self.names.id_of(package)
+        if sid is None:
+            raise ValueError(f"Пакет '{package}' не найден в тестовом репозитории")
+        # разбор — только чтение из mmap, замок на это время не нужен
+        deps = self._parse(self.offsets[sid])
+        with self._cache_lock:
+            self._cache[package] = deps
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return deps
+
+    def dependencies_of(self, package: str, version: str | None = None,
+                        skip=None) -> list[str]:
+        return self.get_dependencies(package)
+
+    def resolve(self, dep: str) -> tuple[str, None] | None:
+        return (dep, None) if dep in self else None
+
+    def label(self, package: str, version: str | None) -> str:
+        return package
+
+    def iter_packages(self):
+        # полный проход не засоряет кэш: он нужен для точечных запросов
+        for sid, offset in enumerate(self.offsets):
+            yield self.names[sid], "", self._parse(offset)
+
+    def __contains__(self, package: str) -> bool:
+        return self.names.id_of(package) is not None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def index_checksum(self) -> bytes:
+        """
+        sha256 отображённого файла — тех байт, из которых берутся зависимости.
+        """
+        if self._checksum is None:
+            self._checksum = hashlib.sha256(self._mm).digest()
+        return self._checksum
+
+    def source_checksum(self) -> bytes:
+        return file_checksum(self.path)
+
+    def source_stamp(self) -> bytes:
+        return file_stamp(self.path)
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+
+    def __getstate__(self):
+        # mmap не сериализуется: в рабочем процессе файл открывается заново;
+        # индекс из памяти передаётся готовым, отображённый — открывается заново
+        state = dict(self.__dict__)
+        del state["_mm"], state["_cache_lock"]
+        state["_cache"] = OrderedDict()
+        if self._sidecar_mm is not None:
+            del state["names"], state["offsets"], state["_sidecar_mm"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
+        self._map()
+        if "names" not in state:
+            self.names = StringTable()
+            self.offsets = array("Q")
+            self._sidecar_mm = None
+            self._index()
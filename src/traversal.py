@@ -0,0 +1,166 @@
+# src/traversal.py
+
+"""
+Итеративный обход графа зависимостей: BFS, DFS и топологический порядок.
+
+Рекурсии нет — только collections.deque и явные стеки, поэтому глубина
+графа ограничена лишь памятью, а время обхода линейно (O(V + E)).
+
+neighbors(node) -> iterable  — соседи узла
+max_depth                    — узлы на этой глубине не раскрываются;
+                               можно передать функцию node -> int,
+                               чтобы задать предел для каждого узла
+prune(node, depth) -> bool   — True: узел посещается, но не раскрывается
+stop(node, depth) -> bool    — True: обход прекращается сразу после узла
+"""
+
+from collections import deque
+
+
+def bfs(start, neighbors, max_depth: int | None = None,
+        prune=None, stop=None):
+    """
+    Обход в ширину. Генерирует пары (node, depth) в порядке посещения,
+    каждый узел — один раз, с минимальной глубиной.
+    """
+    visited = {start}
+    queue = deque([(start, 0)])
+
+    while queue:
+        node, depth = queue.popleft()
+        yield node, depth
+
+        if stop is not None and stop(node, depth):
+            return
+        if not _expandable(node, depth, max_depth, prune):
+            continue
+
+        for nxt in neighbors(node):
+            if nxt not in visited:
+                visited.add(nxt)
+                queue.append((nxt, depth + 1))
+
+
+def dfs(start, neighbors, max_depth: int | None = None,
+        prune=None, stop=None, on_edge=None):
+    """
+    Обход в глубину (прямой порядок). Генерирует пары (node, depth).
+    Соседи раскрываются в исходном порядке, как в рекурсивном DFS.
+
+    on_edge(parent, child) вызывается для каждого просмотренного ребра
+    в тот момент, когда рекурсивный DFS дошёл бы до него.
+    """
+    visited = {start}
+    yield start, 0
+    if stop is not None and stop(start, 0):
+        return
+
+    # стек из итераторов по соседям: (node, depth, iterator)
+    stack = []
+    if _expandable(start, 0, max_depth, prune):
+        stack.append((start, 0, iter(neighbors(start))))
+
+    while stack:
+        node, depth, it = stack[-1]
+        nxt = next(it, _DONE)
+        if nxt is _DONE:
+            stack.pop()
+            continue
+
+        if on_edge is not None:
+            on_edge(node, nxt)
+        if nxt in visited:
+            continue
+        visited.add(nxt)
+
+        yield nxt, depth + 1
+        if stop is not None and stop(nxt, depth + 1):
+            return
+        if _expandable(nxt, depth + 1, max_depth, prune):
+            stack.append((nxt, depth + 1, iter(neighbors(nxt))))
+
+
+def topological_order(start, neighbors, max_depth: int | None = None,
+                      prune=None):
+    """
+    Обратный постфиксный порядок DFS: каждый узел идёт раньше своих
+    зависимостей (для DAG — топологическая сортировка, циклы не мешают).
+    """
+    visited = {start}
+    postorder = []
+    stack = [(start, 0, iter(neighbors(start))
+              if _expandable(start, 0, max_depth, prune) else iter(()))]
+
+    while stack:
+        node, depth, it = stack[-1]
+        nxt = next(it, _DONE)
+        if nxt is _DONE:
+            stack.pop()
+            postorder.append(node)
+            continue
+        if nxt in visited:
+            continue
+        visited.add(nxt)
+        children = (iter(neighbors(nxt))
+                    if _expandable(nxt, depth + 1, max_depth, prune) else iter(()))
+        stack.append((nxt, depth + 1, children))
+
+    postorder.reverse()
+    return postorder
+
+
+def tree_walk(start, neighbors, max_depth: int | None = None,
+              prune=None, stop=None):
+    """
+    Обход дерева путей (узел может встретиться много раз — под каждым
+    родителем). Генерирует кортежи (node, lasts, cycle):
+        lasts — для каждого уровня пути, последний ли это ребёнок
+                (пустой кортеж у корня), len(lasts) — глубина узла;
+        cycle — узел уже есть на текущем пути, дальше не раскрываем.
+    """
+    yield start, (), False
+    if stop is not None and stop(start, 0):
+        return
+
+    path = {start}
+    # кадр стека: [node, lasts, children, index]
+    stack = []
+    if _expandable(start, 0, max_depth, prune):
+        stack.append([start, (), list(neighbors(start)), 0])
+
+    while stack:
+        frame = stack[-1]
+        node, lasts, children, index = frame
+        if index == len(children):
+            stack.pop()
+            path.discard(node)
+            continue
+        frame[3] = index + 1
+
+        child = children[index]
+        child_lasts = lasts + (index == len(children) - 1,)
+        cycle = child in path
+        yield child, child_lasts, cycle
+
+        depth = len(child_lasts)
+        if stop is not None and stop(child, depth):
+            return
+        if cycle or not _expandable(child, depth, max_depth, prune):
+            continue
+
+        grandchildren = list(neighbors(child))
+        if grandchildren:
+            path.add(child)
+            stack.append([child, child_lasts, grandchildren, 0])
+
+
+_DONE = object()
+
+
+def _expandable(node, depth: int, max_depth, prune) -> bool:
+    limit = max_depth(node) if callable(max_depth) else max_depth
+    if limit is not None and depth + 1 > limit:
+        return False
+    if prune is not None and prune(node, depth):
+        return False
+    return True
@@ -0,0 +1,73 @@
+# tests/conftest.py
+
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# модули проекта импортируют друг друга по имени (import metrics), как при запуске из src/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+class FakeIndexServer:
+    """
+    Локальный http.server: отдаёт files[path] = (body, etag) и отвечает
+    304 на совпавший If-None-Match или If-Modified-Since. Если задан
+    status, на любой запрос отвечает им (например, 503).
+    """
+
+    def __init__(self):
+        self.files: dict[str, tuple[bytes, str | None]] = {}
+        self.requests: list[tuple[str, dict]] = []
+        self.status: int | None = None
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                if server.status is not None:
+                    self.send_error(server.status)
+                    return
+                if self.path not in server.files:
+                    self.send_error(404)
+                    return
+                body, etag = server.files[self.path]
+                if (etag and self.headers.get("If-None-Match") == etag) or \
+                        (not etag and self.headers.get("If-Modified-Since") == LAST_MODIFIED):
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if etag:
+                    self.send_header("ETag", etag)
+                else:
+                    self.send_header("Last-Modified", LAST_MODIFIED)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+    def statuses(self) -> list[str | None]:
+        return [headers.get("If-None-Match") or headers.get("If-Modified-Since")
+                for _, headers in self.requests]
+
+
+@pytest.fixture
+def index_server():
+    srv = FakeIndexServer()
+    srv.thread.start()
+    yield srv
+    srv.httpd.shutdown()
+    srv.httpd.server_close()
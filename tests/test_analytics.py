@@ -0,0 +1,61 @@
+# tests/test_analytics.py
+
+import random
+from functools import lru_cache
+
+import pytest
+
+import test_repo_loader
+from analytics import RepositoryAnalytics
+
+
+def random_repo(rng: random.Random, size: int) -> dict[str, list[str]]:
+    names = [f"p{i}" for i in range(size)]
+    # редкие обратные рёбра дают циклы, "ghost" — зависимость без своей записи
+    return {name: rng.sample(names[i + 1:] + ["ghost"], min(rng.randint(0, 3), size - i))
+            + ([rng.choice(names[:i + 1])] if rng.random() < 0.1 else [])
+            for i, name in enumerate(names)}
+
+
+def naive_metrics(repo: dict[str, list[str]]) -> dict[str, dict]:
+    def reach(root):
+        nodes, stack = {root}, [root]
+        while stack:
+            for dep in repo.get(stack.pop(), []):
+                if dep not in nodes:
+                    nodes.add(dep)
+                    stack.append(dep)
+        return nodes
+
+    closures = {name: reach(name) for name in set(repo).union(*repo.values())}
+    component = {name: frozenset(m for m in closures[name] if name in closures[m])
+                 for name in closures}
+
+    @lru_cache(maxsize=None)
+    def depth(comp: frozenset) -> int:
+        below = {component[d] for m in comp for d in repo.get(m, [])} - {comp}
+        return max((depth(c) + 1 for c in below), default=0)
+
+    return {name: {
+        "fan_in": sum(1 for other in closures if other != name and name in closures[other]),
+        "direct_in": sum(1 for other, deps in repo.items() if other != name and name in deps),
+        "closure": len(closures[name]),
+        "depth": depth(component[name]),
+        "cycle": len(component[name]) > 1 or name in repo[name],
+    } for name in repo}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_naive_computation(tmp_path, seed):
+    repo = random_repo(random.Random(seed), 60)
+    path = tmp_path / "repo.txt"
+    path.write_text("".join(f"{n}: {' '.join(d)}\n" for n, d in repo.items()), encoding="utf-8")
+
+    # узкое окно — чтобы маски считались в несколько проходов
+    analytics = RepositoryAnalytics(test_repo_loader.TestRepository(str(path)), width=8)
+    expected = naive_metrics(repo)
+    for row in analytics.rows():
+        assert {k: v for k, v in row.items() if k != "package"} == expected[row["package"]]
+    for name in repo:
+        chain = analytics.chain(name)
+        assert len(chain) - 1 == expected[name]["depth"]
@@ -0,0 +1,90 @@
+# tests/test_apk_parser.py
+
+import pytest
+
+from apk_parser import ApkRepository
+from closure import ClosureEngine
+from dependency_graph import DependencyGraph
+from package_store import CompactPackageStore
+from reverse_index import ReverseIndex
+from snapshot import load_snapshot, write_snapshot
+
+RECORDS = [
+    {"name": "foo", "version": "1.0-r0", "deps": ["bar<2"]},
+    {"name": "bar", "version": "1.5-r0", "deps": ["old-lib"]},
+    {"name": "bar", "version": "2.0-r0", "deps": ["new-lib", "libx"]},
+    {"name": "old-lib", "version": "1.0-r0"},
+    {"name": "new-lib", "version": "1.0-r0"},
+    {"name": "libx", "version": "1.0-r0"},
+    {"name": "app", "version": "1.0-r0", "deps": ["bar", "so:libz.so.1"]},
+    {"name": "zlib", "version": "1.2-r0", "provides": ["so:libz.so.1"]},
+    {"name": "musl", "version": "1.2-r0", "provides": ["so:libc.musl-x86_64.so.1"]},
+]
+
+
+@pytest.fixture(params=["apk", "compact", "snapshot"])
+def repo(request, tmp_path):
+    repo = ApkRepository("file:///unused")
+    for record in RECORDS:
+        repo.add_record(dict(record))
+    if request.param == "compact":
+        return CompactPackageStore.from_repository(repo)
+    if request.param == "snapshot":
+        path = str(tmp_path / "index.snap")
+        write_snapshot(path, CompactPackageStore.from_repository(repo), bytes(32))
+        return load_snapshot(path)
+    return repo
+
+
+def test_resolve_returns_selected_version(repo):
+    assert repo.resolve("bar<2") == ("bar", "1.5-r0")
+    assert repo.resolve("bar") == ("bar", "2.0-r0")
+    assert repo.resolve("so:libz.so.1") == ("zlib", "1.2-r0")
+    assert repo.resolve("bar<1") is None
+
+
+def test_resolves_names_no_record_depends_on(repo):
+    # ни so:libc..., ни bar>=1.6 не встречаются в D:, но корнем запроса быть могут
+    assert repo.resolve("so:libc.musl-x86_64.so.1") == ("musl", "1.2-r0")
+    assert repo.resolve("bar>=1.6") == ("bar", "2.0-r0")
+    assert repo.resolve("bar<=1.5-r0") == ("bar", "1.5-r0")
+    assert repo.resolve("so:missing.so") is None
+    assert ClosureEngine(repo).closure("so:libc.musl-x86_64.so.1") == {"musl"}
+
+
+def test_constraint_expands_selected_version_not_newest(repo):
+    # самая новая bar (2.0) нарушает bar<2: раскрываться должна 1.5
+    graph = DependencyGraph(max_depth=5).build("foo", None, repo.dependencies_of)
+    nodes = set(graph).union(*graph.values())
+    assert "old-lib" in nodes
+    assert not {"new-lib", "libx"} & nodes
+    assert graph["foo"] == ["bar=1.5-r0"]
+
+
+def test_closure_uses_selected_version(repo):
+    engine = ClosureEngine(repo)
+    assert engine.closure("foo") == {"foo", "bar=1.5-r0", "old-lib"}
+    assert engine.closure("app") == {"app", "bar", "new-lib", "libx", "zlib"}
+
+
+def test_reverse_index_follows_selected_version(repo):
+    index = ReverseIndex(repo)
+    assert "foo" not in dict(index.query("new-lib"))
+    assert dict(index.query("old-lib")) == {"bar=1.5-r0": 1, "foo": 2}
+    assert sorted(index.direct("bar")) == ["app", "foo"]
+
+
+def test_refresh_reports_edges_of_selected_version():
+    repo = ApkRepository("file:///unused")
+    for record in RECORDS:
+        repo.add_record(dict(record))
+    # вышла bar 1.9 — под bar<2 теперь попадает она
+    updated = [dict(r) for r in RECORDS] + [
+        {"name": "bar", "version": "1.9-r0", "deps": ["libx"]}]
+    fresh = repo.copy()
+    delta = fresh.apply_records(updated)
+
+    assert ("foo", "bar=1.9-r0") in delta.edges_added
+    assert ("foo", "bar=1.5-r0") in delta.edges_removed
+    reverse = ReverseIndex(repo).patched(fresh, delta)
+    assert dict(reverse.query("libx")) == dict(ReverseIndex(fresh).query("libx"))
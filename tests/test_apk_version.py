@@ -0,0 +1,47 @@
+# tests/test_apk_version.py
+
+import pytest
+
+from apk_version import fuzzy_match, parse_dependency, select_version, version_key
+
+ORDERED = ["1.0_alpha1", "1.0_beta", "1.0_rc2", "1.0", "1.0-r1", "1.0_p1",
+           "1.1", "1.2.3", "1.10", "2.0_git20230101"]
+
+
+def test_versions_sort_like_apk():
+    assert sorted(reversed(ORDERED), key=version_key) == ORDERED
+
+
+def test_invalid_versions_sort_first():
+    assert sorted(["1.0", "garbage"], key=version_key) == ["garbage", "1.0"]
+
+
+@pytest.mark.parametrize("dep, parsed", [
+    ("foo", ("foo", None, None)),
+    ("foo>=1.2-r0", ("foo", ">=", "1.2-r0")),
+    ("foo~=1.2", ("foo", "~", "1.2")),
+    ("so:libc.musl-x86_64.so.1", ("so:libc.musl-x86_64.so.1", None, None)),
+])
+def test_parse_dependency(dep, parsed):
+    assert parse_dependency(dep) == parsed
+
+
+def test_fuzzy_match_stops_at_component_boundary():
+    assert fuzzy_match("1.2.3", "1.2")
+    assert fuzzy_match("1.2-r4", "1.2")
+    assert not fuzzy_match("1.20", "1.2")
+
+
+@pytest.mark.parametrize("op, version, expected", [
+    (None, None, "2.0-r0"),
+    ("<", "2.0-r0", "1.5-r0"),
+    ("<=", "1.5-r0", "1.5-r0"),
+    (">", "2.0-r0", None),
+    (">=", "1.6", "2.0-r0"),
+    ("=", "1.0-r0", "1.0-r0"),
+    ("=", "1.1-r0", None),
+    ("~", "1", "1.5-r0"),
+])
+def test_select_version(op, version, expected):
+    versions = ["1.0-r0", "1.5-r0", "2.0-r0"]
+    assert select_version([version_key(v) for v in versions], versions, op, version) == expected
@@ -0,0 +1,74 @@
+# tests/test_batch.py
+
+import io
+import json
+
+import pytest
+
+import test_repo_loader
+from batch import read_queries, run_batch
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo.txt"
+    path.write_text("".join(f"p{i}: p{i + 1}\n" for i in range(20)) + "p20:\n", encoding="utf-8")
+    return test_repo_loader.TestRepository(str(path))
+
+
+class RecordingOut(io.StringIO):
+    """
+    Запоминает, сколько запросов было взято из входа к моменту каждой записи.
+    """
+
+    def __init__(self, queries):
+        super().__init__()
+        self.queries = queries
+        self.drawn_at_write = []
+
+    def write(self, text):
+        self.drawn_at_write.append(self.queries.drawn)
+        return super().write(text)
+
+
+class CountingQueries:
+    def __init__(self, queries):
+        self.queries = list(queries)
+        self.drawn = 0
+
+    def __iter__(self):
+        for query in self.queries:
+            self.drawn += 1
+            yield query
+
+
+def test_read_queries_skips_blank_lines_and_comments():
+    lines = ["bash\n", "  # comment\n", "\n", "musl/1.2-r0\n"]
+    assert list(read_queries(lines)) == [("bash", None), ("musl", "1.2-r0")]
+
+
+def test_one_line_per_query_and_errors_do_not_abort(repo):
+    queries = [("p0", None), ("missing", None), ("p18", None), ("p1", "1.0-r0")]
+    out = io.StringIO()
+    total, failed = run_batch(repo, queries, out, max_depth=100, jobs=1, extra={"arch": "x"})
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert (total, failed) == (4, 1)
+    # один воркер выполняет запросы по порядку, значит и готовы они по порядку
+    assert [r["package"] for r in results] == ["p0", "missing", "p18", "p1"]
+    assert all(r["arch"] == "x" for r in results)
+    assert results[0]["nodes"] == 21 and results[0]["edges"] == 20
+    assert "не найден" in results[1]["error"]
+    assert results[2]["graph"] == {"p18": ["p19"], "p19": ["p20"], "p20": []}
+    assert results[3]["nodes"] == 20  # у тестового репозитория версия не проверяется
+
+
+def test_window_bounds_queries_in_flight(repo):
+    queries = CountingQueries((f"p{i}", None) for i in range(20))
+    out = RecordingOut(queries)
+    total, _ = run_batch(repo, queries, out, max_depth=3, jobs=2, window=3)
+
+    assert total == 20
+    # к моменту n-й записи из входа взято не больше n + window + 1 запросов
+    for written, drawn in enumerate(out.drawn_at_write):
+        assert drawn <= written + 3 + 1
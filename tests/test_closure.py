@@ -0,0 +1,38 @@
+# tests/test_closure.py
+
+import pytest
+
+import metrics
+import test_repo_loader
+from analytics import RepositoryAnalytics
+from closure import ClosureEngine
+from test_repo_loader import LazyTestRepository
+
+
+@pytest.fixture
+def repo_file(tmp_path):
+    path = tmp_path / "repo.txt"
+    path.write_text("A:B X\nB:A\n", encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_dangling_dependency_is_a_leaf(repo_file, tmp_path, lazy):
+    repo = (LazyTestRepository(str(repo_file), index_dir=tmp_path / "idx") if lazy
+            else test_repo_loader.TestRepository(str(repo_file)))
+    engine = ClosureEngine(repo)
+    assert engine.closure("A") == {"A", "B", "X"}
+    assert engine.closure("X") == {"X"}
+    assert engine.cycles() == [["A", "B"]]
+
+    analytics = RepositoryAnalytics(repo, engine=engine)
+    assert analytics.chain("A")[-1] == "X"
+
+
+def test_cache_hits_and_misses_are_counted(repo_file):
+    engine = ClosureEngine(test_repo_loader.TestRepository(str(repo_file)))
+    m = metrics.Metrics()
+    with metrics.activate(m):
+        engine.closure("A")
+        engine.closure("B")
+    assert m.counters == {"closure_cache_misses": 1, "closure_cache_hits": 1}
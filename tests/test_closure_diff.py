@@ -0,0 +1,56 @@
+# tests/test_closure_diff.py
+
+import random
+
+import pytest
+
+import test_repo_loader
+from closure_diff import ClosureDiff
+
+
+def random_repo(rng: random.Random, size: int) -> dict[str, list[str]]:
+    names = [f"p{i}" for i in range(size)]
+    # несколько зависимостей на отсутствующие пакеты — листья графа
+    return {name: rng.sample(names + ["ghost"], rng.randint(0, 3)) for name in names}
+
+
+def mutate(rng: random.Random, repo: dict[str, list[str]]) -> dict[str, list[str]]:
+    repo = {name: list(deps) for name, deps in repo.items()}
+    names = list(repo)
+    for name in rng.sample(names, 3):
+        repo[name] = rng.sample(names, rng.randint(0, 3))
+    repo[f"new{rng.randint(0, 9)}"] = rng.sample(names, 2)
+    return repo
+
+
+def write(path, repo: dict[str, list[str]]):
+    path.write_text("".join(f"{n}: {' '.join(d)}\n" for n, d in repo.items()), encoding="utf-8")
+    return test_repo_loader.TestRepository(str(path))
+
+
+def closure_edges(repo: dict[str, list[str]], root: str) -> tuple[set, set]:
+    nodes, stack = {root}, [root]
+    while stack:
+        for dep in repo.get(stack.pop(), []):
+            if dep not in nodes:
+                nodes.add(dep)
+                stack.append(dep)
+    return nodes, {(n, d) for n in nodes for d in repo.get(n, [])}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_diff_matches_naive_closures(tmp_path, seed):
+    rng = random.Random(seed)
+    old = random_repo(rng, 40)
+    new = mutate(rng, old)
+    differ = ClosureDiff(write(tmp_path / "old.txt", old), write(tmp_path / "new.txt", new))
+
+    for root in old:
+        old_nodes, old_edges = closure_edges(old, root)
+        new_nodes, new_edges = closure_edges(new, root)
+        result = differ.diff(root)
+        assert set(result["added_nodes"]) == new_nodes - old_nodes
+        assert set(result["removed_nodes"]) == old_nodes - new_nodes
+        assert set(map(tuple, result["added_edges"])) == new_edges - old_edges
+        assert set(map(tuple, result["removed_edges"])) == old_edges - new_edges
+        assert result["changed"] == (old_nodes != new_nodes or old_edges != new_edges)
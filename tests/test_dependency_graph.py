@@ -0,0 +1,42 @@
+# tests/test_dependency_graph.py
+
+import io
+
+from dependency_graph import DependencyGraph
+
+
+def diamonds(levels: int) -> dict[str, list[str]]:
+    # d0 -> l0, r0 -> d1 -> ...: без ссылок "(see above)" дерево росло бы как 2^levels
+    graph = {}
+    for i in range(levels):
+        graph[f"d{i}"] = [f"l{i}", f"r{i}"]
+        graph[f"l{i}"] = graph[f"r{i}"] = [f"d{i + 1}"]
+    graph[f"d{levels}"] = []
+    return graph
+
+
+def render(graph: dict, root: str, **limits) -> list[str]:
+    builder = DependencyGraph(max_depth=1000)
+    builder.graph = graph
+    out = io.StringIO()
+    builder.print_ascii(root, out, **limits)
+    return out.getvalue().splitlines()
+
+
+def test_shared_subtree_is_rendered_once():
+    lines = render(diamonds(30), "d0")
+    assert len(lines) == 30 * 4 + 1
+    # повтор листа d30 печатается как есть: раскрывать там нечего
+    assert sum(line.endswith("(see above)") for line in lines) == 29
+
+
+def test_cycle_is_marked():
+    assert render({"a": ["b"], "b": ["a"]}, "a") == ["a", "└── b", "    └── a (cycle)"]
+
+
+def test_line_and_width_budgets():
+    lines = render(diamonds(30), "d0", max_lines=5, max_width=8)
+    assert len(lines) == 6
+    assert lines[-1].startswith("... (вывод ограничен 5")
+    assert all(len(line) <= 8 for line in lines[:-1])
+    assert lines[2].endswith("…")
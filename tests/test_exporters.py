@@ -0,0 +1,27 @@
+# tests/test_exporters.py
+
+import io
+import json
+import xml.etree.ElementTree as ET
+
+from exporters import DotExporter, GraphMLExporter, JsonExporter, export_graph
+
+GRAPH = {"a": ["b", 'c"q'], "b": ['c"q'], 'c"q': []}
+
+
+def test_one_pass_feeds_every_exporter():
+    dot, js, graphml = io.StringIO(), io.StringIO(), io.StringIO()
+    export_graph(GRAPH, "a", [DotExporter(dot), JsonExporter(js), GraphMLExporter(graphml)])
+
+    assert json.loads(js.getvalue()) == {"root": "a", "graph": GRAPH}
+
+    assert dot.getvalue().startswith("digraph dependencies {")
+    assert '"a" -> "c\\"q";' in dot.getvalue()
+    assert dot.getvalue().count("->") == 3
+
+    ns = {"g": "http://graphml.graphdrawing.org/xmlns"}
+    root = ET.fromstring(graphml.getvalue())
+    nodes = {n.get("id") for n in root.iterfind(".//g:node", ns)}
+    edges = {(e.get("source"), e.get("target")) for e in root.iterfind(".//g:edge", ns)}
+    assert nodes == set(GRAPH)
+    assert edges == {("a", "b"), ("a", 'c"q'), ("b", 'c"q')}
@@ -0,0 +1,84 @@
+# tests/test_filters.py
+
+import io
+import tarfile
+
+import pytest
+
+from apk_parser import ApkRepository
+from dependency_graph import DependencyGraph
+from filters import FilterSet
+from package_store import CompactPackageStore
+
+
+def test_global_flags_apply_to_their_rule_only():
+    filters = FilterSet(["re:(?i)foo", "re:^lib"])
+    assert "FOO-dev" in filters
+    assert "libc" in filters
+    assert "LIBC" not in filters
+
+
+def test_verbose_flag_comment_does_not_swallow_group():
+    filters = FilterSet(["re:(?x) ^py3 - # python", "core"])
+    assert "py3-foo" in filters
+    assert "some-core" in filters
+
+
+def test_numbered_backreferences_keep_their_own_groups():
+    filters = FilterSet([r"re:(a)\1", r"re:(b)\1"])
+    assert "bb" in filters
+    assert "aa" in filters
+    assert "ab" not in filters
+
+
+def test_duplicate_named_groups_are_allowed():
+    filters = FilterSet(["re:(?P<x>foo)", "re:(?P<x>bar)", "allow:re:(?P<x>bar-doc)"])
+    assert "foo" in filters
+    assert "bar" in filters
+    assert "bar-doc" not in filters
+
+
+def test_invalid_rule_is_value_error():
+    with pytest.raises(ValueError):
+        FilterSet(["re:(foo"])
+
+
+INDEX = [
+    "P:app\nV:1.0-r0\nD:so:libz.so.1 cmd:sh\n\n",
+    "P:zlib\nV:1.3-r0\nD:so:libc.musl-x86_64.so.1\np:so:libz.so.1\n\n",
+    "P:musl\nV:1.2-r0\np:so:libc.musl-x86_64.so.1\n\n",
+    "P:busybox\nV:1.36-r0\nD:so:libc.musl-x86_64.so.1\np:cmd:sh /bin/sh\n\n",
+]
+
+
+@pytest.fixture(params=["apk", "compact"])
+def parsed_repo(request, tmp_path):
+    text = "".join(INDEX).encode("utf-8")
+    with tarfile.open(tmp_path / "APKINDEX.tar.gz", "w:gz") as tar:
+        info = tarfile.TarInfo("APKINDEX")
+        info.size = len(text)
+        tar.addfile(info, io.BytesIO(text))
+    repo = ApkRepository(tmp_path.as_uri())
+    repo.parse_index()
+    return CompactPackageStore.from_repository(repo) if request.param == "compact" else repo
+
+
+def build(repo, *rules) -> dict[str, list[str]]:
+    builder = DependencyGraph(10, skip=FilterSet(rules).bind(repo))
+    return builder.build("app", None, lambda name, ver: repo.dependencies_of(name, ver, builder.skip))
+
+
+def test_class_rules_see_virtual_names_before_resolution(parsed_repo):
+    assert build(parsed_repo) == {"app": ["zlib", "busybox"], "zlib": ["musl"],
+                                  "busybox": ["musl"], "musl": []}
+    assert build(parsed_repo, "class:so") == {
+        "app": ["so:libz.so.1", "busybox"], "so:libz.so.1": [],
+        "busybox": ["so:libc.musl-x86_64.so.1"], "so:libc.musl-x86_64.so.1": [],
+    }
+    assert build(parsed_repo, "class:cmd")["app"] == ["zlib", "cmd:sh"]
+
+
+def test_allow_keeps_one_virtual_name_resolved(parsed_repo):
+    graph = build(parsed_repo, "class:so", "allow:so:libc.musl-x86_64.so.1")
+    assert graph["app"] == ["so:libz.so.1", "busybox"]
+    assert graph["busybox"] == ["musl"]
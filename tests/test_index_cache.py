@@ -0,0 +1,118 @@
+# tests/test_index_cache.py
+
+import os
+import urllib.error
+
+import pytest
+
+from index_cache import IndexCache
+
+def test_download_then_hit_within_ttl(index_server, tmp_path):
+    index_server.files["/a"] = (b"archive-a", '"v1"')
+    cache = IndexCache(tmp_path, ttl=3600)
+
+    assert cache.fetch(index_server.url("/a")).read_bytes() == b"archive-a"
+    assert cache.last_status == "downloaded"
+    assert cache.fetch(index_server.url("/a")).read_bytes() == b"archive-a"
+    assert cache.last_status == "hit"
+    assert len(index_server.requests) == 1
+
+
+@pytest.mark.parametrize("etag, header", [('"v1"', "If-None-Match"),
+                                          (None, "If-Modified-Since")])
+def test_expired_copy_is_revalidated_with_304(index_server, tmp_path, etag, header):
+    index_server.files["/a"] = (b"archive-a", etag)
+    cache = IndexCache(tmp_path, ttl=0)
+
+    cache.fetch(index_server.url("/a"))
+    assert cache.fetch(index_server.url("/a")).read_bytes() == b"archive-a"
+    assert cache.last_status == "revalidated"
+    assert header in index_server.requests[-1][1]
+
+
+def test_changed_index_is_downloaded_again(index_server, tmp_path):
+    index_server.files["/a"] = (b"old", '"v1"')
+    cache = IndexCache(tmp_path, ttl=0)
+    cache.fetch(index_server.url("/a"))
+    stamp = cache.stamp(index_server.url("/a"))
+
+    index_server.files["/a"] = (b"new", '"v2"')
+    with cache.open(index_server.url("/a")) as f:
+        assert f.read() == b"new"
+    assert cache.last_status == "downloaded"
+    assert index_server.statuses()[-1] == '"v1"'
+    assert cache.stamp(index_server.url("/a")) != stamp
+
+
+def test_offline_serves_stale_copy_and_fails_on_miss(index_server, tmp_path):
+    index_server.files["/a"] = (b"archive-a", '"v1"')
+    IndexCache(tmp_path).fetch(index_server.url("/a"))
+    seen = len(index_server.requests)
+
+    offline = IndexCache(tmp_path, ttl=0, offline=True)
+    assert offline.fetch(index_server.url("/a")).read_bytes() == b"archive-a"
+    assert offline.last_status == "offline"
+    with pytest.raises(RuntimeError):
+        offline.fetch(index_server.url("/missing"))
+    assert len(index_server.requests) == seen
+
+
+def test_unreachable_server_falls_back_to_stale_copy(index_server, tmp_path):
+    index_server.files["/a"] = (b"archive-a", '"v1"')
+    url = index_server.url("/a")
+    IndexCache(tmp_path).fetch(url)
+    index_server.httpd.shutdown()
+    index_server.httpd.server_close()
+
+    cache = IndexCache(tmp_path, ttl=0, timeout=5)
+    assert cache.fetch(url).read_bytes() == b"archive-a"
+    assert cache.last_status == "stale"
+
+
+def test_server_error_falls_back_to_stale_copy(index_server, tmp_path, capsys):
+    index_server.files["/a"] = (b"archive-a", '"v1"')
+    IndexCache(tmp_path).fetch(index_server.url("/a"))
+    index_server.status = 503
+
+    cache = IndexCache(tmp_path, ttl=0)
+    assert cache.fetch(index_server.url("/a")).read_bytes() == b"archive-a"
+    assert cache.last_status == "stale"
+    assert "[WARN]" in capsys.readouterr().err
+    # без копии в кэше ошибку скрывать нечем
+    with pytest.raises(urllib.error.HTTPError):
+        cache.fetch(index_server.url("/b"))
+
+    index_server.status = 404
+    with pytest.raises(urllib.error.HTTPError):
+        cache.fetch(index_server.url("/a"))
+
+
+def test_least_recently_used_archive_is_evicted(index_server, tmp_path):
+    index_server.files["/a"] = (b"a" * 100, '"a"')
+    index_server.files["/b"] = (b"b" * 100, '"b"')
+    index_server.files["/c"] = (b"c" * 100, '"c"')
+    cache = IndexCache(tmp_path, max_size=250)
+
+    path_a = cache.fetch(index_server.url("/a"))
+    path_b = cache.fetch(index_server.url("/b"))
+    os.utime(path_a, (1, 1))
+    os.utime(path_b, (2, 2))
+    cache.fetch(index_server.url("/b"))  # попадание освежает время использования
+
+    path_c = cache.fetch(index_server.url("/c"))
+    assert not path_a.exists()
+    assert not path_a.with_name(path_a.name.replace(".tar.gz", ".json")).exists()
+    assert path_b.exists() and path_c.exists()
+
+
+def test_file_url_bypasses_cache(tmp_path):
+    archive = tmp_path / "APKINDEX.tar.gz"
+    archive.write_bytes(b"local")
+    cache_dir = tmp_path / "cache"
+    cache = IndexCache(cache_dir, offline=True)
+
+    assert cache.fetch(archive.as_uri()) == archive
+    assert cache.last_status == "local"
+    with cache.open(archive.as_uri()) as f:
+        assert f.read() == b"local"
+    assert not cache_dir.exists()
@@ -0,0 +1,44 @@
+# tests/test_metrics.py
+
+import io
+import tarfile
+import time
+
+import metrics
+from apk_parser import iter_records
+
+# заметно дольше разбора 2000 записей, чтобы сравнение фаз не зависело от машины
+DELAY = 0.1
+
+
+class SlowSource(io.BytesIO):
+    def read(self, size=-1):
+        time.sleep(DELAY)
+        return super().read(size)
+
+
+def make_archive(records: int) -> bytes:
+    text = "".join(f"P:pkg{i}\nV:1.0-r0\n\n" for i in range(records)).encode("utf-8")
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        info = tarfile.TarInfo("APKINDEX")
+        info.size = len(text)
+        tar.addfile(info, io.BytesIO(text))
+    return buffer.getvalue()
+
+
+def test_streaming_parse_reports_reads_as_download():
+    m = metrics.Metrics()
+    with metrics.activate(m):
+        with metrics.CountingReader(SlowSource(make_archive(2000))) as source:
+            with metrics.phase("parse"):
+                names = [record["name"] for record in iter_records(source)]
+
+    assert len(names) == 2000
+    phases = m.phases
+    assert set(phases) == {"download", "extract", "parse"}
+    assert phases["download"]["calls"] == 1
+    # все задержки — внутри чтения, в parse они не попадают
+    assert phases["download"]["seconds"] >= DELAY
+    assert phases["parse"]["seconds"] < phases["download"]["seconds"]
+    assert m.counters["bytes_downloaded"] > 0
@@ -0,0 +1,58 @@
+# tests/test_multi_repo.py
+
+import io
+import tarfile
+
+from multi_repo import MultiRepository, _StreamMerge
+
+
+def write_index(path, records):
+    path.mkdir(parents=True)
+    text = "".join(records).encode("utf-8")
+    with tarfile.open(path / "APKINDEX.tar.gz", "w:gz") as tar:
+        info = tarfile.TarInfo("APKINDEX")
+        info.size = len(text)
+        tar.addfile(info, io.BytesIO(text))
+    return path.as_uri()
+
+
+def test_stream_merge_prefers_higher_priority_arriving_later(tmp_path):
+    main = tmp_path / "main"
+    testing = tmp_path / "testing"
+    repo = MultiRepository([main.as_uri(), testing.as_uri()])
+    merge = _StreamMerge(repo)
+    # запись из менее приоритетного репозитория пришла раньше
+    merge.accept(testing.as_uri(), {"name": "foo", "version": "2.0-r0",
+                                    "deps": ["bar"], "provides": ["cmd:foo"]})
+    merge.accept(main.as_uri(), {"name": "foo", "version": "1.0-r0", "deps": []})
+    merge.accept(testing.as_uri(), {"name": "foo", "version": "3.0-r0", "deps": []})
+
+    assert repo.packages == {"foo": {"1.0-r0": []}}
+    assert list(repo.fingerprints) == [("foo", "1.0-r0")]
+    assert "cmd:foo" not in repo.providers
+    assert repo.origin == {"foo": main.as_uri()}
+
+
+def test_parse_index_matches_source_checksum(tmp_path):
+    urls = [
+        write_index(tmp_path / "main", ["P:foo\nV:1.0-r0\nD:bar\n\n", "P:bar\nV:1.0-r0\n\n"]),
+        write_index(tmp_path / "community", ["P:foo\nV:9.0-r0\n\n", "P:baz\nV:1.0-r0\n\n"]),
+    ]
+    repo = MultiRepository(urls)
+    repo.parse_index()
+    assert repo.versions("foo") == ["1.0-r0"]
+    assert repo.origin == {"foo": urls[0], "bar": urls[0], "baz": urls[1]}
+    assert repo.index_checksum == repo.source_checksum()
+
+
+def test_mirror_falls_back_after_truncated_archive(tmp_path):
+    broken = write_index(tmp_path / "broken",
+                         [f"P:pkg{i}\nV:1.0-r0\nD:pkg{i + 1}\n\n" for i in range(5000)])
+    archive = tmp_path / "broken" / "APKINDEX.tar.gz"
+    archive.write_bytes(archive.read_bytes()[:-200])
+    good = write_index(tmp_path / "good", ["P:foo\nV:1.0-r0\n\n"])
+
+    repo = MultiRepository([broken, good], mirror=True)
+    repo.parse_index()
+    assert list(repo.packages) == ["foo"]
+    assert repo.origin == {"foo": good}
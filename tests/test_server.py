@@ -0,0 +1,52 @@
+# tests/test_server.py
+
+import pytest
+
+import test_repo_loader
+from apk_parser import ApkRepository
+from server import QueryService
+
+
+@pytest.fixture
+def service():
+    repo = ApkRepository("file:///unused")
+    repo.add_record({"name": "foo", "version": "1.0-r0", "deps": ["bar"]})
+    repo.add_record({"name": "bar", "version": "1.0-r0"})
+    return QueryService(lambda: (repo, b"checksum"))
+
+
+@pytest.mark.parametrize("query", [
+    ["foo"],
+    "foo",
+    None,
+    {"package": ["foo"]},
+    {"package": "foo", "op": ["closure"]},
+    {"package": "foo", "version": 1},
+    {"package": "foo", "filter": [1]},
+    {"package": "foo", "filter": {"re:x": 1}},
+    {"package": "foo", "filter": ["re:(foo"]},
+])
+def test_malformed_query_returns_error(service, query):
+    assert "error" in service.handle(query)
+
+
+def test_filter_accepts_string_or_list(service):
+    assert service.handle({"package": "foo", "filter": "bar"})["graph"] == {"foo": ["bar"], "bar": []}
+    assert service.handle({"package": "foo", "filter": ["bar", "glob:b*"]})["graph"]["foo"] == ["bar"]
+
+
+def test_refresh_loads_only_when_stamp_changes(tmp_path):
+    path = tmp_path / "repo.txt"
+    path.write_text("foo:bar\nbar:\n", encoding="utf-8")
+    stamps = iter([b"s1", b"s1", b"s2"])
+    loads = []
+
+    def loader():
+        loads.append(test_repo_loader.TestRepository(str(path)))
+        return loads[-1], f"checksum{len(loads)}".encode()
+
+    service = QueryService(loader, lambda: next(stamps))
+    assert not service.refresh()
+    assert len(loads) == 1
+    assert service.refresh()
+    assert len(loads) == 2 and service.state.generation == 2
@@ -0,0 +1,46 @@
+# tests/test_snapshot.py
+
+import io
+import tarfile
+from functools import partial
+
+from apk_parser import ApkRepository
+from index_cache import IndexCache
+from snapshot import load_or_build
+
+
+def archive(records: list[str]) -> bytes:
+    text = "".join(records).encode("utf-8")
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        info = tarfile.TarInfo("APKINDEX")
+        info.size = len(text)
+        tar.addfile(info, io.BytesIO(text))
+    return buffer.getvalue()
+
+
+def parsed(repo):
+    repo.parse_index()
+    return repo
+
+
+def test_changed_stamp_rebuilds_snapshot(index_server, tmp_path):
+    index_server.files["/main/APKINDEX.tar.gz"] = (archive(["P:foo\nV:1.0-r0\n\n"]), '"v1"')
+    repo = ApkRepository(index_server.url("/main"), IndexCache(tmp_path / "cache", ttl=0))
+    path = str(tmp_path / "index.snap")
+
+    store, loaded = load_or_build(path, repo.source_stamp(), partial(parsed, repo))
+    assert not loaded and store.resolve("foo") == ("foo", "1.0-r0")
+
+    # ответ 304 — отпечаток тот же, снимок годится
+    store, loaded = load_or_build(path, repo.source_stamp(), partial(parsed, repo))
+    assert loaded and store.resolve("foo") == ("foo", "1.0-r0")
+
+    index_server.files["/main/APKINDEX.tar.gz"] = (
+        archive(["P:foo\nV:2.0-r0\nD:bar\n\n", "P:bar\nV:1.0-r0\n\n"]), '"v2"')
+    fresh = ApkRepository(index_server.url("/main"), IndexCache(tmp_path / "cache", ttl=0))
+    store, loaded = load_or_build(path, fresh.source_stamp(), partial(parsed, fresh))
+    assert not loaded
+    assert store.dependencies_of("foo") == ["bar"]
+    store, loaded = load_or_build(path, fresh.source_stamp(), partial(parsed, fresh))
+    assert loaded and store.resolve("foo") == ("foo", "2.0-r0")
@@ -0,0 +1,63 @@
+# tests/test_test_repo_loader.py
+
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import test_repo_loader
+from test_repo_loader import LazyTestRepository
+
+TEXT = "# комментарий\nA: B C\nB:C D\nC:\nD: A\nбез двоеточия\nB: D\n"
+
+
+@pytest.fixture
+def repo_file(tmp_path):
+    path = tmp_path / "repo.txt"
+    path.write_text(TEXT, encoding="utf-8")
+    return path
+
+
+def lazy_view(repo):
+    return {name: deps for name, _, deps in repo.iter_packages()}
+
+
+def test_lazy_matches_eager(repo_file, tmp_path):
+    lazy = LazyTestRepository(str(repo_file), index_dir=tmp_path / "idx")
+    assert lazy_view(lazy) == test_repo_loader.TestRepository(str(repo_file)).packages
+    assert lazy.get_dependencies("B") == ["D"]
+    assert "E" not in lazy
+    with pytest.raises(ValueError):
+        lazy.get_dependencies("E")
+
+
+def test_sidecar_goes_to_index_dir_and_is_reused(repo_file, tmp_path):
+    index_dir = tmp_path / "idx"
+    first = LazyTestRepository(str(repo_file), index_dir=index_dir)
+    assert list(index_dir.glob("*.idx")) == [first.sidecar_path()]
+    assert sorted(p.name for p in repo_file.parent.iterdir()) == ["idx", "repo.txt"]
+
+    second = LazyTestRepository(str(repo_file), index_dir=index_dir)
+    assert second._sidecar_mm is not None
+    assert lazy_view(second) == lazy_view(first)
+    assert lazy_view(pickle.loads(pickle.dumps(second))) == lazy_view(first)
+
+
+def test_no_sidecar_writes_nothing(repo_file, tmp_path):
+    LazyTestRepository(str(repo_file), sidecar=False, index_dir=tmp_path / "idx")
+    assert not (tmp_path / "idx").exists()
+
+
+def test_cache_is_consistent_across_threads(repo_file, tmp_path):
+    lazy = LazyTestRepository(str(repo_file), cache_size=2, index_dir=tmp_path / "idx")
+    names = ["A", "B", "C", "D"] * 500
+
+    def work(offset):
+        return [lazy.get_dependencies(n) for n in names[offset:] + names[:offset]]
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(work, range(8)))
+    expected = test_repo_loader.TestRepository(str(repo_file)).packages
+    for offset, deps in enumerate(results):
+        assert deps == [expected[n] for n in names[offset:] + names[:offset]]
+    assert len(lazy._cache) <= 2
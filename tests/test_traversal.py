@@ -0,0 +1,48 @@
+# tests/test_traversal.py
+
+from traversal import bfs, dfs, topological_order, tree_walk
+
+GRAPH = {"a": ["b", "c"], "b": ["d"], "c": ["d"], "d": ["a"]}
+
+
+def neighbors(node):
+    return GRAPH.get(node, [])
+
+
+def test_bfs_visits_each_node_once_at_minimal_depth():
+    assert list(bfs("a", neighbors)) == [("a", 0), ("b", 1), ("c", 1), ("d", 2)]
+    assert list(bfs("a", neighbors, max_depth=1)) == [("a", 0), ("b", 1), ("c", 1)]
+
+
+def test_dfs_matches_recursive_order_and_reports_every_edge():
+    edges = []
+    order = list(dfs("a", neighbors, on_edge=lambda p, c: edges.append((p, c))))
+    assert order == [("a", 0), ("b", 1), ("d", 2), ("c", 1)]
+    assert edges == [("a", "b"), ("b", "d"), ("d", "a"), ("a", "c"), ("c", "d")]
+
+
+def test_prune_and_stop():
+    assert [n for n, _ in bfs("a", neighbors, prune=lambda n, d: n == "b")] == ["a", "b", "c", "d"]
+    assert [n for n, _ in dfs("a", neighbors, prune=lambda n, d: n == "b")] == ["a", "b", "c", "d"]
+    assert [n for n, _ in bfs("a", neighbors, stop=lambda n, d: n == "b")] == ["a", "b"]
+
+
+def test_topological_order_puts_parents_first():
+    dag = {"a": ["b", "c"], "b": ["d"], "c": ["d"]}
+    order = topological_order("a", lambda n: dag.get(n, []))
+    assert order.index("a") < order.index("b") < order.index("d")
+    assert order.index("c") < order.index("d")
+
+
+def test_deep_chain_does_not_hit_recursion_limit():
+    n = 100_000
+    chain = list(dfs(0, lambda i: [i + 1] if i < n else []))
+    assert chain[-1] == (n, n)
+    # у tree_walk каждая строка несёт весь путь, так что цепочка покороче
+    assert list(tree_walk(0, lambda i: [i + 1] if i < 5000 else []))[-1][0] == 5000
+
+
+def test_tree_walk_marks_cycles_on_the_current_path():
+    walk = [(node, len(lasts), cycle) for node, lasts, cycle in tree_walk("a", neighbors)]
+    assert walk == [("a", 0, False), ("b", 1, False), ("d", 2, False), ("a", 3, True),
+                    ("c", 1, False), ("d", 2, False), ("a", 3, True)]